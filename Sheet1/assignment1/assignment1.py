@@ -275,12 +275,27 @@ class DGraph(object):
             A constructor where instance attributes can be setup.
         """
         self.nodes = []
-        self.edges = []
         self.num_nodes = 0
+        # Adjacency index: every node maps to its direct parents and children,
+        # stored as dicts (with None values) so that they keep the insertion
+        # order like lists, but allow O(1) lookups and updates. self._edges
+        # keeps all edges in the order they were added.
+        self._parents = {}
+        self._children = {}
+        self._edges = {}
+        # Cached position of every node within a topological order. Any change
+        # of the structure resets it to None, so it is recomputed lazily.
+        self._topo_rank = None
+
+    @property
+    def edges(self) -> List[Tuple[str, str]]:
+        """
+            All directed edges of the graph as (node_a, node_b) tuples, in
+            the order they were added. Changing the returned list does not
+            change the graph.
+        """
+        return list(self._edges)
 
-    def get_number_of_nodes(self):
-        return self.num_nodes
-        
     def add_node(self, node: str):
         """
             Adds a node with the given name to the graph. 
@@ -290,24 +305,38 @@ class DGraph(object):
             node: String
                 The name of the new node.
         """
-        if node not in self.nodes:
+        if node not in self._parents:
             self.nodes.append(node)
+            self._parents[node] = {}
+            self._children[node] = {}
             self.num_nodes = len(self.nodes)
+            self._topo_rank = None
         
     def remove_node(self, node: str):
         """
             Removes the node with the given name from the graph.
             Should raise an Exception when the given node is not
-            in the graph.
+            in the graph. All edges connected to the node are removed
+            as well.
             
             Parameters
             ----------
             node: String
                 The name of the node to be removed.
         """
-        if node in self.nodes:
+        if node in self._parents:
+            # Drop incident edges, this only touches the neighbours of node
+            for parent in self._parents.pop(node):
+                self._children[parent].pop(node, None)
+                self._edges.pop((parent, node), None)
+            for child in self._children.pop(node):
+                if child != node: # self-loops were already dropped above
+                    self._parents[child].pop(node, None)
+                    self._edges.pop((node, child), None)
+            # Removing from the list keeps the order of the remaining nodes
             self.nodes.remove(node)
             self.num_nodes = len(self.nodes)
+            self._topo_rank = None
         else:
             raise NameError("Node not in the given graph")
         
@@ -322,8 +351,11 @@ class DGraph(object):
             node_b: String
                 The name of the second node.
         """
-        if node_a in self.nodes and node_b in self.nodes and (node_a, node_b) not in self.edges:
-            self.edges.append((node_a, node_b))
+        if node_a in self._parents and node_b in self._parents and (node_a, node_b) not in self._edges:
+            self._children[node_a][node_b] = None
+            self._parents[node_b][node_a] = None
+            self._edges[(node_a, node_b)] = None
+            self._topo_rank = None
             
     def remove_edge(self, node_a: str, node_b: str):
         """
@@ -337,8 +369,11 @@ class DGraph(object):
             node_b: String
                 The name of the second node.
         """
-        if (node_a, node_b) in self.edges:
-            self.edges.remove((node_a, node_b))
+        if (node_a, node_b) in self._edges:
+            del self._children[node_a][node_b]
+            del self._parents[node_b][node_a]
+            del self._edges[(node_a, node_b)]
+            self._topo_rank = None
             
 
     # Comment for porperties: Properties are the preferred way of not using explicit
@@ -369,12 +404,8 @@ class DGraph(object):
             list
                 A list containing all parent nodes of the specified node.
         """
-        if node in self.nodes:
-            parents = []
-            for parent in self.nodes:
-                if (parent, node) in self.edges:
-                    parents.append(parent)
-            return parents
+        if node in self._parents:
+            return list(self._parents[node])
         else:
             raise NameError("node not in Graph")
 
@@ -394,12 +425,8 @@ class DGraph(object):
             list
                 A list containing all children nodes of the specified node.
         """
-        if node in self.nodes:
-            children = []
-            for child in self.nodes:
-                if (node, child) in self.edges:
-                    children.append(child)
-            return children
+        if node in self._children:
+            return list(self._children[node])
         else:
             raise NameError("node not in Graph")
 
@@ -424,6 +451,17 @@ class DGraph(object):
         
         visited = set() #making sure it works for cyclic graphs
 
+        # In an acyclic graph every ancestor of node_b comes before node_b in
+        # a topological order, so nodes ranked before node_a can be skipped.
+        rank = self._get_topological_rank()
+        if rank is not None and node_a in rank:
+            if rank[node_a] >= rank[node_b]:
+                return False
+            min_rank = rank[node_a]
+            ancestors = [p for p in ancestors if rank[p] >= min_rank]
+        else:
+            rank, min_rank = None, None
+
         while ancestors:
             current_node = ancestors.pop()
             if current_node in visited: #here we check for nodes that were already visited and skip them
@@ -431,9 +469,8 @@ class DGraph(object):
             visited.add(current_node)
             if current_node == node_a:
                 return True
-            current_parents = self.get_parents(current_node)
-            for parent in current_parents:
-                if parent not in ancestors:
+            for parent in self._parents[current_node]:
+                if parent not in visited and (rank is None or rank[parent] >= min_rank):
                     ancestors.append(parent)
         return False # ancestors is now empty and we have not visited node_a
         
@@ -467,9 +504,8 @@ class DGraph(object):
             visited.add(current_node)
             if current_node == node_a:
                 return True
-            current_children = self.get_children(current_node)
-            for child in current_children:
-                if child not in descendants:
+            for child in self._children[current_node]:
+                if child not in visited:
                     descendants.append(child)
         return False # descendants is now empty and we have not visited node_a
 
@@ -482,10 +518,94 @@ class DGraph(object):
             bool
                 True if there are no cycles within the provided graph, False otherwise.
         """
-        for node in self.nodes:
-            if self.is_descendant(node, node):
-                return False
-        return True
+        return self.find_cycle() is None
+
+    def find_cycle(self) -> Optional[List[str]]:
+        """
+            Searches the graph for a directed cycle using Kahn's algorithm,
+            which runs in O(N+E).
+
+            Returns
+            -------
+            list or None
+                None if the graph is acyclic. Otherwise a list of nodes
+                [n_0, ..., n_k] forming a cycle, i.e. there are edges
+                n_i -> n_(i+1) and an edge n_k -> n_0.
+        """
+        order = self._kahn()
+        if len(order) == len(self.nodes):
+            return None
+        # Every node that Kahn's algorithm could not remove still has a parent
+        # that was not removed either. Walking these parents backwards must
+        # therefore eventually revisit a node, which closes a cycle.
+        removed = set(order)
+        node = next(n for n in self.nodes if n not in removed)
+        walk = []
+        position = {}
+        while node not in position:
+            position[node] = len(walk)
+            walk.append(node)
+            node = next(p for p in self._parents[node] if p not in removed)
+        cycle = walk[position[node]:]
+        cycle.reverse()
+        return cycle
+
+    def topological_order(self) -> List[str]:
+        """
+            Computes a topological order of all nodes, i.e. every node
+            appears after all of its parents. The order is cached until
+            the graph is modified and is used to prune ancestor queries.
+
+            Returns
+            -------
+            list
+                A list containing all nodes in topological order.
+
+            Raises
+            ------
+            ValueError
+                If the graph contains a cycle.
+        """
+        rank = self._get_topological_rank()
+        if rank is None:
+            raise ValueError("The graph contains a cycle: {}".format(self.find_cycle()))
+        order = [None] * len(rank)
+        for node, position in rank.items():
+            order[position] = node
+        return order
+
+    def _kahn(self) -> List[str]:
+        """
+            Private helper running Kahn's algorithm. Returns the nodes in the
+            order they were removed, which leaves out all nodes that are part
+            of or reachable from a cycle.
+        """
+        in_degree = {node: len(self._parents[node]) for node in self.nodes}
+        queue = [node for node in self.nodes if in_degree[node] == 0]
+        order = []
+        while queue:
+            node = queue.pop()
+            order.append(node)
+            for child in self._children[node]:
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
+        return order
+
+    def _get_topological_rank(self) -> Optional[Dict[str, int]]:
+        """
+            Private helper returning the (cached) node:position map of a
+            topological order, or None if the graph is cyclic.
+        """
+        if self._topo_rank is None:
+            order = self._kahn()
+            if len(order) == len(self.nodes):
+                self._topo_rank = {node: i for i, node in enumerate(order)}
+            else:
+                self._topo_rank = False
+        if self._topo_rank is False:
+            return None
+        return self._topo_rank
 
 
 
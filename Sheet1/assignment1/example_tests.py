@@ -95,6 +95,38 @@ class TestAssignment1(unittest.TestCase):
         g.remove_edge("A","B")
         self.assertFalse(g.is_ancestor("A", "C"))
 
+    def test_remove_node_drops_edges(self):
+        g = solution.DGraph()
+        g.add_node("A")
+        g.add_node("B")
+        g.add_node("C")
+        g.add_edge("A","B")
+        g.add_edge("B","C")
+        g.add_edge("B","B")
+        g.remove_node("B")
+        self.assertEqual(g.edges, [])
+        self.assertEqual(g.get_children("A"), [])
+        self.assertEqual(g.nodes, ["A","C"])
+
+    def test_neighbour_order(self):
+        g = solution.DGraph()
+        for node in ["A","B","C","D"]:
+            g.add_node(node)
+        g.add_edge("C","D")
+        g.add_edge("A","D")
+        g.add_edge("B","D")
+        g.add_edge("A","B")
+        self.assertEqual(g.get_parents("D"), ["C","A","B"])
+        self.assertEqual(g.edges, [("C","D"),("A","D"),("B","D"),("A","B")])
+        g.edges.append(("D","C"))
+        self.assertEqual(g.edges, [("C","D"),("A","D"),("B","D"),("A","B")])
+        g.remove_node("A")
+        self.assertEqual(g.nodes, ["B","C","D"])
+        self.assertEqual(g.get_parents("D"), ["C","B"])
+        g.remove_node("B")
+        self.assertEqual(g.nodes, ["C","D"])
+        self.assertEqual(g.edges, [("C","D")])
+
     def test_get_number_of_nodes(self):
         g = solution.DGraph()
         g.add_node("A")
@@ -108,6 +140,23 @@ class TestAssignment1(unittest.TestCase):
         g.add_edge("A","B")
         self.assertTrue(g.is_acyclic()) # A graph with only 1 (directed) edge cannot be cyclic
 
+    def test_find_cycle(self):
+        g = solution.DGraph()
+        for n in ["A","B","C","D"]:
+            g.add_node(n)
+        g.add_edge("A","B")
+        g.add_edge("B","C")
+        g.add_edge("C","D")
+        self.assertIsNone(g.find_cycle())
+        self.assertEqual(g.topological_order(), ["A","B","C","D"])
+        g.add_edge("D","B")
+        self.assertFalse(g.is_acyclic())
+        cycle = g.find_cycle()
+        self.assertEqual(set(cycle), {"B","C","D"})
+        for i, node in enumerate(cycle):
+            self.assertTrue(cycle[(i+1) % len(cycle)] in g.get_children(node))
+        self.assertRaises(ValueError, g.topological_order)
+
 if __name__ == "__main__":
     unittest.main()
         
\ No newline at end of file
@@ -9,8 +9,17 @@ Last modified on Wed Nov 13 2023
 from ccbase.networks import Graph
 from ccbase.nodes import Node
 from ccbase.networks import BayesianNetwork
+from ccbase.networks import CompactGraph
+from ccbase.networks import UndirectedView, InducedSubgraphView
 from ccbase.nodes import DiscreteVariable
-from ccbase.factor import Factor
+from ccbase.factor import Factor, logsumexp
+from ccbase.independence import is_d_separated, is_moral_separated, IndependenceOracle
+from ccbase.elimination import get_interaction_graph, min_fill_ordering
+from ccbase.pruning import prune_network
+from ccbase.contraction import contract_query
+from ccbase.sparse import SparseFactor, to_sparse_if_beneficial
+
+import numpy as np
 
 from typing import Union, Optional, List, Dict, Iterable, Tuple
 
@@ -128,9 +137,11 @@ def unblocked_path_exists(dg, node_x, node_y, nodes_z):
             if nodeX == nodeY:
                 paths.append(tempPath)
 
-            for node in dg.to_undirected().get_children(nodeX):
+            for node in undirected.get_children(nodeX):
                 getPaths(node, nodeY, list(tempPath))
 
+    undirected = UndirectedView(dg)
+
     paths = []
     getPaths(node_x, node_y, [])
 
@@ -166,12 +177,9 @@ def check_independence(dg, nodes_x, nodes_y, nodes_z):
             True if all nodes in nodes_x are conditionally independent of all
             nodes in nodes_y given the nodes in nodes_z, False otherwise.
     """
-
-    for nodeX in nodes_x:
-        for nodeY in nodes_y:
-            if unblocked_path_exists(dg, nodeX, nodeY, nodes_z):
-                return False
-    return True
+    # Enumerating all paths via unblocked_path_exists is exponential in the
+    # size of the graph, the Bayes-Ball sweep is linear instead.
+    return is_d_separated(dg, nodes_x, nodes_y, nodes_z)
 
 def make_ancestral_graph(graph: Graph, nodes: Iterable[Union[Node, str]]) -> Graph:
     """
@@ -187,21 +195,20 @@ def make_ancestral_graph(graph: Graph, nodes: Iterable[Union[Node, str]]) -> Gra
         Returns
         -------
         ccbase.networks.Graph
-            The resulting ancestral graph.
+            The resulting ancestral graph, a copy that can be modified
+            independently of the given graph.
     """
 
-    ancestralGraph = graph.copy()
-    nodesToRemove = []
-
-    for node in ancestralGraph.nodes:
-        #check if node and his children are not in nodes
-        if not node in nodes and not any(ancestralGraph.is_ancestor(node, node2) for node2 in nodes):
-            nodesToRemove.append(node)
-
-    for node in nodesToRemove:
-        ancestralGraph.remove_node(node)
+    # Collect the nodes and all their ancestors, instead of checking
+    # every node of the graph against every given node.
+    ancestors = {}
+    for node in nodes:
+        ancestors[getattr(node, "name", node)] = None
+        for ancestor in graph.get_ancestors(node):
+            ancestors[getattr(ancestor, "name", ancestor)] = None
 
-    return ancestralGraph
+    # The view selects the nodes, copying its structure only copies them
+    return InducedSubgraphView(graph, [n for n in graph.nodes if n in ancestors]).copy_structure()
 
 def make_moral_graph(graph: Graph) -> Graph:
     """
@@ -221,15 +228,15 @@ def make_moral_graph(graph: Graph) -> Graph:
 
     # Function from Ex2
     def find_immoralities(graph: Graph, immoralities):
-        for node in graph.nodes.values():
+        for node in graph.nodes:
             parents = list(graph.get_parents(node))
             while parents:
                 current_parent = parents.pop()
                 for parent in parents:
-                    if current_parent not in parent.children and current_parent not in parent.parents:
+                    if current_parent not in graph.get_children(parent) and current_parent not in graph.get_parents(parent):
                         immoralities.append((current_parent, parent))
 
-    moralGraph = graph.copy()
+    moralGraph = graph.copy_structure()
     immoralities = []
     find_immoralities(graph, immoralities)
 
@@ -256,7 +263,7 @@ def separation(graph: Graph, nodes_z: Iterable[Union[Node, str]]) -> Graph:
             The resulting graph with all links from the nodes in node_z
             removed.
     """
-    separatedGraph = graph.copy()
+    separatedGraph = graph.copy_structure()
 
     for node in nodes_z:
         separatedGraph.remove_node(node)
@@ -273,7 +280,7 @@ def check_independence_general(graph: Graph, nodes_x: Iterable[Union[Node, str]]
         
         Parameters
         ---------
-        dg: ccbase.networks.Graph
+        graph: ccbase.networks.Graph
             The directed or undirected graph that should contain all the nodes.
         nodes_x: iterable of ccbase.nodes.Node or String
             The nodes that should be conditionally independent of the nodes
@@ -292,23 +299,10 @@ def check_independence_general(graph: Graph, nodes_x: Iterable[Union[Node, str]]
             nodes in nodes_y given the nodes in nodes_z, False otherwise.
     """
 
-    undirectedGraph = graph.to_undirected()
-    nodes = set(nodes_x) | set(nodes_y) | set(nodes_z)
-
-    ancestralGraph = make_ancestral_graph(undirectedGraph, nodes)
-    moralGraph = make_moral_graph(ancestralGraph)
-    separatedGraph = separation(moralGraph, nodes_z)
-
-    for nodeX in nodes_x:
-        for nodeY in nodes_y:
-            if separatedGraph.is_ancestor(nodeX, nodeY):
-                return False
-
-            for node in separatedGraph.nodes:
-                if separatedGraph.is_ancestor(node, nodeX) and separatedGraph.is_ancestor(node, nodeY):
-                    return False
-
-    return True
+    # Instead of building the ancestral, moral and separated graphs as
+    # copies, the components of the separated moral graph are labeled
+    # once and compared for all nodes in nodes_x and nodes_y.
+    return is_moral_separated(graph, nodes_x, nodes_y, nodes_z)
     
 
 def get_elimination_ordering(bn: BayesianNetwork) -> List[str]:
@@ -333,43 +327,14 @@ def get_elimination_ordering(bn: BayesianNetwork) -> List[str]:
             you should describe another heuristic and explain how it works
             and what the differences are with respect to the MinFillOrder.
     """
-    elimination_ordering = []
-    undirected = bn.to_undirected()
-    
-    # Continue until all nodes are eliminated
-    while undirected.nodes:
-        fills = []
-        
-        # Calculate the fill-in sets for each node
-        for node in undirected.nodes:
-            fill_of_node = []
-            neighbors = undirected.get_children(node)
-
-            # Check for missing edges between neighbors
-            for cur_neighbor in neighbors:
-                for neighbor_to_check in neighbors:
-                    if neighbor_to_check != cur_neighbor and neighbor_to_check not in undirected.get_children(cur_neighbor):
-                        fill_of_node.append((cur_neighbor, neighbor_to_check))
-                
-            fills.append((node, fill_of_node))
-        
-        #print(fills)
-        #print(min(fills, key=lambda x: len(x[1])))
-        
-        # Choose the variable for elimination based on the minimum fill-in set size
-        elimination_node, new_edges = min(fills, key=lambda x: len(x[1]))
-        
-        # Add edges between neighbors with no edges and delete the chosen elimination node
-        for edge in new_edges:
-            undirected.add_edge(*edge)
-        undirected.remove_node(elimination_node)
-        elimination_ordering.append(elimination_node)
-
-    return elimination_ordering
-        
+    # The heap based engine only rescores the nodes affected by each
+    # elimination instead of recomputing the fill-in of every node.
+    names, adj = get_interaction_graph(bn)
+    return [names[i] for i in min_fill_ordering(adj)]
 
 
-def initialize_factors(bn: BayesianNetwork, evidence: Optional[Dict[str, str]] = None) -> Iterable[Factor]:
+def initialize_factors(bn: BayesianNetwork, evidence: Optional[Dict[str, str]] = None,
+                        mode: str = "mask") -> Iterable[Factor]:
     """
         Creates and returns a factor for every node in the Bayesian network initialized according
         to the node's CPTs while taking the given evidence into account.
@@ -382,6 +347,9 @@ def initialize_factors(bn: BayesianNetwork, evidence: Optional[Dict[str, str]] =
         evidence: Dict[str, str], optional
             A dictionary containing the evidence variables as keys and their
             observed outcomes as values. 
+        mode: str, optional (default: "mask")
+            How the factors are reduced by the evidence, see 
+            `Factor.reduce`.
 
         Returns
         -------
@@ -390,10 +358,12 @@ def initialize_factors(bn: BayesianNetwork, evidence: Optional[Dict[str, str]] =
             node in the BayesianNetwork, properly initialized.
     """
     factors = []
-    for node in bn.nodes:
-        factor = Factor()
-        if evidence and node.name in evidence:
-            factor.reduce(evidence[node.name])
+    for node in bn.nodes.values():
+        factor = Factor.from_node(node)
+        if evidence:
+            node_evidence = {v: evidence[v] for v in factor.variable_order if v in evidence}
+            if node_evidence:
+                factor = factor.reduce(node_evidence, mode)
         factors.append(factor)
     return factors
 
@@ -415,21 +385,25 @@ def sum_product_elim_var(factors: Iterable[Factor], variable: str) -> Iterable[F
             The remaining factors that do no longer include the eliminated variable.
     """
     remaining_factors = []
+    containing = []
     for factor in factors:
-        if variable in factor.variable_order and len(factor.variable_order) > 1:
-            marginalized_factor = factor.marginalize(variable)
-            remaining_factors.append(marginalized_factor)
-        elif variable not in factor.variable_order:
+        if variable in factor.variable_order:
+            containing.append(factor)
+        else:
             remaining_factors.append(factor)
-    result_factor = remaining_factors[0]
-    for factor in remaining_factors[1:]:
-        result_factor = result_factor.multiply(factor)
-    return [result_factor]
+    if containing:
+        # Multiplying and summing out in one contraction avoids building
+        # the full product of the factors.
+        remaining_factors.append(Factor.sum_product(containing, [variable]))
+    return remaining_factors
 
 
 def calculate_probabilities(bn: BayesianNetwork,
                         variables: Union[str, DiscreteVariable], 
-                        evidence: Optional[Dict[str,str]] = None) -> Factor:
+                        evidence: Optional[Dict[str,str]] = None,
+                        method: str = "elimination",
+                        log_space: bool = False,
+                        sparse: bool = False) -> Factor:
     """
         Calculates P(variables|evidence) for all outcome combinations of
         variables  (i.e. you should return a table similar to a cpt, 
@@ -454,6 +428,19 @@ def calculate_probabilities(bn: BayesianNetwork,
             A dictionary containing the evidence variables as keys and their
             observed outcomes as values. If evidence is not given, the prior
             marginals should be computed.
+        method: str, optional (default: "elimination")
+            "elimination" runs variable elimination in min-fill order,
+            "contraction" contracts all CPTs as one tensor network along a
+            searched contraction tree (see ccbase.contraction).
+        log_space: bool, optional (default: False)
+            If True, variable elimination works on factors in log space, 
+            which cannot underflow even with hundreds of evidence 
+            variables. The result is still normalized and not in log space.
+        sparse: bool, optional (default: False)
+            If True, factors with mostly zero potentials, e.g. from 
+            deterministic CPTs, are stored sparsely (see ccbase.sparse). 
+            Intermediate factors switch between both representations 
+            depending on their density.
             
         Returns
         -------
@@ -461,8 +448,48 @@ def calculate_probabilities(bn: BayesianNetwork,
             A Factor over the specified variables, specifying the joint (posterior) probability
             of these variables.
     """
-
-
+    if isinstance(variables, (str, DiscreteVariable)):
+        variables = [variables]
+    if method not in ("elimination", "contraction"):
+        raise ValueError("Unknown inference method {}".format(method))
+    if method == "contraction" and log_space:
+        raise ValueError("The contraction method does not support log space factors")
+    if method == "contraction" and sparse:
+        raise ValueError("The contraction method does not support sparse factors")
+    if log_space and sparse:
+        raise ValueError("Sparse factors cannot be used in log space")
+    variables = [getattr(v, "name", v) for v in variables]
+    if method == "contraction":
+        return contract_query(bn, variables, evidence)[0]
+    # Only the part of the network that can influence the query is
+    # eliminated, see ccbase.pruning.
+    pruned = prune_network(bn, variables, evidence)
+    evidence = {v: o for v, o in (evidence or {}).items() if v in pruned.nodes}
+
+    # Observed variables that are not queried are sliced out of the
+    # factors, observed query variables are masked to keep their outcomes.
+    factors = initialize_factors(pruned, {v: o for v, o in evidence.items() if v not in variables}, "drop")
+    query_evidence = {v: o for v, o in evidence.items() if v in variables}
+    if query_evidence:
+        factors = [f.reduce(query_evidence) for f in factors]
+    if log_space:
+        factors = [f.to_log() for f in factors]
+    if sparse:
+        factors = [to_sparse_if_beneficial(f) for f in factors]
+    for variable in get_elimination_ordering(pruned):
+        if variable not in variables:
+            factors = sum_product_elim_var(factors, variable)
+    res = Factor.sum_product(factors)
+    if isinstance(res, SparseFactor):
+        res = res.to_dense()
+    res.potentials = np.transpose(res.potentials, [res.variable_order.index(v) for v in variables])
+    res.variable_order = list(variables)
+    if res.log:
+        res.potentials = np.exp(res.potentials - logsumexp(res.potentials))
+        res.log = False
+    else:
+        res.potentials = res.potentials / np.sum(res.potentials)
+    return res
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+"""
+Small benchmarks for the graph and inference code in ccbase. Run with
+"python benchmarks.py" from this directory.
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from ccbase.networks import Graph, BayesianNetwork
+from ccbase.independence import is_d_separated, get_d_connection_matrix
+from ccbase.elimination import get_interaction_graph, min_fill_ordering
+from ccbase.elimination import find_elimination_ordering, search_elimination_ordering
+from ccbase.contraction import contract_query
+from assignment3 import calculate_probabilities
+
+from typing import Callable
+
+
+def timeit(func: Callable, repeat: int = 3) -> float:
+    """
+        Returns the best wall clock time in seconds out of repeat calls of func.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_chain(length: int) -> Graph:
+    """
+        Creates a directed chain n0 -> n1 -> ... -> n(length-1), e.g. an
+        unrolled temporal network with a single variable per slice.
+    """
+    graph = Graph()
+    for i in range(length):
+        graph.add_node("n{}".format(i))
+    for i in range(1, length):
+        graph.add_edge("n{}".format(i-1), "n{}".format(i))
+    return graph
+
+
+def make_random_dag(num_nodes: int, max_parents: int = 3, seed: int = 0) -> Graph:
+    """
+        Creates a random DAG where every node n_i gets up to max_parents
+        parents among the nodes n_0 ... n_(i-1).
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(num_nodes):
+        graph.add_node("n{}".format(i))
+        for p in set(rng.randrange(i) for _ in range(rng.randint(0, max_parents)) if i):
+            graph.add_edge("n{}".format(p), "n{}".format(i))
+    return graph
+
+
+def make_local_dag(num_nodes: int, max_parents: int = 3, window: int = 30, seed: int = 0) -> Graph:
+    """
+        Creates a random DAG where every node n_i gets up to max_parents
+        parents among the window nodes before it. Unlike `make_random_dag`
+        this keeps the treewidth bounded, as in most real networks.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(num_nodes):
+        graph.add_node("n{}".format(i))
+        for p in set(rng.randrange(max(0, i - window), i) for _ in range(rng.randint(0, max_parents)) if i):
+            graph.add_edge("n{}".format(p), "n{}".format(i))
+    return graph
+
+
+def make_local_network(num_nodes: int, max_parents: int = 3, window: int = 30, seed: int = 0) -> BayesianNetwork:
+    """
+        Creates a binary BayesianNetwork with random CPTs on the structure
+        of `make_local_dag`.
+    """
+    graph = make_local_dag(num_nodes, max_parents, window, seed)
+    names = list(graph.nodes)
+    index = {name: i for i, name in enumerate(names)}
+    edges = [(index[p], index[n]) for n in names for p in graph.get_parents(n)]
+    src, dst = (np.array(e, dtype=np.int64) for e in zip(*edges))
+    bn = BayesianNetwork.from_arrays(names, [["t", "f"]] * num_nodes, src, dst)
+    rng = np.random.RandomState(seed)
+    for node in bn.nodes.values():
+        table = rng.rand(*(2,) * (len(node.parent_order) + 1))
+        node.cpt = table / table.sum(axis=0)
+    return bn
+
+
+def recursive_ancestors(graph: Graph, node: str) -> set:
+    """
+        The previous recursive implementation of Graph.get_ancestors,
+        kept as reference for the traversal benchmark.
+    """
+    def _add_parents(tmpNode):
+        for p in tmpNode.parents.values():
+            if p in res:
+                continue
+            res.add(p)
+            _add_parents(p)
+    res = set()
+    _add_parents(graph.nodes[node])
+    return res
+
+
+def bench_traversals(length: int = 5000):
+    """
+        Compares the iterative traversals against the old recursive one
+        on a deep chain.
+    """
+    graph = make_chain(length)
+    last = "n{}".format(length - 1)
+    try:
+        recursive = "{:.4f}s".format(timeit(lambda: recursive_ancestors(graph, last)))
+    except RecursionError:
+        recursive = "RecursionError"
+    print("chain of {} nodes (recursion limit {})".format(length, sys.getrecursionlimit()))
+    print("  get_ancestors recursive: {}".format(recursive))
+    print("  get_ancestors iterative: {:.4f}s".format(timeit(lambda: graph.get_ancestors(last))))
+    print("  get_descendants:         {:.4f}s".format(timeit(lambda: graph.get_descendants("n0"))))
+    print("  is_acyclic:              {:.4f}s".format(timeit(graph.is_acyclic)))
+
+
+def bench_d_separation(num_nodes: int = 300, queries: int = 1000):
+    """
+        Times Bayes-Ball d-separation queries with random single nodes and
+        small conditioning sets on a random DAG.
+    """
+    graph = make_random_dag(num_nodes)
+    rng = random.Random(1)
+    names = list(graph.nodes)
+    tests = [(rng.sample(names, 1), rng.sample(names, 1), rng.sample(names, 3)) for _ in range(queries)]
+    duration = timeit(lambda: [is_d_separated(graph, x, y, z) for x, y, z in tests], repeat=1)
+    print("{} d-separation queries on {} nodes: {:.4f}s".format(queries, num_nodes, duration))
+
+
+def bench_d_connection_matrix(num_nodes: int = 200):
+    """
+        Compares the all-pairs d-connection matrix against one d-separation
+        query per pair.
+    """
+    graph = make_random_dag(num_nodes)
+    names = list(graph.nodes)
+    nodes_z = names[::20]
+    pairwise = lambda: [is_d_separated(graph, [x], [y], nodes_z) for x in names for y in names]
+    print("all pairs d-connection given {} of {} nodes".format(len(nodes_z), num_nodes))
+    print("  pairwise queries: {:.4f}s".format(timeit(pairwise, repeat=1)))
+    print("  matrix:           {:.4f}s".format(timeit(lambda: get_d_connection_matrix(graph, nodes_z))))
+
+
+def bench_elimination_ordering(num_nodes: int = 10000):
+    """
+        Times the min-fill ordering on networks of increasing width.
+    """
+    for window in (10, 30):
+        graph = make_local_dag(num_nodes, window=window)
+        duration = timeit(lambda: min_fill_ordering(get_interaction_graph(graph)[1]), repeat=1)
+        print("min-fill ordering of {} nodes (window {}): {:.4f}s".format(num_nodes, window, duration))
+
+
+def bench_ordering_search(num_nodes: int = 300, time_budget: float = 2.0):
+    """
+        Compares the total table size of the greedy min-fill ordering with
+        the best ordering of a randomized search.
+    """
+    graph = make_local_dag(num_nodes, window=15, seed=2)
+    _, cost = find_elimination_ordering(graph)
+    print("total table size of {} nodes, min-fill: {}".format(num_nodes, cost.multiply_adds))
+    _, cost = search_elimination_ordering(graph, time_budget=time_budget)
+    print("  after {}s of randomized search:  {}".format(time_budget, cost.multiply_adds))
+
+
+def bench_contraction(num_nodes: int = 400):
+    """
+        Compares variable elimination with the tensor network contraction
+        of the whole query, with and without randomized restarts.
+    """
+    bn = make_local_network(num_nodes, max_parents=5, window=12, seed=3)
+    names = list(bn.nodes)
+    query = [max(names, key=lambda n: len(bn.get_ancestors(n)))]
+    evidence = {n: "t" for n in names[5::40] if n not in query}
+    duration = timeit(lambda: calculate_probabilities(bn, query, evidence), repeat=1)
+    print("P({}|{} observed) in a network of {} nodes".format(query[0], len(evidence), num_nodes))
+    print("  variable elimination:    {:.4f}s".format(duration))
+    for restarts in (0, 4):
+        start = time.perf_counter()
+        _, plan = contract_query(bn, query, evidence, restarts=restarts)
+        print("  contraction, {} restarts: {:.4f}s ({} flops, {} bytes peak)".format(
+            restarts, time.perf_counter() - start, plan.flops, plan.peak_bytes))
+
+
+def bench_sparse_factors(outcomes: int = 40):
+    """
+        Compares dense and sparse variable elimination on a network with
+        deterministic CPTs of three parents with many outcomes each.
+    """
+    names = ["X", "Y", "W", "Z", "V"]
+    bn = BayesianNetwork.from_arrays(names, [["o{}".format(i) for i in range(outcomes)]] * len(names),
+                                     np.array([0, 1, 2, 3, 0, 1]), np.array([3, 3, 3, 4, 4, 4]))
+    rng = np.random.RandomState(0)
+    for name in ["X", "Y", "W"]:
+        bn.nodes[name].cpt = rng.dirichlet(np.ones(outcomes))
+    # Z and V are deterministic functions of their parents
+    a, b, c = np.indices((outcomes,) * 3)
+    for name, child in [("Z", (a + b + c) % outcomes), ("V", (a * b + c) % outcomes)]:
+        cpt = np.zeros((outcomes,) * 4)
+        cpt[child, a, b, c] = 1
+        bn.nodes[name].cpt = cpt
+    print("P(V|W) with deterministic CPTs of {} outcomes".format(outcomes))
+    for sparse in (False, True):
+        duration = timeit(lambda: calculate_probabilities(bn, ["V"], {"W": "o3"}, sparse=sparse), repeat=1)
+        print("  {}: {:.4f}s".format("sparse" if sparse else "dense ", duration))
+
+
+if __name__ == "__main__":
+    bench_traversals(500)
+    bench_traversals(5000)
+    bench_traversals(100000)
+    bench_d_separation()
+    bench_d_connection_matrix()
+    bench_elimination_ordering()
+    bench_ordering_search()
+    bench_contraction()
+    bench_sparse_factors()
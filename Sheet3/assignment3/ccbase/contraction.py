@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exact inference by contracting all CPTs of a network as one tensor
+network. Instead of eliminating one variable after the other, the tensors
+are contracted pairwise along a contraction tree, which is searched for
+greedily (optionally with randomized restarts) before any computation.
+Each pairwise contraction is executed with np.tensordot; pairs that share
+a variable which is still needed later (a batch dimension) fall back to a
+pairwise np.einsum.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import random
+from collections import namedtuple
+
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .factor import Factor
+from .networks import BayesianNetwork
+from .nodes import DiscreteVariable
+from .pruning import prune_network
+
+ContractionPlan = namedtuple("ContractionPlan", ["path", "flops", "peak_bytes"])
+
+# The number of cheapest pairs a randomized search samples from
+_SAMPLE_SIZE = 8
+
+
+def _size(labels: Iterable[str], sizes: Dict[str, int]) -> int:
+    res = 1
+    for label in labels:
+        res *= sizes[label]
+    return res
+
+
+def _greedy_path(inputs: List[Tuple[str, ...]], output: Sequence[str], sizes: Dict[str, int],
+                    rng: Optional[random.Random] = None, temperature: float = 1.0,
+                    itemsize: int = 8) -> ContractionPlan:
+    """
+        Private helper computing one greedy contraction tree. In every step
+        the pair of tensors sharing a variable whose contraction reduces the
+        total size the most (result size minus operand sizes) is contracted.
+        With an rng, a pair is sampled with probability decreasing
+        exponentially with its cost instead, scaled by the temperature.
+    """
+    tensors = {i: tuple(labels) for i, labels in enumerate(inputs)}
+    output = set(output)
+    # The remaining tensors containing each label
+    by_label = {}
+    for i, labels in tensors.items():
+        for label in labels:
+            by_label.setdefault(label, set()).add(i)
+
+    def _candidate(a: int, b: int) -> Tuple[int, Tuple[str, ...]]:
+        la, lb = tensors[a], tensors[b]
+        result = tuple(dict.fromkeys(l for l in la + lb
+                                     if l in output or len(by_label[l]) > (l in la) + (l in lb)))
+        return _size(result, sizes) - _size(la, sizes) - _size(lb, sizes), result
+
+    # Cost and result labels of all pairs sharing a label. The cost of a
+    # pair only changes if one of its tensors shares a label with a
+    # contracted pair, so only those are recomputed after each step. The
+    # heap may contain outdated entries, which are skipped when popped.
+    candidates = {}
+    pairs = {i: set() for i in tensors}
+    heap = []
+
+    def _add_candidates(ids: Iterable[int]):
+        for i in ids:
+            for label in tensors[i]:
+                for j in by_label[label]:
+                    pair = (min(i, j), max(i, j))
+                    if j != i and pair not in candidates:
+                        candidates[pair] = _candidate(*pair)
+                        pairs[i].add(pair)
+                        pairs[j].add(pair)
+                        heapq.heappush(heap, (candidates[pair][0], pair))
+
+    def _pop() -> Tuple[int, Tuple[int, int]]:
+        while True:
+            cost, pair = heapq.heappop(heap)
+            if candidates.get(pair, (None,))[0] == cost:
+                return cost, pair
+
+    _add_candidates(list(tensors))
+    live = sum(_size(labels, sizes) for labels in tensors.values())
+    peak = live
+    flops = 0
+    path = []
+    next_id = len(inputs)
+    while len(tensors) > 1:
+        if not candidates:
+            # Only outer products remain, combine the two smallest tensors
+            a, b = sorted(sorted(tensors), key=lambda i: _size(tensors[i], sizes))[:2]
+            candidates[(a, b)] = _candidate(a, b)
+            pairs[a].add((a, b))
+            pairs[b].add((a, b))
+            heap = [(candidates[(a, b)][0], (a, b))]
+        if rng is None:
+            _, (a, b) = _pop()
+        else:
+            # Sample among the cheapest pairs and return the others
+            best = [_pop() for _ in range(min(_SAMPLE_SIZE, len(candidates)))]
+            scale = temperature * max(1, abs(best[0][0]))
+            weights = [math.exp(-(cost - best[0][0]) / scale) for cost, _ in best]
+            _, (a, b) = rng.choices(best, weights)[0]
+            for entry in best:
+                heapq.heappush(heap, entry)
+        result = candidates[(a, b)][1]
+
+        la, lb = tensors[a], tensors[b]
+        affected = set()
+        for label in set(la) | set(lb):
+            affected |= by_label[label]
+        for i in affected:
+            for pair in pairs.pop(i):
+                if candidates.pop(pair, None) is not None:
+                    pairs.get(pair[0] if pair[1] == i else pair[1], set()).discard(pair)
+        for label in la:
+            by_label[label].discard(a)
+        for label in lb:
+            by_label[label].discard(b)
+        del tensors[a], tensors[b]
+        tensors[next_id] = result
+        for label in result:
+            by_label[label].add(next_id)
+        affected -= {a, b}
+        affected.add(next_id)
+        for i in affected:
+            pairs[i] = set()
+        _add_candidates(affected)
+
+        flops += 2 * _size(set(la) | set(lb), sizes)
+        live += _size(result, sizes)
+        peak = max(peak, live)
+        live -= _size(la, sizes) + _size(lb, sizes)
+        path.append((a, b))
+        next_id += 1
+    return ContractionPlan(path, flops, peak * itemsize)
+
+
+def plan_contraction(inputs: List[Tuple[str, ...]], output: Sequence[str], sizes: Dict[str, int],
+                        restarts: int = 0, seed: int = 0, itemsize: int = 8) -> ContractionPlan:
+    """
+        Searches for a pairwise contraction tree of the given tensors.
+
+        Parameters
+        ----------
+        inputs: list of tuples of String
+            The variables (labels) of every tensor.
+        output: list of String
+            The variables that should not be summed out.
+        sizes: dict
+            The number of outcomes of every variable.
+        restarts: int, optional (default: 0)
+            The number of additional randomized greedy searches. The plan
+            with the fewest predicted flops is returned.
+        seed: int, optional (default: 0)
+            The seed of the randomized searches.
+        itemsize: int, optional (default: 8)
+            The number of bytes per tensor entry.
+
+        Returns
+        -------
+        ContractionPlan
+            The contraction path as pairs of tensor ids (inputs are numbered
+            from 0, the result of the k-th step gets the id len(inputs)+k),
+            the predicted flops (one multiplication and one addition per
+            combination of the variables of each pair) and the predicted
+            peak memory of all live tensors in bytes.
+    """
+    best = _greedy_path(inputs, output, sizes, itemsize=itemsize)
+    rng = random.Random(seed)
+    for _ in range(restarts):
+        plan = _greedy_path(inputs, output, sizes, rng, temperature=rng.uniform(0.1, 1.0), itemsize=itemsize)
+        if (plan.flops, plan.peak_bytes) < (best.flops, best.peak_bytes):
+            best = plan
+    return best
+
+
+def _contract_pair(a: np.ndarray, la: Tuple[str, ...], b: np.ndarray, lb: Tuple[str, ...],
+                    result: Tuple[str, ...]) -> np.ndarray:
+    """
+        Private helper contracting two tensors to the given result labels.
+    """
+    shared = [l for l in la if l in lb]
+    if any(l in result for l in shared):
+        labels = {l: i for i, l in enumerate(dict.fromkeys(la + lb))}
+        return np.einsum(a, [labels[l] for l in la], b, [labels[l] for l in lb],
+                         [labels[l] for l in result])
+    # Sum out variables only present in one of the two tensors first
+    a_only = tuple(i for i, l in enumerate(la) if l not in lb and l not in result)
+    if a_only:
+        a = a.sum(axis=a_only)
+        la = tuple(l for l in la if l in lb or l in result)
+    b_only = tuple(i for i, l in enumerate(lb) if l not in la and l not in result)
+    if b_only:
+        b = b.sum(axis=b_only)
+        lb = tuple(l for l in lb if l in la or l in result)
+    res = np.tensordot(a, b, axes=([la.index(l) for l in shared], [lb.index(l) for l in shared]))
+    res_labels = [l for l in la if l not in shared] + [l for l in lb if l not in shared]
+    return np.transpose(res, [res_labels.index(l) for l in result])
+
+
+def execute_contraction(tensors: List[np.ndarray], inputs: List[Tuple[str, ...]],
+                        output: Sequence[str], plan: ContractionPlan) -> np.ndarray:
+    """
+        Contracts the given tensors along the given plan.
+
+        Parameters
+        ----------
+        tensors: list of np.array
+            The tensors, their dimensions ordered as their labels.
+        inputs: list of tuples of String
+            The variables (labels) of every tensor.
+        output: list of String
+            The variables of the result, in the desired order.
+        plan: ContractionPlan
+            The plan computed by `plan_contraction`.
+
+        Returns
+        -------
+        np.array
+            The contracted tensor over the output variables.
+    """
+    output = tuple(output)
+    arrays = dict(enumerate(tensors))
+    labels = dict(enumerate(tuple(l) for l in inputs))
+    count = {}
+    for l in labels.values():
+        for label in l:
+            count[label] = count.get(label, 0) + 1
+    next_id = len(tensors)
+    for a, b in plan.path:
+        la, lb = labels.pop(a), labels.pop(b)
+        for label in la + lb:
+            count[label] -= 1
+        result = tuple(dict.fromkeys(l for l in la + lb if l in output or count[l] > 0))
+        for label in result:
+            count[label] += 1
+        arrays[next_id] = _contract_pair(arrays.pop(a), la, arrays.pop(b), lb, result)
+        labels[next_id] = result
+        next_id += 1
+    (key, res), = arrays.items()
+    res_labels = labels[key]
+    res = res.sum(axis=tuple(i for i, l in enumerate(res_labels) if l not in output))
+    res_labels = [l for l in res_labels if l in output]
+    return np.transpose(res, [res_labels.index(l) for l in output])
+
+
+def contract_query(bn: BayesianNetwork, variables: Iterable[Union[str, DiscreteVariable]],
+                    evidence: Optional[Dict[str, str]] = None, restarts: int = 0,
+                    seed: int = 0) -> Tuple[Factor, ContractionPlan]:
+    """
+        Computes P(variables|evidence) by contracting the CPTs of the pruned
+        network (see ccbase.pruning) as one tensor network. The evidence
+        variables are sliced out of the CPTs before the contraction, observed
+        query variables are masked to their observed outcome instead.
+
+        Parameters
+        ----------
+        bn: BayesianNetwork
+            The network, all variables need a CPT.
+        variables: iterable of String or DiscreteVariable
+            The variables of interest.
+        evidence: Dict[str, str], optional
+            A dictionary containing the evidence variables as keys and their
+            observed outcomes as values.
+        restarts: int, optional (default: 0)
+            The number of randomized restarts of the contraction tree search.
+        seed: int, optional (default: 0)
+            The seed of the randomized restarts.
+
+        Returns
+        -------
+        Factor, ContractionPlan
+            The normalized factor over the variables, in the given order, and
+            the executed plan including its predicted flops and peak memory.
+
+        Raises
+        ------
+        ValueError
+            If the evidence has probability 0.
+    """
+    variables = [getattr(v, "name", v) for v in variables]
+    evidence = evidence or {}
+    pruned = prune_network(bn, variables, evidence)
+    sizes = {name: len(node.outcomes) for name, node in pruned.nodes.items()}
+    tensors, inputs = [], []
+    for name, node in pruned.nodes.items():
+        labels = [name] + node.parent_order
+        cpt = np.asarray(node.cpt_view)
+        if name in evidence and name in variables:
+            # Observed query variables keep their axis, masked to the observed
+            # outcome, so the result covers all outcomes like the other methods
+            mask = np.zeros(len(node.outcomes))
+            mask[node.outcomes.index(evidence[name])] = 1
+            tensors.append(cpt * mask.reshape((-1,) + (1,) * (cpt.ndim - 1)))
+            inputs.append(tuple(l for l in labels if l == name or l not in evidence))
+            continue
+        index = tuple(node.outcomes.index(evidence[name]) if name == v and v in evidence else slice(None)
+                      for v in labels)
+        tensors.append(cpt[index])
+        inputs.append(tuple(l for l in labels if l not in evidence))
+    plan = plan_contraction(inputs, variables, sizes, restarts, seed)
+    potentials = execute_contraction(tensors, inputs, variables, plan)
+    total = np.sum(potentials)
+    if total == 0:
+        raise ValueError("The evidence {} has probability 0".format(evidence))
+    res = Factor()
+    res.potentials = potentials / total
+    res.variable_order = variables
+    res.outcomes = {v: tuple(bn.nodes[v].outcomes) for v in variables}
+    return res, plan
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Greedy elimination orderings for variable elimination. All computations
+run on the interaction (moral) graph given as a list of integer adjacency
+sets. A heap keyed by (score, node id) selects the next node; after each
+elimination only the nodes whose score can have changed are rescored and
+pushed again, outdated heap entries are skipped when popped.
+
+The heuristics (see HEURISTICS) can take the cardinalities of the
+variables into account, and every ordering comes with a cost report
+(EliminationCost) to pick an ordering before running inference.
+"""
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+
+from typing import Iterable, List, Optional, Set, Tuple
+
+
+def get_interaction_graph(graph) -> Tuple[List[str], List[Set[int]]]:
+    """
+        Computes the interaction graph of the given graph as integer
+        adjacency sets. For directed graphs this is the moral graph, i.e.
+        all parents of a common child are connected and edge directions
+        are dropped.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.Graph
+            The (directed) graph, e.g. a BayesianNetwork.
+
+        Returns
+        -------
+        list, list
+            The node names, defining the integer id of each node, and a list
+            containing the set of neighbour ids of every node.
+    """
+    names = [getattr(node, "name", node) for node in graph.nodes]
+    index = {name: i for i, name in enumerate(names)}
+    adj = [set() for _ in names]
+    for i, name in enumerate(names):
+        parents = [index[getattr(p, "name", p)] for p in graph.get_parents(name)]
+        for j, p in enumerate(parents):
+            adj[i].add(p)
+            adj[p].add(i)
+            if graph.is_directed:
+                for q in parents[j+1:]:
+                    adj[p].add(q)
+                    adj[q].add(p)
+        for c in graph.get_children(name):
+            c = index[getattr(c, "name", c)]
+            adj[i].add(c)
+            adj[c].add(i)
+    for i, neighbours in enumerate(adj):
+        neighbours.discard(i)
+    return names, adj
+
+
+def _fill_in(adj: List[Set[int]], node: int, cards: List[int]) -> int:
+    """
+        Private helper returning the number of edges that eliminating the
+        node would add between its neighbours.
+    """
+    neighbours = adj[node]
+    d = len(neighbours)
+    # Every edge between two neighbours is counted from both ends
+    present = sum(len(adj[a] & neighbours) for a in neighbours) // 2
+    return d * (d - 1) // 2 - present
+
+
+def _weighted_fill_in(adj: List[Set[int]], node: int, cards: List[int]) -> int:
+    """
+        Private helper returning the summed weight of the fill edges, where
+        an edge weighs the product of the cardinalities of its ends.
+    """
+    neighbours = list(adj[node])
+    weight = 0
+    for i, a in enumerate(neighbours):
+        adj_a = adj[a]
+        for b in neighbours[i+1:]:
+            if b not in adj_a:
+                weight += cards[a] * cards[b]
+    return weight
+
+
+def _degree(adj: List[Set[int]], node: int, cards: List[int]) -> int:
+    return len(adj[node])
+
+
+def _weight(adj: List[Set[int]], node: int, cards: List[int]) -> int:
+    """
+        Private helper returning the product of the neighbours' cardinalities,
+        i.e. the size of the factor that remains after eliminating the node.
+    """
+    res = 1
+    for a in adj[node]:
+        res *= cards[a]
+    return res
+
+
+def _size(adj: List[Set[int]], node: int, cards: List[int]) -> int:
+    """
+        Private helper returning the size of the factor created before
+        summing out the node, which also includes the node itself.
+    """
+    return cards[node] * _weight(adj, node, cards)
+
+
+# The available heuristics, each returns the score of eliminating a node next
+HEURISTICS = {
+    "min_fill": _fill_in,
+    "weighted_min_fill": _weighted_fill_in,
+    "min_degree": _degree,
+    "min_weight": _weight,
+    "min_size": _size,
+}
+
+EliminationCost = namedtuple("EliminationCost", ["induced_width", "max_factor_cells",
+                                                 "max_factor_bytes", "multiply_adds"])
+
+
+def _eliminate(adj: List[Set[int]], node: int) -> Set[int]:
+    """
+        Private helper removing the node from the adjacency sets and
+        connecting all its neighbours. Returns the nodes that are adjacent
+        to both ends of one of the added edges.
+    """
+    neighbours = adj[node]
+    adj[node] = set()
+    touched = set()
+    for a in neighbours:
+        adj[a].discard(node)
+    rest = list(neighbours)
+    for i, a in enumerate(rest):
+        adj_a = adj[a]
+        for b in rest[i+1:]:
+            if b not in adj_a:
+                touched.update(adj_a & adj[b])
+                adj_a.add(b)
+                adj[b].add(a)
+    return touched
+
+
+class _CostCounter:
+    """
+        Private helper accumulating the cost of an elimination ordering. The
+        product of the factors containing the eliminated node spans the node
+        and its current neighbours; building it and summing the node out
+        takes about one multiply-add per cell of that intermediate factor.
+    """
+
+    def __init__(self, cards: List[int], itemsize: int):
+        self.cards = cards
+        self.itemsize = itemsize
+        self.width = -1
+        self.max_cells = 0
+        self.multiply_adds = 0
+
+    def add(self, adj: List[Set[int]], node: int):
+        self.width = max(self.width, len(adj[node]))
+        cells = _size(adj, node, self.cards)
+        self.max_cells = max(self.max_cells, cells)
+        self.multiply_adds += cells
+
+    def result(self) -> EliminationCost:
+        return EliminationCost(max(self.width, 0), self.max_cells,
+                               self.max_cells * self.itemsize, self.multiply_adds)
+
+
+def greedy_ordering(adj: List[Set[int]], heuristic: str = "min_fill",
+                    cards: Optional[List[int]] = None,
+                    itemsize: int = 8, tie_breaker: Optional[str] = None,
+                    rng: Optional[random.Random] = None,
+                    max_multiply_adds: Optional[int] = None) -> Tuple[Optional[List[int]], EliminationCost]:
+    """
+        Computes a greedy elimination ordering, always eliminating the node
+        with the smallest score next. Ties are broken by the score of the
+        tie_breaker heuristic, then by a random priority if rng is given
+        and finally by the smaller node id. The adjacency sets are consumed,
+        i.e. they contain the fill edges and no longer the eliminated nodes
+        afterwards.
+
+        Parameters
+        ----------
+        adj: list of sets
+            The interaction graph as integer adjacency sets, see
+            `get_interaction_graph`.
+        heuristic: String, optional (default: "min_fill")
+            The name of the score, one of the keys of `HEURISTICS`.
+        cards: list of int, optional
+            The cardinality of every node, all nodes are treated as binary
+            if not given.
+        itemsize: int, optional (default: 8)
+            The number of bytes per factor entry used in the cost report.
+        tie_breaker: String, optional
+            The name of a second heuristic used to break ties.
+        rng: random.Random, optional
+            If given, the remaining ties are broken randomly instead of by
+            node id.
+        max_multiply_adds: int, optional
+            If given, the search is aborted as soon as the multiply-add
+            estimate exceeds this bound.
+
+        Returns
+        -------
+        list, EliminationCost
+            The node ids in elimination order and the cost of eliminating
+            the nodes in that order. If the search was aborted, the ordering
+            is None and the cost covers the nodes eliminated so far.
+
+        Raises
+        ------
+        ValueError
+            If the heuristic is unknown.
+    """
+    score_fns = []
+    for name in (heuristic, tie_breaker):
+        if name is None:
+            continue
+        try:
+            score_fns.append(HEURISTICS[name])
+        except KeyError:
+            raise ValueError("Unknown heuristic {}, use one of {}".format(name, sorted(HEURISTICS)))
+    if cards is None:
+        cards = [2] * len(adj)
+    fill_based = any(fn in (_fill_in, _weighted_fill_in) for fn in score_fns)
+    priority = [rng.random() for _ in adj] if rng is not None else [0] * len(adj)
+
+    def _key(node: int) -> tuple:
+        return tuple(fn(adj, node, cards) for fn in score_fns) + (priority[node], node)
+
+    keys = [_key(node) for node in range(len(adj))]
+    heap = list(keys)
+    heapq.heapify(heap)
+    eliminated = [False] * len(adj)
+    ordering = []
+    cost = _CostCounter(cards, itemsize)
+    while heap:
+        key = heapq.heappop(heap)
+        node = key[-1]
+        if eliminated[node] or key != keys[node]:
+            continue # outdated entry
+        eliminated[node] = True
+        ordering.append(node)
+        cost.add(adj, node)
+        if max_multiply_adds is not None and cost.multiply_adds > max_multiply_adds:
+            return None, cost.result()
+
+        changed = set(adj[node])
+        touched = _eliminate(adj, node)
+        # The fill-in of a third node only changes if it is adjacent to
+        # both ends of a new edge, the other scores only depend on the
+        # neighbourhood of the node itself.
+        if fill_based:
+            changed |= touched
+        for u in changed:
+            key = _key(u)
+            if key != keys[u]:
+                keys[u] = key
+                heapq.heappush(heap, key)
+    return ordering, cost.result()
+
+
+def min_fill_ordering(adj: List[Set[int]]) -> List[int]:
+    """
+        Computes a greedy min-fill elimination ordering, see `greedy_ordering`.
+
+        Parameters
+        ----------
+        adj: list of sets
+            The interaction graph as integer adjacency sets, see
+            `get_interaction_graph`.
+
+        Returns
+        -------
+        list
+            The node ids in elimination order.
+    """
+    return greedy_ordering(adj, "min_fill")[0]
+
+
+def _get_cardinalities(graph, names: List[str]) -> List[int]:
+    """
+        Private helper returning the number of outcomes of every node,
+        nodes without outcomes are treated as binary.
+    """
+    return [len(getattr(graph.nodes[name], "outcomes", "01")) for name in names]
+
+
+def find_elimination_ordering(graph, heuristic: str = "min_fill",
+                                itemsize: int = 8) -> Tuple[List[str], EliminationCost]:
+    """
+        Computes an elimination ordering of all variables in the given
+        network with the given heuristic, taking the number of outcomes of
+        the variables into account.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.BayesianNetwork
+            The network (or graph) whose variables should be ordered.
+        heuristic: String, optional (default: "min_fill")
+            One of "min_fill", "weighted_min_fill", "min_degree",
+            "min_weight" or "min_size".
+        itemsize: int, optional (default: 8)
+            The number of bytes per factor entry used in the cost report.
+
+        Returns
+        -------
+        list, EliminationCost
+            The variable names in elimination order and the cost report of
+            the ordering (induced width, cells and bytes of the largest
+            intermediate factor and an estimate of the multiply-adds).
+    """
+    names, adj = get_interaction_graph(graph)
+    ordering, cost = greedy_ordering(adj, heuristic, _get_cardinalities(graph, names), itemsize)
+    return [names[i] for i in ordering], cost
+
+
+def get_elimination_cost(graph, ordering: Iterable[str],
+                            itemsize: int = 8) -> EliminationCost:
+    """
+        Computes the cost report of eliminating the variables of the network
+        in the given order, e.g. to compare the orderings of different
+        heuristics before running variable elimination.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.BayesianNetwork
+            The network (or graph) whose variables are ordered.
+        ordering: iterable of String
+            The variable names in elimination order. Variables missing from
+            the ordering are not eliminated.
+        itemsize: int, optional (default: 8)
+            The number of bytes per factor entry.
+
+        Returns
+        -------
+        EliminationCost
+            The induced width, the cells and bytes of the largest intermediate
+            factor and an estimate of the multiply-adds.
+    """
+    names, adj = get_interaction_graph(graph)
+    index = {name: i for i, name in enumerate(names)}
+    cost = _CostCounter(_get_cardinalities(graph, names), itemsize)
+    for name in ordering:
+        node = index[getattr(name, "name", name)]
+        cost.add(adj, node)
+        _eliminate(adj, node)
+    return cost.result()
+
+
+# Interaction graph, cardinalities and item size shared with the worker
+# processes of `search_elimination_ordering`, set by `_init_worker`.
+_worker_problem = None
+
+
+def _init_worker(problem):
+    global _worker_problem
+    _worker_problem = problem
+
+
+def _search_run(task: Tuple[int, int, Optional[int]]) -> Tuple[int, Optional[List[int]], EliminationCost]:
+    """
+        Private helper computing one randomized greedy ordering. The run only
+        depends on the seed and its number, so that every run can be
+        repeated. Run 0 is the deterministic min-fill ordering.
+    """
+    seed, run, bound = task
+    adj, cards, itemsize = _worker_problem
+    adj = [set(neighbours) for neighbours in adj]
+    if run == 0:
+        return (run,) + greedy_ordering(adj, "min_fill", cards, itemsize)
+    rng = random.Random("{}-{}".format(seed, run))
+    heuristic, tie_breaker = rng.sample(sorted(HEURISTICS), 2)
+    if rng.random() < 0.5:
+        tie_breaker = None
+    return (run,) + greedy_ordering(adj, heuristic, cards, itemsize, tie_breaker, rng, bound)
+
+
+def search_elimination_ordering(graph, time_budget: float = 1.0,
+                                processes: Optional[int] = None, seed: int = 0,
+                                max_runs: Optional[int] = None,
+                                itemsize: int = 8) -> Tuple[List[str], EliminationCost]:
+    """
+        Searches for an elimination ordering with a small total table size
+        by running many randomized greedy orderings until the time budget
+        expires. Each run picks a random heuristic, optionally a second one
+        to break ties, and breaks the remaining ties randomly. Runs whose
+        cost exceeds the best ordering found so far are aborted early.
+
+        Every run is determined by the seed and its run number and the
+        best ordering is the cheapest one with the smallest run number, so
+        the result only depends on the seed and the number of completed
+        runs. Pass max_runs (and time_budget=None) for fully reproducible
+        results.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.BayesianNetwork
+            The network (or graph) whose variables should be ordered.
+        time_budget: float, optional (default: 1.0)
+            The wall clock time in seconds after which no new runs are
+            started. None to only stop after max_runs runs.
+        processes: int, optional
+            If given and larger than 1, the runs are distributed across a
+            pool of this many worker processes.
+        seed: int, optional (default: 0)
+            The seed of the random runs.
+        max_runs: int, optional
+            The maximum number of runs.
+        itemsize: int, optional (default: 8)
+            The number of bytes per factor entry used in the cost report.
+
+        Returns
+        -------
+        list, EliminationCost
+            The variable names of the best ordering found and its cost
+            report. Its multiply_adds entry is the total size of all
+            intermediate factors, which is the quantity minimized.
+
+        Raises
+        ------
+        ValueError
+            If neither a time budget nor a maximum number of runs is given.
+    """
+    if time_budget is None and max_runs is None:
+        raise ValueError("Either a time budget or a maximum number of runs is required")
+    names, adj = get_interaction_graph(graph)
+    problem = (adj, _get_cardinalities(graph, names), itemsize)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    best = None
+
+    def _update(result):
+        nonlocal best
+        run, ordering, cost = result
+        if ordering is not None and (best is None or (cost.multiply_adds, run) < (best[2].multiply_adds, best[0])):
+            best = result
+
+    def _tasks(start: int, count: int):
+        if max_runs is not None:
+            count = min(count, max_runs - start)
+        bound = best[2].multiply_adds if best is not None else None
+        return [(seed, run, bound) for run in range(start, start + count)]
+
+    def _expired(completed: int) -> bool:
+        if max_runs is not None and completed >= max_runs:
+            return True
+        # The deterministic run 0 is always completed
+        return deadline is not None and completed > 0 and time.perf_counter() > deadline
+
+    completed = 0
+    if processes is not None and processes > 1:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(problem,)) as pool:
+            while not _expired(completed):
+                tasks = _tasks(completed, processes)
+                for result in pool.imap_unordered(_search_run, tasks):
+                    _update(result)
+                completed += len(tasks)
+    else:
+        _init_worker(problem)
+        while not _expired(completed):
+            for task in _tasks(completed, 1):
+                _update(_search_run(task))
+            completed += 1
+        _init_worker(None)
+    return [names[i] for i in best[1]], best[2]
@@ -12,11 +12,41 @@ import numpy as np
 from typing import Union, Optional, List, Dict, Iterable
 from .nodes import DiscreteVariable
 
+# Number of cells of the full product above which Factor.sum_product lets
+# np.einsum search for an optimized contraction path
+_EINSUM_PATH_THRESHOLD = 4096
+
+def logsumexp(a: np.array, axis: Optional[int] = None) -> np.array:
+    """
+        Computes log(sum(exp(a))) along the given axis without underflow by
+        factoring out the maximum. Slices that are -inf everywhere (only
+        zero potentials) result in -inf.
+        
+        Parameters
+        ----------
+        a: np.array
+            The array of logarithms.
+        axis: int (optional)
+            The axis to be summed over, all axes if not given.
+            
+        Returns
+        -------
+        np.array
+            The logarithm of the sum, the given axis is removed.
+    """
+    a = np.asarray(a)
+    shift = np.max(a, axis=axis, keepdims=True)
+    shift = np.where(np.isfinite(shift), shift, 0)
+    with np.errstate(divide="ignore"):
+        res = np.log(np.sum(np.exp(a - shift), axis=axis, keepdims=True)) + shift
+    return np.squeeze(res, axis=axis) if axis is not None else res.reshape(())
+
 class Factor(object):
     
     def __init__(self, variables: Optional[List[str]] = None, 
                     outcomes: Optional[Dict[str,List[str]]] = None, 
-                    potentials: Optional[np.array] = None):
+                    potentials: Optional[np.array] = None,
+                    log: bool = False):
         """
             Constructor for a new factor. Without any parameters a trivial, 
             empty (unit) factor should be created which does not modify 
@@ -37,6 +67,12 @@ class Factor(object):
                 The array must be ordered according to the variable and outcome lists.
                 These could be conditional or marginal probabilities of a random variable
                 (see `Factor.from_probabilities` function).
+            log: bool (optional)
+                Whether the potentials are given as natural logarithms. Factors
+                in log space cannot underflow: multiplication adds potentials,
+                marginalization uses logsumexp and maximization stays a max.
+                Combining a log space factor with a normal one converts the 
+                latter to log space.
                 
             Raises
             -------
@@ -54,9 +90,11 @@ class Factor(object):
         if outcomes is None:
             outcomes = {}
         if potentials is None:
-            potentials = 1
+            potentials = 0 if log else 1
         #Store the actual potentials as numpy array
         self.potentials = np.copy(potentials)
+        #Whether the potentials are stored as logarithms
+        self.log = log
         #Store all contained variables in a list. The index of each variable
         #corresponds to the dimension of that variable in the array.
         self.variable_order = list(variables)
@@ -105,7 +143,7 @@ class Factor(object):
         return cls(variables, outcomes, probabilities)
     
     @classmethod
-    def from_node(cls, node: DiscreteVariable):
+    def from_node(cls, node: DiscreteVariable, log: bool = False):
         """
             Classmethod to directly create a new factor from a DiscreteVariable
             
@@ -114,6 +152,8 @@ class Factor(object):
             node: ccbase.nodes.DiscreteVariable
                 The DiscreteVariable that should be used to initialize this
                 factor.
+            log: bool (optional)
+                Whether the factor should be created in log space.
                 
             Returns
             -------
@@ -125,7 +165,10 @@ class Factor(object):
         outcomes = {node.name: node.outcomes}
         for p in node.parent_order:
             outcomes[p] = node.parents[p].outcomes
-        return cls(variables, outcomes, node.cpt)
+        if log:
+            with np.errstate(divide="ignore"):
+                return cls(variables, outcomes, np.log(node.cpt_view), log=True)
+        return cls(variables, outcomes, node.cpt_view)
     
     def __call__(self, instantiation: Dict[str, str]) -> Union[float, np.array]:
         """
@@ -160,8 +203,9 @@ class Factor(object):
             Returns
             -------
             float or np.array
-                The potential for that specified instantiation. In case of
-                partial instantiations, a np.array is returned instead.
+                The potential for that specified instantiation (its logarithm
+                for factors in log space). In case of partial instantiations, 
+                a np.array is returned instead.
         """
         
         #Construct the index for the desired potential
@@ -202,9 +246,11 @@ class Factor(object):
             variables = [variables]
             
         res = self.copy()
+        # In log space, summing the exponentials avoids underflow
+        sum_ = logsumexp if self.log else np.sum
         for v in variables:
             #Simply sum out the corresponding dimension for each variable
-            res.potentials = np.sum(res.potentials, axis=res.variable_order.index(v))
+            res.potentials = sum_(res.potentials, axis=res.variable_order.index(v))
             #Make sure to upadte the outcome dictionary and variable_order list
             # as to not mess up the next iteration.
             del res.outcomes[v]
@@ -228,18 +274,34 @@ class Factor(object):
             Factor
                 The resulting factor.
         """
+        if not isinstance(other_factor, Factor):
+            # Sparse factors (see ccbase.sparse) implement the product, the
+            # result is dense again if it is not sparse enough.
+            if self.log:
+                return self.multiply(other_factor.to_dense())
+            return other_factor.from_dense(self).multiply(other_factor)
+        # Factors in log space are multiplied by adding their potentials
+        if self.log != other_factor.log:
+            return self.to_log().multiply(other_factor.to_log())
+        # Variables reduced to fewer outcomes (see reduce) only keep the
+        # outcomes both factors have
+        if any(other_factor.outcomes.get(v, o) != o for v, o in self.outcomes.items()):
+            outcomes = self._common_outcomes([self, other_factor])
+            return self._restrict(outcomes).multiply(other_factor._restrict(outcomes))
+        product = np.add if self.log else np.multiply
+        
         # Shortcuts for trivial factors
         if len(self.variable_order) == 0:
             res = other_factor.copy()
-            res.potentials = self.potentials * res.potentials
+            res.potentials = product(self.potentials, res.potentials)
             return res
             
         if len(other_factor.variable_order) == 0:
             res = self.copy()
-            res.potentials = res.potentials * other_factor.potentials
+            res.potentials = product(res.potentials, other_factor.potentials)
             return res
         
-        res = Factor()
+        res = Factor(log=self.log)
         res.variable_order = list(self.variable_order)
         res.outcomes = dict(self.outcomes)
         
@@ -284,10 +346,103 @@ class Factor(object):
         # Pointwise multiplication which results in a factor where all instantiations
         # are compatible to the instantiations of res and factor2
         # See Definition 6.3 in "Modeling and Reasoning with Bayesian Networks" - Adnan Darwiche Chapter 6    
-        res.potentials = res.potentials * f2.potentials
+        res.potentials = product(res.potentials, f2.potentials)
         
         return res
 
+    @classmethod
+    def sum_product(cls, factors: Iterable[Factor], 
+                        eliminate: Optional[Iterable[str]] = None) -> Factor:
+        """
+            Classmethod multiplying the given factors and summing out the
+            given variables in a single np.einsum contraction. For larger
+            factors the contraction path is optimized by numpy, in any case
+            the full product is never allocated unless it is the result. The
+            result is the same as multiplying all factors and marginalizing
+            afterwards.
+            If any factor is in log space, the result is in log space too.
+            The factors are then added one after the other instead, summing
+            out every variable with logsumexp as soon as no later factor
+            contains it, since any contraction in linear space can underflow.
+            
+            Parameters
+            ----------
+            factors: iterable of Factor
+                The factors to be multiplied.
+            eliminate: [String,] (optional)
+                The variables that should be summed out.
+                
+            Returns
+            -------
+            Factor
+                A factor over all remaining variables, in the order in which
+                they first appear in the given factors. If some factors are
+                sparse, the result may be a SparseFactor as well.
+
+            Raises
+            ------
+            ValueError
+                If a variable to be eliminated is not part of any factor.
+        """
+        factors = list(factors)
+        if not all(isinstance(f, Factor) for f in factors):
+            # Sparse factors (see ccbase.sparse) are multiplied one after the
+            # other, which never creates more entries than necessary.
+            eliminate = set(eliminate or [])
+            for v in eliminate:
+                if not any(v in f.outcomes for f in factors):
+                    raise ValueError("The variable {} is not part of any factor".format(v))
+            return cls._multiply_eliminating(factors, eliminate)
+        outcomes = cls._common_outcomes(factors)
+        factors = [f._restrict(outcomes) for f in factors]
+        variables = list(outcomes)
+        eliminate = set(eliminate or [])
+        for v in eliminate:
+            if v not in outcomes:
+                raise ValueError("The variable {} is not part of any factor".format(v))
+        # einsum supports at most 52 different subscripts and 32 operands
+        if len(variables) > 52 or len(factors) > 32 or any(f.log for f in factors):
+            return cls._multiply_eliminating(factors, eliminate)
+
+        labels = {v: i for i, v in enumerate(variables)}
+        operands = []
+        for f in factors:
+            operands.append(f.potentials)
+            operands.append([labels[v] for v in f.variable_order])
+        remaining = [v for v in variables if v not in eliminate]
+        res = cls()
+        # Without a contraction path einsum loops over all combinations of
+        # all variables at once. That is cheaper than searching for a path
+        # when there are only a few combinations.
+        combinations = 1
+        for v in variables:
+            combinations *= len(outcomes[v])
+        res.potentials = np.einsum(*operands, [labels[v] for v in remaining],
+                                   optimize=combinations > _EINSUM_PATH_THRESHOLD)
+        res.variable_order = remaining
+        res.outcomes = {v: outcomes[v] for v in remaining}
+        return res
+
+    @classmethod
+    def _multiply_eliminating(cls, factors: List[Factor], eliminate: Iterable[str]) -> Factor:
+        """
+            Multiplies the given factors one after the other and sums out
+            each of the given variables right after the last factor
+            containing it, so the full product is only built if nothing
+            is eliminated.
+        """
+        last = {}
+        for i, f in enumerate(factors):
+            for v in f.variable_order:
+                last[v] = i
+        res = cls()
+        for i, f in enumerate(factors):
+            res = res.multiply(f) if i else f
+            done = [v for v in eliminate if last[v] == i]
+            if done:
+                res = res.marginalize(done)
+        return res
+
     def __mul__(self, other: Factor) -> Factor:
         """
             Overwrite the internal __mul__ operator to allow using special
@@ -307,7 +462,7 @@ class Factor(object):
         """
         return self.multiply(other)
 
-    def reduce(self, evidence: Dict[str, str]) -> Factor:
+    def reduce(self, evidence: Dict[str, str], mode: str = "mask") -> Factor:
         """
             Creates a new factor which has been reduced to conform to the 
             provided evidence.
@@ -317,24 +472,30 @@ class Factor(object):
             evidence: dict
                 A dictionary containing variable:outcome pairs specifying the
                 evidence.
+            mode: str (optional)
+                How the evidence is represented, "mask" (default) keeps the 
+                shape and sets all cells contradicting the evidence to 0.
+                "keep" slices each evidence variable down to a single outcome,
+                it stays in the factor with only the observed outcome. 
+                "drop" slices the evidence variables out completely, so 
+                all factors need to be reduced by the same evidence. Both 
+                make later operations on the factor proportionally cheaper.
                 
             Returns
             -------
             Factor
                 A factor that has been reduced to conform to the given 
                 evidence.
+
+            Raises
+            ------
+            ValueError
+                If an outcome is not part of this factor or the mode is
+                unknown.
         """
-        #Note: There are multiple ways to represent a reduced factor, make 
-        # sure that all other functions can still be used, even on reduced 
-        # factors.
-        
-        # This solution is a somewhat inefficient solution, where reduced 
-        # computations are not more efficient then non-reduced computations
-        # since we do not prune empty cells from the matrix, thus not changing
-        # the actual size.
-        
+        if mode not in ("mask", "keep", "drop"):
+            raise ValueError("Unknown reduce mode {}".format(mode))
         #Construct the index for the desired potential
-        res = self.copy()
         index = []        
         for v in self.variable_order:
             if v in evidence:
@@ -345,14 +506,107 @@ class Factor(object):
                                      "with outcomes {} in this factor.".format(v, evidence[v]))
             else:
                 index.append(range(len(self.outcomes[v])))
-                    
+
+        if mode != "mask":
+            # Basic slicing with an int removes the axis, a slice of length
+            # one keeps it. Only the sliced view is copied by the constructor,
+            # so the reduced factor does not keep the full table alive.
+            slice_ = []
+            for v, i in zip(self.variable_order, index):
+                if v not in evidence:
+                    slice_.append(slice(None))
+                elif mode == "drop":
+                    slice_.append(i[0])
+                else:
+                    slice_.append(slice(i[0], i[0] + 1))
+            outcomes = dict(self.outcomes)
+            for v in self.variable_order:
+                if v in evidence:
+                    if mode == "drop":
+                        del outcomes[v]
+                    else:
+                        outcomes[v] = (evidence[v],)
+            variables = [v for v in self.variable_order if v in outcomes]
+            return Factor(variables, outcomes, self.potentials[tuple(slice_)], log=self.log)
+
+        # The mask keeps the full table, so computations on it are not
+        # cheaper than on the unreduced factor.
+        res = self.copy()
         #We use here the same logic as in the potential function, as this already
         #allows partial instantiations, as is the case with the evidence here.
         #We use the access mask provided by np.ix_ to prevent the cells conforming
         #to the evidence from being multiplied by 0.
-        tmp = np.zeros(res.potentials.shape)
-        tmp[np.ix_(*index)] = 1
-        res.potentials *= tmp
+        tmp = np.zeros(res.potentials.shape, dtype=bool)
+        tmp[np.ix_(*index)] = True
+        res.potentials = np.where(tmp, res.potentials, -np.inf if res.log else 0)
+        return res
+
+    def _restrict(self, outcomes: Dict[str, tuple]) -> Factor:
+        """
+            Private helper selecting the given outcomes of some variables,
+            e.g. to align a factor with one reduced in "keep" mode. Returns
+            the factor itself if it already has exactly these outcomes.
+        """
+        res = self
+        for v, outcome_list in outcomes.items():
+            if v in res.outcomes and res.outcomes[v] != tuple(outcome_list):
+                if res is self:
+                    res = Factor(log=self.log)
+                    res.potentials = self.potentials
+                    res.outcomes = dict(self.outcomes)
+                    res.variable_order = list(self.variable_order)
+                indices = [res.outcomes[v].index(o) for o in outcome_list]
+                res.potentials = np.take(res.potentials, indices, axis=res.variable_order.index(v))
+                res.outcomes[v] = tuple(outcome_list)
+        return res
+
+    @staticmethod
+    def _common_outcomes(factors: Iterable[Factor]) -> Dict[str, tuple]:
+        """
+            Private helper returning the outcomes every given factor has
+            for each variable, in the order of the first factor.
+        """
+        res = {}
+        for f in factors:
+            for v, outcome_list in f.outcomes.items():
+                if v not in res:
+                    res[v] = outcome_list
+                elif res[v] != outcome_list:
+                    res[v] = tuple(o for o in res[v] if o in outcome_list)
+        return res
+
+    def to_log(self) -> Factor:
+        """
+            Creates a copy of this factor in log space. Zero potentials 
+            become -inf.
+            
+            Returns
+            -------
+            Factor
+                The factor in log space, or a copy if it already was.
+        """
+        res = self.copy()
+        if not self.log:
+            with np.errstate(divide="ignore"):
+                res.potentials = np.log(res.potentials)
+            res.log = True
+        return res
+
+    def to_linear(self) -> Factor:
+        """
+            Creates a copy of this factor with normal (not log space) 
+            potentials.
+            
+            Returns
+            -------
+            Factor
+                The factor with the exponentiated potentials, or a copy if 
+                it was not in log space.
+        """
+        res = self.copy()
+        if self.log:
+            res.potentials = np.exp(res.potentials)
+            res.log = False
         return res
         
     def copy(self) -> Factor:
@@ -364,7 +618,7 @@ class Factor(object):
             Factor
                 An exact copy of self.
         """
-        res = Factor()
+        res = Factor(log=self.log)
         res.potentials = np.copy(self.potentials)
         #Creating a shallow copy with dict() is enough here as factors
         #should convert the value lists to tuples upon creation, which makes
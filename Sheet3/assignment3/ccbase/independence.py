@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Graphical independence tests for directed graphs. The d-separation test
+uses the "reachable" algorithm (Koller & Friedman, Probabilistic Graphical
+Models, Algorithm 3.1), also known as Bayes-Ball, which visits every
+(node, direction) pair at most once and thus runs in O(N+E) per query,
+independent of the number of paths between the nodes.
+"""
+from __future__ import annotations
+
+import multiprocessing
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from .nodes import Node
+
+
+def _name(node: Union[str, Node]) -> str:
+    """
+        Private helper returning the name of a node object or name.
+    """
+    return getattr(node, "name", node)
+
+
+def _get_ancestral_set(graph, nodes: Iterable[Union[str, Node]]) -> Set[str]:
+    """
+        Private helper returning the names of the given nodes and all their
+        ancestors, collected in a single traversal.
+    """
+    res = set()
+    stack = []
+    for node in nodes:
+        name = _name(node)
+        if name not in res:
+            res.add(name)
+            stack.append(name)
+    while stack:
+        for p in graph.get_parents(stack.pop()):
+            p = _name(p)
+            if p not in res:
+                res.add(p)
+                stack.append(p)
+    return res
+
+
+def get_reachable(graph, nodes_x: Iterable[Union[str, Node]],
+                    nodes_z: Iterable[Union[str, Node]]) -> Set[str]:
+    """
+        Computes all nodes that are d-connected to at least one of the
+        nodes in nodes_x given the nodes in nodes_z, i.e. that can be
+        reached from nodes_x via an active trail.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.Graph
+            The directed graph (or any graph with get_parents/get_children).
+        nodes_x: iterable of ccbase.nodes.Node or String
+            The source nodes.
+        nodes_z: iterable of ccbase.nodes.Node or String
+            The observed nodes.
+
+        Returns
+        -------
+        set
+            The names of all reachable nodes. Observed nodes are never
+            reachable, the source nodes are reachable unless observed.
+    """
+    observed = {_name(z) for z in nodes_z}
+    # v-structures are only active if the collider or one of its
+    # descendants is observed, i.e. if it is an ancestor of an observation
+    observed_ancestors = _get_ancestral_set(graph, observed)
+
+    UP, DOWN = 0, 1 # Trail enters the node from a child (UP) or from a parent (DOWN)
+    to_visit = [(_name(x), UP) for x in nodes_x]
+    visited = set()
+    reachable = set()
+    while to_visit:
+        node, direction = to_visit.pop()
+        if (node, direction) in visited:
+            continue
+        visited.add((node, direction))
+        is_observed = node in observed
+        if not is_observed:
+            reachable.add(node)
+        if direction == UP and not is_observed:
+            for p in graph.get_parents(node):
+                to_visit.append((_name(p), UP))
+            for c in graph.get_children(node):
+                to_visit.append((_name(c), DOWN))
+        elif direction == DOWN:
+            if not is_observed:
+                for c in graph.get_children(node):
+                    to_visit.append((_name(c), DOWN))
+            if node in observed_ancestors:
+                for p in graph.get_parents(node):
+                    to_visit.append((_name(p), UP))
+    return reachable
+
+
+def is_d_separated(graph, nodes_x: Iterable[Union[str, Node]],
+                    nodes_y: Iterable[Union[str, Node]],
+                    nodes_z: Iterable[Union[str, Node]]) -> bool:
+    """
+        Checks whether all nodes in nodes_x are d-separated from all nodes
+        in nodes_y given the nodes in nodes_z, using a single reachability
+        sweep from all nodes in nodes_x.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.Graph
+            The directed graph that should contain all the nodes.
+        nodes_x: iterable of ccbase.nodes.Node or String
+            The first set of nodes.
+        nodes_y: iterable of ccbase.nodes.Node or String
+            The second set of nodes.
+        nodes_z: iterable of ccbase.nodes.Node or String
+            The set of observed nodes.
+
+        Returns
+        -------
+        bool
+            True if nodes_x and nodes_y are d-separated given nodes_z,
+            False otherwise.
+    """
+    reachable = get_reachable(graph, nodes_x, nodes_z)
+    return not any(_name(y) in reachable for y in nodes_y)
+
+
+def get_moral_components(graph, nodes: Iterable[Union[str, Node]],
+                            nodes_z: Iterable[Union[str, Node]]) -> Dict[str, int]:
+    """
+        Labels the connected components of the moralized ancestral graph of
+        the given nodes and nodes_z after removing the nodes in nodes_z.
+        No graph is copied: the ancestral set is collected in a single
+        multi-source traversal and the moral edges are merged directly into
+        a union-find structure over that set. For undirected graphs the
+        ancestral set and moralization are skipped, only nodes_z is removed.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.Graph
+            The directed or undirected graph.
+        nodes: iterable of ccbase.nodes.Node or String
+            The query nodes, i.e. the union of nodes_x and nodes_y.
+        nodes_z: iterable of ccbase.nodes.Node or String
+            The set of observed nodes, which are removed.
+
+        Returns
+        -------
+        dict
+            A name:label dictionary for all remaining nodes, nodes with the
+            same label are connected.
+    """
+    observed = {_name(z) for z in nodes_z}
+    if graph.is_directed:
+        names = list(_get_ancestral_set(graph, list(nodes) + list(observed)))
+    else:
+        names = list(graph.nodes)
+    index = {name: i for i, name in enumerate(names)}
+    root = list(range(len(names)))
+
+    def _find(i: int) -> int:
+        while root[i] != i:
+            root[i] = root[root[i]] # path halving
+            i = root[i]
+        return i
+
+    def _union(i: int, j: int):
+        i, j = _find(i), _find(j)
+        if i != j:
+            root[i] = j
+
+    for name in names:
+        parents = [index[p] for p in map(_name, graph.get_parents(name)) if p not in observed]
+        if name not in observed:
+            for p in parents:
+                _union(index[name], p)
+        elif graph.is_directed:
+            # Moralizing connects all parents of a common child, even if the
+            # child itself is observed. Without the child the parents are
+            # only connected through these moral edges.
+            for p1, p2 in zip(parents, parents[1:]):
+                _union(p1, p2)
+    return {name: _find(i) for name, i in index.items() if name not in observed}
+
+
+def is_moral_separated(graph, nodes_x: Iterable[Union[str, Node]],
+                        nodes_y: Iterable[Union[str, Node]],
+                        nodes_z: Iterable[Union[str, Node]]) -> bool:
+    """
+        Checks whether nodes_x and nodes_y are separated given nodes_z in the
+        moralized ancestral graph of all three sets (or directly in the
+        graph if it is undirected), by comparing component labels.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.Graph
+            The directed or undirected graph that should contain all the nodes.
+        nodes_x: iterable of ccbase.nodes.Node or String
+            The first set of nodes.
+        nodes_y: iterable of ccbase.nodes.Node or String
+            The second set of nodes.
+        nodes_z: iterable of ccbase.nodes.Node or String
+            The set of observed nodes.
+
+        Returns
+        -------
+        bool
+            True if no node in nodes_x is connected to a node in nodes_y
+            once nodes_z is removed, False otherwise.
+    """
+    nodes_x = [_name(x) for x in nodes_x]
+    nodes_y = [_name(y) for y in nodes_y]
+    labels = get_moral_components(graph, nodes_x + nodes_y, nodes_z)
+    labels_x = {labels[x] for x in nodes_x if x in labels}
+    return not any(labels.get(y) in labels_x for y in nodes_y)
+
+
+# Adjacency lists of the graph the worker processes of
+# `get_d_connection_matrix` sweep, set by `_init_worker`.
+_worker_graph = None
+
+
+def _init_worker(graph_arrays):
+    global _worker_graph
+    _worker_graph = graph_arrays
+
+
+def _sweep_ids(parents: List[List[int]], children: List[List[int]],
+                observed: np.ndarray, observed_ancestors: np.ndarray,
+                source: int) -> np.ndarray:
+    """
+        Private helper running the reachable algorithm from a single source
+        on integer adjacency lists. Returns a boolean row marking all nodes
+        d-connected to the source.
+    """
+    n = len(parents)
+    row = np.zeros(n, dtype=bool)
+    # visited[0] for trails entering from a child (UP), visited[1] from a parent (DOWN)
+    visited = (bytearray(n), bytearray(n))
+    to_visit = [(source, 0)]
+    while to_visit:
+        node, direction = to_visit.pop()
+        if visited[direction][node]:
+            continue
+        visited[direction][node] = 1
+        is_observed = observed[node]
+        if not is_observed:
+            row[node] = True
+        if direction == 0 and not is_observed:
+            to_visit.extend((p, 0) for p in parents[node])
+            to_visit.extend((c, 1) for c in children[node])
+        elif direction == 1:
+            if not is_observed:
+                to_visit.extend((c, 1) for c in children[node])
+            if observed_ancestors[node]:
+                to_visit.extend((p, 0) for p in parents[node])
+    return row
+
+
+def _sweep_rows(sources: List[int]) -> np.ndarray:
+    """
+        Private worker function sweeping from every source in a chunk.
+    """
+    return np.array([_sweep_ids(*_worker_graph, source) for source in sources],
+                    dtype=bool).reshape(len(sources), -1)
+
+
+def get_d_connection_matrix(graph, nodes_z: Iterable[Union[str, Node]],
+                            processes: Optional[int] = None,
+                            packed: bool = False) -> Tuple[np.ndarray, List[str]]:
+    """
+        Computes for all pairs of nodes whether they are d-connected given
+        the nodes in nodes_z. Instead of testing each pair separately, this
+        runs a single reachability sweep per source node, i.e. O(N*(N+E))
+        in total.
+
+        Parameters
+        ----------
+        graph: ccbase.networks.Graph
+            The directed graph (or any graph with get_parents/get_children).
+        nodes_z: iterable of ccbase.nodes.Node or String
+            The observed nodes.
+        processes: int, optional
+            If given and larger than 1, the sweeps are distributed across a
+            pool of this many worker processes.
+        packed: bool, optional (default: False)
+            If True, the rows are returned packed into bits (see np.packbits),
+            which reduces the size of the result by a factor of 8.
+
+        Returns
+        -------
+        np.ndarray, list
+            The symmetric N x N boolean matrix, where entry [i, j] is True if
+            node i and node j are d-connected given nodes_z (or its packed
+            N x ceil(N/8) uint8 form), together with the list of node names
+            defining the order of the rows and columns. Observed nodes are
+            not connected to any node; unobserved nodes are connected to
+            themselves.
+    """
+    names = [_name(node) for node in graph.nodes]
+    index = {name: i for i, name in enumerate(names)}
+    parents = [[index[_name(p)] for p in graph.get_parents(name)] for name in names]
+    children = [[index[_name(c)] for c in graph.get_children(name)] for name in names]
+    observed = np.zeros(len(names), dtype=bool)
+    observed_ancestors = np.zeros(len(names), dtype=bool)
+    for z in nodes_z:
+        observed[index[_name(z)]] = True
+    for name in _get_ancestral_set(graph, [names[i] for i in np.flatnonzero(observed)]):
+        observed_ancestors[index[name]] = True
+    graph_arrays = (parents, children, observed, observed_ancestors)
+
+    sources = np.flatnonzero(~observed).tolist()
+    # With packed rows every sweep is packed right away, so the unpacked
+    # N x N matrix is never materialized
+    pack = np.packbits if packed else (lambda rows, axis=-1: rows)
+    res = np.zeros((len(names), (len(names) + 7) // 8 if packed else len(names)),
+                   dtype=np.uint8 if packed else bool)
+    if processes is not None and processes > 1 and len(sources) > 1:
+        chunksize = max(1, -(-len(sources) // (4 * processes)))
+        chunks = [sources[i:i + chunksize] for i in range(0, len(sources), chunksize)]
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                                  initargs=(graph_arrays,)) as pool:
+            for chunk, rows in zip(chunks, pool.imap(_sweep_rows, chunks)):
+                res[chunk] = pack(rows, axis=-1)
+    else:
+        for source in sources:
+            res[source] = pack(_sweep_ids(*graph_arrays, source), axis=-1)
+    return res, names
+
+
+OracleInfo = namedtuple("OracleInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+
+class IndependenceOracle:
+    """
+        Memoizing wrapper answering independence queries on a graph.
+
+        Queries are canonicalized to (frozenset X, frozenset Y, frozenset Z),
+        where the symmetry X _|_ Y | Z <=> Y _|_ X | Z is used to identify
+        queries with swapped arguments, so permuted or repeated node lists
+        share a single cache entry. The results are kept in a bounded LRU
+        cache which is cleared automatically whenever the graph is mutated.
+
+        Attributes
+        ----------
+        graph: ccbase.networks.Graph
+            The graph (or view) the queries refer to.
+        maxsize: int
+            The maximum number of cached results.
+        test: callable
+            The independence test computing uncached results, called as
+            test(graph, nodes_x, nodes_y, nodes_z).
+        hits: int
+            Number of queries answered from the cache.
+        misses: int
+            Number of queries computed by the test.
+        evictions: int
+            Number of results dropped because the cache was full.
+    """
+
+    def __init__(self, graph, maxsize: int = 1024,
+                    test: Optional[Callable] = None):
+        """
+            Parameters
+            ----------
+            graph: ccbase.networks.Graph
+                The graph the queries refer to.
+            maxsize: int, optional (default: 1024)
+                The maximum number of cached results.
+            test: callable, optional
+                The independence test used for uncached queries. Defaults
+                to `is_d_separated`. Any test taking the arguments
+                (graph, nodes_x, nodes_y, nodes_z) and returning True for
+                independence can be used, e.g. check_independence_general.
+        """
+        if maxsize < 1:
+            raise ValueError("The cache size needs to be positive, got {}".format(maxsize))
+        self.graph = graph
+        self.maxsize = maxsize
+        self.test = test if test is not None else is_d_separated
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache = OrderedDict()
+        self._version = graph._version
+
+    @staticmethod
+    def canonicalize(nodes_x: Iterable[Union[str, Node]],
+                        nodes_y: Iterable[Union[str, Node]],
+                        nodes_z: Iterable[Union[str, Node]]) -> Tuple[FrozenSet[FrozenSet[str]], FrozenSet[str]]:
+        """
+            Returns the cache key of a query, which is the same for all
+            orderings of the node lists and for swapped nodes_x and nodes_y.
+        """
+        x = frozenset(_name(n) for n in nodes_x)
+        y = frozenset(_name(n) for n in nodes_y)
+        return frozenset((x, y)), frozenset(_name(n) for n in nodes_z)
+
+    def is_independent(self, nodes_x: Iterable[Union[str, Node]],
+                        nodes_y: Iterable[Union[str, Node]],
+                        nodes_z: Iterable[Union[str, Node]]) -> bool:
+        """
+            Checks whether nodes_x and nodes_y are independent given nodes_z,
+            using the cached result if the same query was answered before.
+
+            Parameters
+            ----------
+            nodes_x: iterable of ccbase.nodes.Node or String
+                The first set of nodes.
+            nodes_y: iterable of ccbase.nodes.Node or String
+                The second set of nodes.
+            nodes_z: iterable of ccbase.nodes.Node or String
+                The set of observed nodes.
+
+            Returns
+            -------
+            bool
+                True if nodes_x and nodes_y are independent given nodes_z,
+                False otherwise.
+        """
+        if self._version != self.graph._version:
+            self._cache.clear()
+            self._version = self.graph._version
+        pair, nodes_z = self.canonicalize(nodes_x, nodes_y, nodes_z)
+        key = (pair, nodes_z)
+        try:
+            res = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return res
+
+        self.misses += 1
+        # A single set in the pair means nodes_x == nodes_y
+        nodes_x, nodes_y = tuple(pair) if len(pair) == 2 else (next(iter(pair)),) * 2
+        res = self.test(self.graph, nodes_x, nodes_y, nodes_z)
+        self._cache[key] = res
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return res
+
+    __call__ = is_independent
+
+    def cache_info(self) -> OracleInfo:
+        """
+            Returns
+            -------
+            OracleInfo
+                A named tuple with the hits, misses, evictions, maxsize and
+                current size of the cache.
+        """
+        return OracleInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._cache))
+
+    def cache_clear(self):
+        """
+            Clears the cache and resets the statistics.
+        """
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Junction tree (clique tree) inference for Bayesian networks. The network
+is compiled once: the moral graph is triangulated with an elimination
+ordering, the cliques of the elimination are connected to a tree and every
+CPT is assigned to a clique containing its family. Calibration passes
+messages towards the roots and back, after which the belief of every
+clique is proportional to the joint distribution of its variables and the
+evidence. Marginals of single variables or of variables sharing a clique
+are then computed from a single clique.
+
+The messages of both directions of every separator are cached separately
+(Shenoy-Shafer style). Changing the evidence of one variable only
+invalidates the messages pointing away from its clique and a query only
+recomputes the invalid messages towards the queried clique. Unlike Hugin
+style absorption, where a separator stores the product of both messages
+and updates divide by it, this also allows to retract or change evidence,
+whose zeros cannot be divided out again.
+"""
+from __future__ import annotations
+
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Union
+
+from .elimination import _eliminate, _get_cardinalities, get_interaction_graph, greedy_ordering
+from .factor import Factor
+from .networks import BayesianNetwork
+from .nodes import DiscreteVariable
+
+
+class JunctionTree:
+    """
+        A compiled junction tree of a Bayesian network which answers
+        marginal queries under the current evidence.
+
+        Attributes
+        ----------
+        bn: BayesianNetwork
+            The compiled network.
+        cliques: list
+            The variable names of every clique.
+        parent: list
+            The index of the parent of every clique, None for the roots (one
+            for every connected component of the network).
+        separators: list
+            The variables shared by every clique and its parent.
+        evidence: dict
+            The current evidence as variable:outcome pairs.
+    """
+
+    def __init__(self, bn: BayesianNetwork, ordering: Optional[Iterable[str]] = None,
+                    heuristic: str = "min_fill"):
+        """
+            Compiles the junction tree of the given network.
+
+            Parameters
+            ----------
+            bn: BayesianNetwork
+                The network, all variables need a CPT.
+            ordering: iterable of String, optional
+                The elimination ordering used for the triangulation. If not
+                given, it is computed with the given heuristic.
+            heuristic: String, optional (default: "min_fill")
+                The heuristic of the ordering, see ccbase.elimination.
+
+            Raises
+            ------
+            ValueError
+                If the ordering does not contain every variable exactly once.
+        """
+        self.bn = bn
+        names, adj = get_interaction_graph(bn)
+        index = {name: i for i, name in enumerate(names)}
+        if ordering is None:
+            order, _ = greedy_ordering([set(a) for a in adj], heuristic, _get_cardinalities(bn, names))
+        else:
+            order = [index[getattr(n, "name", n)] for n in ordering]
+            if sorted(order) != list(range(len(names))):
+                raise ValueError("The ordering needs to contain every variable exactly once")
+        position = [0] * len(names)
+        for i, node in enumerate(order):
+            position[node] = i
+
+        # The clique of every node contains the node and its neighbours at
+        # the time it is eliminated. Its parent is the clique of the first
+        # of these neighbours to be eliminated, which contains all of them.
+        elim_cliques = [None] * len(names)
+        parent = [None] * len(names)
+        for node in order:
+            elim_cliques[node] = {node} | adj[node]
+            if adj[node]:
+                parent[node] = min(adj[node], key=position.__getitem__)
+            _eliminate(adj, node)
+
+        # Remove non-maximal cliques: a clique contained in one of its
+        # children is replaced by that child.
+        children = [[] for _ in names]
+        for node in order:
+            if parent[node] is not None:
+                children[parent[node]].append(node)
+        replaced = list(range(len(names)))
+        for node in order:
+            for child in children[node]:
+                if elim_cliques[node] <= elim_cliques[child]:
+                    replaced[node] = child
+                    parent[child] = parent[node]
+                    if parent[node] is not None:
+                        siblings = children[parent[node]]
+                        siblings[siblings.index(node)] = child
+                    for other in children[node]:
+                        if other != child:
+                            parent[other] = child
+                            children[child].append(other)
+                    break
+
+        def _find(node: int) -> int:
+            while replaced[node] != node:
+                node = replaced[node]
+            return node
+
+        kept = [node for node in order if replaced[node] == node]
+        clique_index = {node: i for i, node in enumerate(kept)}
+        self.cliques = [[names[v] for v in sorted(elim_cliques[node], key=position.__getitem__)]
+                        for node in kept]
+        self.parent = [None if parent[node] is None else clique_index[parent[node]] for node in kept]
+        # Breadth first order from the roots, every parent comes before
+        # its children
+        tree_children = [[] for _ in kept]
+        for i, p in enumerate(self.parent):
+            if p is not None:
+                tree_children[p].append(i)
+        self._schedule = [i for i, p in enumerate(self.parent) if p is None]
+        for i in self._schedule:
+            self._schedule.extend(tree_children[i])
+        self.separators = [[] if p is None else [v for v in self.cliques[i] if v in self.cliques[p]]
+                           for i, p in enumerate(self.parent)]
+        # Neighbouring cliques and the variables shared with them
+        self._neighbours = [[(child, self.separators[child]) for child in tree_children[i]] +
+                            ([] if p is None else [(p, self.separators[i])])
+                            for i, p in enumerate(self.parent)]
+        self._containing = {}
+        for i, clique in enumerate(self.cliques):
+            for v in clique:
+                if v not in self._containing or len(clique) < len(self.cliques[self._containing[v]]):
+                    self._containing[v] = i
+
+        # Every CPT goes to the clique of the first eliminated family member
+        self._initial = [self._unit_factor(clique) for clique in self.cliques]
+        for name in names:
+            node = bn.nodes[name]
+            family = [index[name]] + [index[p] for p in node.parent_order]
+            clique = clique_index[_find(min(family, key=position.__getitem__))]
+            self._initial[clique] = self._initial[clique].multiply(Factor.from_node(node))
+        self.evidence = {}
+        self._potentials = list(self._initial)
+        # Cached messages keyed by (source, target) and clique beliefs,
+        # entries are removed when they become invalid
+        self._messages = {}
+        self._beliefs = {}
+
+    def _unit_factor(self, variables: List[str]) -> Factor:
+        """
+            Private helper creating a factor of ones over the given variables.
+        """
+        outcomes = {v: self.bn.nodes[v].outcomes for v in variables}
+        shape = tuple(len(outcomes[v]) for v in variables)
+        return Factor(variables, outcomes, np.ones(shape))
+
+    def _update_clique(self, clique: int):
+        """
+            Private helper recomputing the potential of a clique from its
+            CPTs and the evidence assigned to it. Invalidates the belief of
+            the clique and all messages pointing away from it, stopping at
+            messages that are already invalid since everything behind them
+            is as well.
+        """
+        evidence = {v: o for v, o in self.evidence.items() if self._containing[v] == clique}
+        self._potentials[clique] = self._initial[clique].reduce(evidence) if evidence else self._initial[clique]
+        self._beliefs.pop(clique, None)
+        stack = [(clique, None)]
+        while stack:
+            node, previous = stack.pop()
+            for neighbour, _ in self._neighbours[node]:
+                if neighbour != previous and self._messages.pop((node, neighbour), None) is not None:
+                    self._beliefs.pop(neighbour, None)
+                    stack.append((neighbour, node))
+
+    def _compute_message(self, source: int, target: int, variables: List[str]) -> Factor:
+        """
+            Private helper computing the message from source to target from
+            the potential of source and its other (cached) incoming messages.
+        """
+        factors = [self._potentials[source]]
+        for neighbour, _ in self._neighbours[source]:
+            if neighbour != target:
+                factors.append(self._messages[(neighbour, source)])
+        return Factor.sum_product(factors, [v for v in self.cliques[source] if v not in variables])
+
+    def _get_belief(self, clique: int) -> Factor:
+        """
+            Private helper returning the belief of a clique, computing only
+            the messages on the way to it that are not cached.
+        """
+        if clique in self._beliefs:
+            return self._beliefs[clique]
+        # Collect the missing messages towards the clique, every message
+        # is computed after all messages it depends on.
+        missing = []
+        stack = [(clique, None)]
+        while stack:
+            node, previous = stack.pop()
+            for neighbour, variables in self._neighbours[node]:
+                if neighbour != previous and (neighbour, node) not in self._messages:
+                    missing.append((neighbour, node, variables))
+                    stack.append((neighbour, node))
+        for source, target, variables in reversed(missing):
+            self._messages[(source, target)] = self._compute_message(source, target, variables)
+        res = Factor.sum_product([self._potentials[clique]] +
+                                 [self._messages[(neighbour, clique)] for neighbour, _ in self._neighbours[clique]])
+        self._beliefs[clique] = res
+        return res
+
+    def calibrate(self):
+        """
+            Calibrates the tree with a collect pass towards the roots and a
+            distribute pass back to the leaves, computing all messages and
+            clique beliefs that are not cached yet.
+        """
+        for i in reversed(self._schedule):
+            p = self.parent[i]
+            if p is not None and (i, p) not in self._messages:
+                self._messages[(i, p)] = self._compute_message(i, p, self.separators[i])
+        for i in self._schedule:
+            p = self.parent[i]
+            if p is not None and (p, i) not in self._messages:
+                self._messages[(p, i)] = self._compute_message(p, i, self.separators[i])
+        for i in range(len(self.cliques)):
+            self._get_belief(i)
+
+    def _check_evidence(self, variable: str, outcome: str):
+        """
+            Private helper raising a ValueError for unknown variables or outcomes.
+        """
+        if variable not in self._containing:
+            raise ValueError("The network does not contain a variable called {}".format(variable))
+        if outcome not in self.bn.nodes[variable].outcomes:
+            raise ValueError("{} is not an outcome of {}".format(outcome, variable))
+
+    def set_evidence(self, evidence: Optional[Dict[str, str]] = None):
+        """
+            Replaces the current evidence. Only the variables whose evidence
+            changed are updated, see `add_evidence`.
+
+            Parameters
+            ----------
+            evidence: Dict[str, str], optional
+                A dictionary containing the evidence variables as keys and
+                their observed outcomes as values.
+
+            Raises
+            ------
+            ValueError
+                If a variable or outcome is unknown.
+        """
+        evidence = dict(evidence or {})
+        for variable, outcome in evidence.items():
+            self._check_evidence(variable, outcome)
+        changed = {v for v in set(evidence) | set(self.evidence) if evidence.get(v) != self.evidence.get(v)}
+        self.evidence = evidence
+        for clique in {self._containing[v] for v in changed}:
+            self._update_clique(clique)
+
+    def add_evidence(self, variable: Union[str, DiscreteVariable], outcome: str):
+        """
+            Adds evidence for a single variable or changes its observed
+            outcome. Only the messages pointing away from the clique holding
+            the evidence become invalid, the next query recomputes those on
+            its path.
+
+            Parameters
+            ----------
+            variable: String or DiscreteVariable
+                The observed variable.
+            outcome: String
+                The observed outcome.
+
+            Raises
+            ------
+            ValueError
+                If the variable or outcome is unknown.
+        """
+        variable = getattr(variable, "name", variable)
+        self._check_evidence(variable, outcome)
+        if self.evidence.get(variable) != outcome:
+            self.evidence[variable] = outcome
+            self._update_clique(self._containing[variable])
+
+    def retract_evidence(self, variable: Union[str, DiscreteVariable]):
+        """
+            Removes the evidence of a single variable, if there is any. As
+            with `add_evidence` only the affected messages are recomputed.
+
+            Parameters
+            ----------
+            variable: String or DiscreteVariable
+                The variable whose evidence should be removed.
+        """
+        variable = getattr(variable, "name", variable)
+        if self.evidence.pop(variable, None) is not None:
+            self._update_clique(self._containing[variable])
+
+    def get_joint(self, variables: Iterable[Union[str, DiscreteVariable]]) -> Factor:
+        """
+            Computes the joint posterior of variables that share a clique.
+
+            Parameters
+            ----------
+            variables: iterable of String or DiscreteVariable
+                The variables of interest.
+
+            Returns
+            -------
+            Factor
+                A normalized factor over the variables, in the given order.
+
+            Raises
+            ------
+            ValueError
+                If no clique contains all variables or the evidence is
+                impossible.
+        """
+        variables = [getattr(v, "name", v) for v in variables]
+        for v in variables:
+            if v not in self._containing:
+                raise ValueError("The network does not contain a variable called {}".format(v))
+        if len(variables) == 1:
+            candidates = [self._containing[variables[0]]]
+        else:
+            candidates = [i for i, clique in enumerate(self.cliques) if set(variables) <= set(clique)]
+            if not candidates:
+                raise ValueError("The variables {} do not share a clique".format(variables))
+        potential = self._get_belief(min(candidates, key=lambda i: len(self.cliques[i])))
+        res = potential.marginalize([v for v in potential.variable_order if v not in variables])
+        res.potentials = np.transpose(res.potentials, [res.variable_order.index(v) for v in variables])
+        res.variable_order = variables
+        total = np.sum(res.potentials)
+        if total == 0:
+            raise ValueError("The evidence {} has probability 0".format(self.evidence))
+        res.potentials = res.potentials / total
+        return res
+
+    def get_marginal(self, variable: Union[str, DiscreteVariable]) -> Factor:
+        """
+            Computes the posterior marginal of a single variable.
+
+            Parameters
+            ----------
+            variable: String or DiscreteVariable
+                The variable of interest.
+
+            Returns
+            -------
+            Factor
+                A normalized factor over the variable.
+        """
+        return self.get_joint([variable])
+
+    def get_evidence_probability(self) -> float:
+        """
+            Returns
+            -------
+            float
+                The probability of the current evidence.
+        """
+        res = 1.0
+        for i, p in enumerate(self.parent):
+            if p is None:
+                res *= float(np.sum(self._get_belief(i).potentials))
+        return res
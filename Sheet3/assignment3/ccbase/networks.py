@@ -6,20 +6,124 @@ Refactored module for holding graphical networks. At this point we only
 need our graph class and its subclass for Bayesian networks.
 @author: jpoeppel
 """
+from __future__ import annotations
 
 import copy
-from typing import Union, Optional, List, Dict, Iterable
+from array import array
+from typing import Union, Optional, List, Dict, Iterable, Set
 
-from .nodes import Node
+from .nodes import Node, DiscreteVariable
 from .factor import Factor
 
 import numpy as np
 
+
+def _edges_are_acyclic(n: int, src: np.ndarray, dst: np.ndarray) -> bool:
+    """
+        Checks with Kahn's algorithm whether the edges src[i] -> dst[i]
+        between the n nodes 0..n-1 are free of cycles, working on integer
+        arrays only.
+    """
+    order = np.argsort(src, kind="stable")
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=ptr[1:])
+    children = np.asarray(dst)[order].tolist()
+    ptr = ptr.tolist()
+    in_degree = np.bincount(dst, minlength=n).tolist()
+    queue = [i for i in range(n) if in_degree[i] == 0]
+    removed = 0
+    while queue:
+        i = queue.pop()
+        removed += 1
+        for c in children[ptr[i]:ptr[i+1]]:
+            in_degree[c] -= 1
+            if in_degree[c] == 0:
+                queue.append(c)
+    return removed == n
+
+
 class Graph:
     
     def __init__(self):
         self.nodes = {}
         self.is_directed = True
+        # Mutation counter, increased by every structural change. It is used
+        # to detect when the cached transitive closure became stale.
+        self._version = 0
+        self._closure = None
+
+    @classmethod
+    def from_edges(cls, names: List[str], src_idx: Iterable[int], 
+                        dst_idx: Iterable[int]) -> Graph:
+        """
+            Classmethod to build a graph in one pass from a list of node
+            names and two integer arrays describing the edges
+            names[src_idx[i]] -> names[dst_idx[i]]. All inputs are validated
+            in bulk before the graph is created, duplicate edges are ignored.
+
+            Parameters
+            ----------
+            names: [String,]
+                The names of all nodes. Must be unique.
+            src_idx: np.array of int
+                The indices (into names) of the source node of each edge.
+            dst_idx: np.array of int
+                The indices (into names) of the target node of each edge.
+
+            Returns
+            -------
+            Graph
+                The graph containing the given nodes and edges.
+
+            Raises
+            ------
+            ValueError
+                If the names are not unique or the edge arrays are invalid.
+        """
+        res = cls()
+        res._link_edges([Node(name) for name in names], src_idx, dst_idx)
+        return res
+
+    def _link_edges(self, node_list: List[Node], src_idx: Iterable[int], 
+                        dst_idx: Iterable[int]):
+        """
+            Private helper for the bulk constructors. Validates the edge
+            arrays, adds all given nodes to this (empty) graph and links them
+            according to the edges, keeping the order of the edges for the
+            parent order of each node.
+        """
+        n = len(node_list)
+        src = np.asarray(src_idx)
+        dst = np.asarray(dst_idx)
+        if src.ndim != 1 or src.shape != dst.shape:
+            raise ValueError("src_idx and dst_idx need to be one dimensional and of " \
+                             "equal length, got shapes {} and {}".format(src.shape, dst.shape))
+        if len(src) and not (np.issubdtype(src.dtype, np.integer) and np.issubdtype(dst.dtype, np.integer)):
+            raise ValueError("src_idx and dst_idx need to contain integers")
+        if len(src) and (min(src.min(), dst.min()) < 0 or max(src.max(), dst.max()) >= n):
+            raise ValueError("The edge arrays contain indices outside of [0, {})".format(n))
+        if len(src):
+            # Drop duplicate edges, but keep the first occurrence in place
+            _, first = np.unique(src.astype(np.int64) * n + dst, return_index=True)
+            if len(first) < len(src):
+                first.sort()
+                src, dst = src[first], dst[first]
+        self.nodes = {node.name: node for node in node_list}
+        if len(self.nodes) != n:
+            raise ValueError("The given node names are not unique")
+
+        # Fill the neighbour dictionaries directly rather than through
+        # add_child/add_parent, the parent order is set afterwards.
+        names = [node.name for node in node_list]
+        parents = [node.parents for node in node_list]
+        children = [node.children for node in node_list]
+        for i, j in zip(src.tolist(), dst.tolist()):
+            children[i][names[j]] = node_list[j]
+            parents[j][names[i]] = node_list[i]
+        for node in node_list:
+            if hasattr(node, "parent_order"):
+                node.parent_order = list(node.parents)
+        self._version += 1
         
     def add_node(self, node: Union[str, Node]):
         """
@@ -39,6 +143,7 @@ class Graph:
             self.nodes[node.name] = node
         except AttributeError: #We check for an attribute, rather than a type.
             self.nodes[node] = Node(node)
+        self._version += 1
         
     def remove_node(self, node: Union[str, Node]):
         """
@@ -54,6 +159,7 @@ class Graph:
         
         self.nodes[node].destroy()
         del self.nodes[node]
+        self._version += 1
         
     def add_edge(self, node1: Union[str, Node], node2: Union[str, Node]):
         """
@@ -78,6 +184,7 @@ class Graph:
             self.nodes[node1].add_child(self.nodes[node2])
             self.nodes[node2].add_parent(self.nodes[node1])
             self.is_directed = True
+            self._version += 1
         except KeyError:
             raise ValueError("At least one of your specified nodes ({},{}) " \
                              "is not contained in the graph".format(node1, node2))
@@ -101,6 +208,7 @@ class Graph:
         try:
             self.nodes[node1].remove_child(self.nodes[node2])
             self.nodes[node2].remove_parent(self.nodes[node1])
+            self._version += 1
         except KeyError:
             raise ValueError("At least one of your specified nodes ({},{}) " \
                              "is not contained in the graph".format(node1, node2))
@@ -180,14 +288,15 @@ class Graph:
         """
         if not node in self.nodes:
             raise ValueError("The graph does not contain a node called {}".format(node))
-        def _add_parents(tmpNode):
-            for p in tmpNode.parents.values():
-                if p in res:
-                    continue
-                res.add(p)
-                _add_parents(p)
+        # Explicit stack instead of recursion, so that long chains do not
+        # exceed Python's recursion limit.
         res = set()
-        _add_parents(self.nodes[node])
+        stack = [self.nodes[node]]
+        while stack:
+            for p in stack.pop().parents.values():
+                if p not in res:
+                    res.add(p)
+                    stack.append(p)
         return res
 
     def is_ancestor(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
@@ -207,7 +316,14 @@ class Graph:
                 bool
                 True if node_a is an ancestor of node_b, False otherwise.
         """
-        return node_a in self.get_ancestors(node_b)
+        index, ancestors = self._get_closure()
+        try:
+            bits = ancestors[index[node_b]]
+        except KeyError:
+            raise ValueError("The graph does not contain a node called {}".format(node_b))
+        if node_a not in index:
+            return False
+        return bool(bits >> index[node_a] & 1)
 
     def is_descendant(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
         """
@@ -226,7 +342,53 @@ class Graph:
                 bool
                 True if node_a is a descendant of node_b, False otherwise.
         """
-        return node_b in self.get_ancestors(node_a)
+        return self.is_ancestor(node_b, node_a)
+
+    def _get_closure(self):
+        """
+            Private helper returning the (cached) transitive closure of the
+            graph. The closure is stored as a dictionary mapping node names to
+            integer indices and a list containing, for each index, a Python
+            int used as bitset whose set bits mark the ancestors of that node.
+            It is recomputed whenever the graph has been modified since the
+            last computation.
+        """
+        if self._closure is not None and self._closure[0] == self._version:
+            return self._closure[1], self._closure[2]
+
+        # Kahn's algorithm gives a topological order for the acyclic part
+        # of the graph. Numbering nodes in this order keeps the bitsets
+        # small, as all ancestors of a node have smaller indices.
+        in_degree = {name: len(n.parents) for name, n in self.nodes.items()}
+        queue = [name for name, d in in_degree.items() if d == 0]
+        order = []
+        while queue:
+            name = queue.pop()
+            order.append(name)
+            for c in self.nodes[name].children:
+                in_degree[c] -= 1
+                if in_degree[c] == 0:
+                    queue.append(c)
+        remaining = [name for name, d in in_degree.items() if d > 0]
+        index = {name: i for i, name in enumerate(order + remaining)}
+
+        ancestors = [0] * len(index)
+        for name in order:
+            bits = 0
+            for p in self.nodes[name].parents:
+                i = index[p]
+                bits |= ancestors[i] | (1 << i)
+            ancestors[index[name]] = bits
+        # Nodes on or behind a cycle cannot use the dynamic programming above,
+        # for these we fall back to a separate search each.
+        for name in remaining:
+            bits = 0
+            for p in self.get_ancestors(name):
+                bits |= 1 << index[p.name]
+            ancestors[index[name]] = bits
+
+        self._closure = (self._version, index, ancestors)
+        return index, ancestors
     
     
     def get_descendants(self, node: Union[str, Node]) -> List[Node]:
@@ -241,14 +403,14 @@ class Graph:
             set
                 A set containing all descendant nodes of the specified node.
         """
-        def _add_children(tmp_node):
-            for p in tmp_node.children.values():
-                if p in res:
-                    continue
-                res.add(p)
-                _add_children(p)
+        # Explicit stack instead of recursion, see get_ancestors.
         res = set()
-        _add_children(self.nodes[node])
+        stack = [self.nodes[node]]
+        while stack:
+            for c in stack.pop().children.values():
+                if c not in res:
+                    res.add(c)
+                    stack.append(c)
         return res
 
     def is_acyclic(self) -> bool:
@@ -260,33 +422,32 @@ class Graph:
                 bool
                 True if there are no cycles within the provided graph, False otherwise.
         """
-        def _cyclic(node):
-            """
-                Private helper function to check if a node is cyclic.
-                
-                This basically implements a marking/painting algorithm going over all
-                nodes and marking them according to 0=not yet visited, 1=currently
-                active and 2=done, but with the short circuit of breaking as soon
-                as we find a loop (i.e. we meet another node, that is currently
-                active).
-            """
-            if statusMap[node] == 2:
-                return False
-            if statusMap[node] == 1:
-                return True
-            statusMap[node] = 1
-            for n in node.children.values():
-                if _cyclic(n):
-                    return True
-            statusMap[node] = 2
-            return False
-        
+        # This implements a marking/painting algorithm going over all
+        # nodes and marking them according to 0=not yet visited, 1=currently
+        # active and 2=done, but with the short circuit of breaking as soon
+        # as we find a loop (i.e. we meet another node, that is currently
+        # active). The depth first search uses an explicit stack of
+        # (node, child iterator) pairs instead of recursion.
         statusMap = {}
         for n in self.nodes.values():
             statusMap[n] = 0
-        for n in self.nodes.values():
-            if _cyclic(n):
-                return False
+        for start in self.nodes.values():
+            if statusMap[start] != 0:
+                continue
+            statusMap[start] = 1
+            stack = [(start, iter(start.children.values()))]
+            while stack:
+                node, children = stack[-1]
+                for c in children:
+                    if statusMap[c] == 1:
+                        return False
+                    if statusMap[c] == 0:
+                        statusMap[c] = 1
+                        stack.append((c, iter(c.children.values())))
+                        break
+                else:
+                    statusMap[node] = 2
+                    stack.pop()
 
         return True
             
@@ -311,6 +472,34 @@ class Graph:
             return copy.deepcopy(self)
         else:
              return copy.copy(self)
+
+    def copy_structure(self) -> Graph:
+        """
+            Copies the structure of the current graph. All nodes are copied
+            with `Node.copy_unlinked` and relinked according to this graph,
+            so that edges can be added and removed independently of this
+            graph. Other node attributes are shared, only the CPTs of
+            DiscreteVariables are copied on their first access.
+
+            Returns
+            -------
+            Graph
+                A copy of this graph with its own adjacency.
+        """
+        res = copy.copy(self)
+        res.nodes = {name: n.copy_unlinked() for name, n in self.nodes.items()}
+        for name, n in self.nodes.items():
+            new_node = res.nodes[name]
+            # Use the add functions, so that subclasses like DiscreteVariable
+            # can keep track of additional structure such as the parent order.
+            for p in getattr(n, "parent_order", n.parents):
+                new_node.add_parent(res.nodes[p])
+            for p in n.parents:
+                if p not in new_node.parents:
+                    new_node.add_parent(res.nodes[p])
+            for c in n.children:
+                new_node.add_child(res.nodes[c])
+        return res
             
     def to_undirected(self):
         """
@@ -323,7 +512,7 @@ class Graph:
             Graph
                 An undirected copy of this graph.
         """
-        res = self.copy()
+        res = self.copy_structure()
         if res.is_directed:
             for n in res.nodes.values():
                 for p in n.parents.values():
@@ -333,6 +522,7 @@ class Graph:
                     c.add_child(n)
                     n.add_parent(c)
             res.is_directed = False  
+            res._version += 1
         return res
         
         
@@ -345,4 +535,717 @@ class BayesianNetwork(Graph):
     def __init__(self):
         #Call the constructor of the Graph class.
         super(BayesianNetwork, self).__init__()
-        
\ No newline at end of file
+
+    @classmethod
+    def from_arrays(cls, names: List[str], outcomes: List[List[str]], 
+                        src_idx: Iterable[int], dst_idx: Iterable[int],
+                        cpts: Optional[List[np.array]] = None) -> BayesianNetwork:
+        """
+            Classmethod to build a Bayesian network in one pass from arrays,
+            see `Graph.from_edges`. The parents of each variable are ordered
+            as their edges appear in the edge arrays, which determines the
+            dimensions of the CPTs.
+
+            Parameters
+            ----------
+            names: [String,]
+                The names of all variables. Must be unique.
+            outcomes: [[String,],]
+                The outcomes of each variable, in the same order as names.
+            src_idx: np.array of int
+                The indices (into names) of the parent of each edge.
+            dst_idx: np.array of int
+                The indices (into names) of the child of each edge.
+            cpts: [np.array,] (optional)
+                The conditional probability table of each variable, in the
+                same order as names.
+
+            Returns
+            -------
+            BayesianNetwork
+                The network containing the given variables and edges.
+
+            Raises
+            ------
+            ValueError
+                If the arrays are invalid, the CPT dimensions do not match
+                the structure or the structure is not acyclic.
+        """
+        if len(outcomes) != len(names):
+            raise ValueError("Expected outcomes for {} variables, got {}".format(len(names), len(outcomes)))
+        if cpts is not None and len(cpts) != len(names):
+            raise ValueError("Expected cpts for {} variables, got {}".format(len(names), len(cpts)))
+        res = cls()
+        variables = [DiscreteVariable(name, list(o)) for name, o in zip(names, outcomes)]
+        res._link_edges(variables, src_idx, dst_idx)
+        if not _edges_are_acyclic(len(variables), np.asarray(src_idx, dtype=np.int64), 
+                                  np.asarray(dst_idx, dtype=np.int64)):
+            raise ValueError("The given edges contain a cycle")
+
+        if cpts is not None:
+            for var, cpt in zip(variables, cpts):
+                table = np.asarray(cpt)
+                expected = (len(var.outcomes),) + tuple(len(var.parents[p].outcomes) for p in var.parent_order)
+                if table.shape != expected:
+                    raise ValueError("The cpt of {} has shape {}, but its dependency structure " \
+                                     "requires {}".format(var.name, table.shape, expected))
+                var.cpt = table
+        return res
+
+
+class GraphView:
+    """
+        Base class for lightweight, read-only views on a graph. Views do not
+        copy any nodes or edges, instead they answer all queries by
+        delegating to the underlying graph (which may itself be a view).
+        Subclasses only need to provide `nodes`, `get_parents` and
+        `get_children`.
+
+        Attributes
+        ----------
+        graph: Graph or GraphView
+            The graph this view is based on.
+    """
+
+    def __init__(self, graph: Union[Graph, GraphView]):
+        self.graph = graph
+
+    @property
+    def nodes(self) -> Dict[str, Node]:
+        return self.graph.nodes
+
+    @property
+    def is_directed(self) -> bool:
+        return self.graph.is_directed
+
+    @property
+    def _version(self) -> int:
+        # Views change whenever the underlying graph changes
+        return self.graph._version
+
+    def _check_node(self, node: Union[str, Node]):
+        """
+            Private helper raising a ValueError if node is not part of the view.
+        """
+        if not node in self.nodes:
+            raise ValueError("The graph does not contain a node called {}".format(node))
+
+    def get_parents(self, node: Union[str, Node]) -> List[Node]:
+        return list(self.graph.get_parents(node))
+
+    def get_children(self, node: Union[str, Node]) -> List[Node]:
+        return list(self.graph.get_children(node))
+
+    def get_number_of_nodes(self) -> int:
+        """
+            Returns
+            -------
+            int
+                The total number of nodes in the view.
+        """
+        return len(self.nodes)
+
+    def get_ancestors(self, node: Union[str, Node]) -> set:
+        """
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node whose ancestors are queried.
+
+            Returns
+            -------
+            set
+                A set containing all ancestor nodes of the specified node
+                within this view.
+        """
+        self._check_node(node)
+        res = set()
+        stack = [node]
+        while stack:
+            for p in self.get_parents(stack.pop()):
+                if p not in res:
+                    res.add(p)
+                    stack.append(p)
+        return res
+
+    def get_descendants(self, node: Union[str, Node]) -> set:
+        """
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node whose descendants are queried.
+
+            Returns
+            -------
+            set
+                A set containing all descendant nodes of the specified node
+                within this view.
+        """
+        self._check_node(node)
+        res = set()
+        stack = [node]
+        while stack:
+            for c in self.get_children(stack.pop()):
+                if c not in res:
+                    res.add(c)
+                    stack.append(c)
+        return res
+
+    def is_ancestor(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
+        """
+            Checks if node_a is an ancestor of node_b within this view.
+        """
+        return node_a in self.get_ancestors(node_b)
+
+    def is_descendant(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
+        """
+            Checks if node_a is a descendant of node_b within this view.
+        """
+        return node_b in self.get_ancestors(node_a)
+
+    def to_undirected(self) -> UndirectedView:
+        """
+            Returns
+            -------
+            UndirectedView
+                An undirected view on this view.
+        """
+        return UndirectedView(self)
+
+    def copy_structure(self) -> Graph:
+        """
+            Materializes this view as a new graph of the same type as the
+            underlying graph, using `Node.copy_unlinked` for all nodes in the
+            view and linking them according to the view's edges.
+
+            Returns
+            -------
+            Graph
+                A new graph containing the nodes and edges of this view.
+        """
+        root = self.graph
+        while isinstance(root, GraphView):
+            root = root.graph
+        res = copy.copy(root)
+        res.nodes = {name: root.nodes[name].copy_unlinked() for name in self.nodes}
+        for name, new_node in res.nodes.items():
+            for p in self.get_parents(name):
+                new_node.add_parent(res.nodes[p])
+            for c in self.get_children(name):
+                new_node.add_child(res.nodes[c])
+        res.is_directed = self.is_directed
+        res._version += 1
+        return res
+
+
+class UndirectedView(GraphView):
+    """
+        A read-only undirected view on a graph: every edge of the underlying
+        graph is visible in both directions, so parents and children of a
+        node are both its neighbours. This is equivalent to
+        `Graph.to_undirected` without copying the graph.
+    """
+
+    @property
+    def is_directed(self) -> bool:
+        return False
+
+    def get_parents(self, node: Union[str, Node]) -> List[Node]:
+        """
+            Returns
+            -------
+            list
+                All neighbours of the given node.
+        """
+        # dict.fromkeys removes duplicates while keeping the order
+        return list(dict.fromkeys(list(self.graph.get_parents(node)) +
+                                  list(self.graph.get_children(node))))
+
+    def get_children(self, node: Union[str, Node]) -> List[Node]:
+        """
+            Returns
+            -------
+            list
+                All neighbours of the given node.
+        """
+        return self.get_parents(node)
+
+
+class InducedSubgraphView(GraphView):
+    """
+        A read-only view on the subgraph induced by the given nodes, i.e.
+        containing only these nodes and the edges between them.
+
+        Attributes
+        ----------
+        graph: Graph or GraphView
+            The graph this view is based on.
+        nodes: dict
+            A dictionary containing name:Node pairs of all nodes in this view.
+            The node objects are the ones of the underlying graph.
+    """
+
+    def __init__(self, graph: Union[Graph, GraphView], nodes: Iterable[Union[str, Node]]):
+        super(InducedSubgraphView, self).__init__(graph)
+        self._nodes = {}
+        for n in nodes:
+            name = getattr(n, "name", n)
+            if not name in graph.nodes:
+                raise ValueError("The graph does not contain a node called {}".format(n))
+            self._nodes[name] = graph.nodes[name]
+
+    @property
+    def nodes(self) -> Dict[str, Node]:
+        return self._nodes
+
+    def get_parents(self, node: Union[str, Node]) -> List[Node]:
+        """
+            Returns
+            -------
+            list
+                All parents of the given node that are part of this view.
+        """
+        self._check_node(node)
+        return [p for p in self.graph.get_parents(node) if p in self._nodes]
+
+    def get_children(self, node: Union[str, Node]) -> List[Node]:
+        """
+            Returns
+            -------
+            list
+                All children of the given node that are part of this view.
+        """
+        self._check_node(node)
+        return [c for c in self.graph.get_children(node) if c in self._nodes]
+
+
+class CompactGraph:
+    """
+        Alternative, memory efficient graph representation. Instead of node
+        objects holding parent and child dictionaries, node names are mapped
+        to integer ids and the edges are stored as NumPy CSR (compressed
+        sparse row) arrays, once sorted by source (children) and once by
+        target (parents).
+
+        It is not a drop-in replacement for `Graph`: it shares the method
+        names for adding, removing and querying nodes and edges, but `nodes`
+        maps names to ids and all queries return node names instead of
+        `Node` objects. Code working on names, like `check_independence`,
+        `check_independence_general` and the functions in 
+        ccbase.independence and ccbase.elimination, runs on it unchanged.
+        Code that accesses `Node` objects (e.g. `make_moral_graph` or
+        `prune_network`) needs a `Graph`.
+
+        Edges are first collected in a compact staging buffer and the CSR
+        arrays are (re)built lazily on the next query. Bulk construction is
+        therefore cheap, while single edge removals cost O(N+E).
+
+        Attributes
+        ----------
+        nodes: dict
+            A dictionary containing name:id pairs for all nodes of the graph.
+        names: list
+            The node names indexed by their id. Removed nodes leave a None
+            entry, ids are never reused.
+        is_directed: bool
+            False for graphs created by `to_undirected`.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.names = []
+        self.is_directed = True
+        # Incremented on every structural change, see Graph
+        self._version = 0
+        # Staging buffers for edges added since the last CSR build
+        self._new_src = array("q")
+        self._new_dst = array("q")
+        self._child_ptr = np.zeros(1, dtype=np.int64)
+        self._child_idx = np.zeros(0, dtype=np.int32)
+        self._parent_ptr = np.zeros(1, dtype=np.int64)
+        self._parent_idx = np.zeros(0, dtype=np.int32)
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> CompactGraph:
+        """
+            Creates a compact copy of the structure of the given graph.
+
+            Parameters
+            ----------
+            graph: Graph
+                The graph whose nodes and edges should be copied.
+
+            Returns
+            -------
+            CompactGraph
+                A compact graph with the same nodes and edges.
+        """
+        res = cls()
+        for name in graph.nodes:
+            res.add_node(name)
+        for name, node in graph.nodes.items():
+            for child in node.children:
+                res.add_edge(name, child)
+        res.is_directed = graph.is_directed
+        return res
+
+    def _id(self, node: Union[str, Node]) -> int:
+        """
+            Private helper returning the integer id of the given node (name).
+
+            Raises
+            ------
+            ValueError
+                When the graph does not contain the node.
+        """
+        try:
+            return self.nodes[getattr(node, "name", node)]
+        except KeyError:
+            raise ValueError("The graph does not contain a node called {}".format(node))
+
+    def _build(self):
+        """
+            Private helper merging the staged edges into the CSR arrays.
+        """
+        if not len(self._new_src) and len(self._child_ptr) == len(self.names) + 1:
+            return
+        n = len(self.names)
+        old_src = np.repeat(np.arange(len(self._child_ptr) - 1, dtype=np.int64),
+                            np.diff(self._child_ptr))
+        src = np.concatenate([old_src, np.frombuffer(self._new_src, dtype=np.int64)])
+        dst = np.concatenate([self._child_idx.astype(np.int64),
+                              np.frombuffer(self._new_dst, dtype=np.int64)])
+        self._new_src = array("q")
+        self._new_dst = array("q")
+        self._set_edges(src, dst, n)
+
+    def _set_edges(self, src: np.ndarray, dst: np.ndarray, n: int):
+        """
+            Private helper (re)building both CSR arrays from edge arrays,
+            dropping duplicate edges.
+        """
+        # Sorting the combined key orders the edges by source and, within
+        # each source, by target which also removes duplicates.
+        keys = np.unique(src * max(n, 1) + dst)
+        src, dst = np.divmod(keys, max(n, 1))
+        idx_type = np.int32 if n < 2**31 else np.int64
+        self._child_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self._child_ptr[1:])
+        self._child_idx = dst.astype(idx_type)
+        order = np.lexsort((src, dst))
+        self._parent_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=n), out=self._parent_ptr[1:])
+        self._parent_idx = src[order].astype(idx_type)
+        for a in (self._child_ptr, self._child_idx, self._parent_ptr, self._parent_idx):
+            a.setflags(write=False)
+
+    def _edge_arrays(self):
+        """
+            Private helper returning all current edges as (src, dst) id arrays.
+        """
+        self._build()
+        src = np.repeat(np.arange(len(self.names), dtype=np.int64), np.diff(self._child_ptr))
+        return src, self._child_idx.astype(np.int64)
+
+    def add_node(self, node: Union[str, Node]):
+        """
+            Adds a node to the graph. Only the name of a given node object
+            is stored.
+
+            Parameters
+            ----------
+            node: String or Node
+                The name of the new node or a node object.
+        """
+        name = getattr(node, "name", node)
+        if name in self.nodes:
+            raise ValueError("The graph already contains a node named {}".format(node))
+        self.nodes[name] = len(self.names)
+        self.names.append(name)
+        self._version += 1
+
+    def remove_node(self, node: Union[str, Node]):
+        """
+            Removes the node with the given name and all its edges from
+            the graph.
+
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node or the node object itself.
+        """
+        node_id = self._id(node)
+        src, dst = self._edge_arrays()
+        keep = (src != node_id) & (dst != node_id)
+        del self.nodes[self.names[node_id]]
+        self.names[node_id] = None
+        self._set_edges(src[keep], dst[keep], len(self.names))
+        self._version += 1
+
+    def add_edge(self, node1: Union[str, Node], node2: Union[str, Node]):
+        """
+            Adds a directed edge from node1 to node2.
+
+            Parameters
+            ----------
+            node1: String or Node
+                The name of the first node. The node object can also be used.
+            node2: String or Node
+                The name of the second node. The node object can also be used.
+
+            Raises
+            ------
+            ValueError
+                When either of the two nodes does not exist in the graph.
+        """
+        try:
+            id1 = self.nodes[getattr(node1, "name", node1)]
+            id2 = self.nodes[getattr(node2, "name", node2)]
+        except KeyError:
+            raise ValueError("At least one of your specified nodes ({},{}) " \
+                             "is not contained in the graph".format(node1, node2))
+        self._new_src.append(id1)
+        self._new_dst.append(id2)
+        self._version += 1
+
+    def remove_edge(self, node1: Union[str, Node], node2: Union[str, Node]):
+        """
+            Removes an edge from node1 to node2, if it exists. Ignores incorrect
+            edges.
+
+            Parameters
+            ----------
+            node1: String or Node
+                The name of the first node. The node object can also be used.
+            node2: String or Node
+                The name of the second node. The node object can also be used.
+
+            Raises
+            ------
+            ValueError
+                When either of the two nodes does not exist in the graph.
+        """
+        try:
+            id1 = self.nodes[getattr(node1, "name", node1)]
+            id2 = self.nodes[getattr(node2, "name", node2)]
+        except KeyError:
+            raise ValueError("At least one of your specified nodes ({},{}) " \
+                             "is not contained in the graph".format(node1, node2))
+        src, dst = self._edge_arrays()
+        keep = (src != id1) | (dst != id2)
+        if not keep.all():
+            self._set_edges(src[keep], dst[keep], len(self.names))
+            self._version += 1
+
+    def get_number_of_nodes(self) -> int:
+        """
+            Returns
+            -------
+            int
+                The total number of nodes in the graph.
+        """
+        return len(self.nodes)
+
+    def get_number_of_edges(self) -> int:
+        """
+            Returns
+            -------
+            int
+                The total number of (directed) edges in the graph.
+        """
+        self._build()
+        return len(self._child_idx)
+
+    def get_parent_ids(self, node_id: int) -> np.ndarray:
+        """
+            Returns the ids of all parents of the node with the given id.
+            The result is a read-only view into the CSR arrays.
+        """
+        self._build()
+        return self._parent_idx[self._parent_ptr[node_id]:self._parent_ptr[node_id + 1]]
+
+    def get_child_ids(self, node_id: int) -> np.ndarray:
+        """
+            Returns the ids of all children of the node with the given id.
+            The result is a read-only view into the CSR arrays.
+        """
+        self._build()
+        return self._child_idx[self._child_ptr[node_id]:self._child_ptr[node_id + 1]]
+
+    def get_parents(self, node: Union[str, Node]) -> List[str]:
+        """
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node whose parents are queried.
+                The Node object itself can also be used.
+
+            Returns
+            -------
+            list
+                A list containing the names of all parents of the specified node.
+
+            Raises
+            ------
+            ValueError
+                When the graph does not contain the queried node.
+        """
+        names = self.names
+        return [names[i] for i in self.get_parent_ids(self._id(node)).tolist()]
+
+    def get_children(self, node: Union[str, Node]) -> List[str]:
+        """
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node whose children are queried.
+                The Node object itself can also be used.
+
+            Returns
+            -------
+            list
+                A list containing the names of all children of the specified node.
+
+            Raises
+            ------
+            ValueError
+                When the graph does not contain the queried node.
+        """
+        names = self.names
+        return [names[i] for i in self.get_child_ids(self._id(node)).tolist()]
+
+    def _reachable(self, node_id: int, ptr: np.ndarray, idx: np.ndarray) -> Set[int]:
+        """
+            Private helper collecting the ids of all nodes reachable from
+            node_id (excluding itself, unless it lies on a cycle).
+        """
+        res = set()
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            for n in idx[ptr[current]:ptr[current + 1]].tolist():
+                if n not in res:
+                    res.add(n)
+                    stack.append(n)
+        return res
+
+    def get_ancestors(self, node: Union[str, Node]) -> Set[str]:
+        """
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node whose ancestors are queried.
+
+            Returns
+            -------
+            set
+                A set containing the names of all ancestors of the specified node.
+        """
+        node_id = self._id(node)
+        self._build()
+        return {self.names[i] for i in self._reachable(node_id, self._parent_ptr, self._parent_idx)}
+
+    def get_descendants(self, node: Union[str, Node]) -> Set[str]:
+        """
+            Parameters
+            ----------
+            node: String or Node
+                The name of the node whose descendants are queried.
+
+            Returns
+            -------
+            set
+                A set containing the names of all descendants of the specified node.
+        """
+        node_id = self._id(node)
+        self._build()
+        return {self.names[i] for i in self._reachable(node_id, self._child_ptr, self._child_idx)}
+
+    def is_ancestor(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
+        """
+            Checks if node_a is an ancestor of node_b.
+
+            Returns
+            -------
+            bool
+                True if node_a is an ancestor of node_b, False otherwise.
+        """
+        return getattr(node_a, "name", node_a) in self.get_ancestors(node_b)
+
+    def is_descendant(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
+        """
+            Checks if node_a is a descendant of node_b.
+
+            Returns
+            -------
+            bool
+                True if node_a is a descendant of node_b, False otherwise.
+        """
+        return getattr(node_b, "name", node_b) in self.get_ancestors(node_a)
+
+    def is_acyclic(self) -> bool:
+        """
+            Computes whether or not this graph is acyclic using Kahn's
+            algorithm on the CSR arrays.
+
+            Returns
+            ----------
+            bool
+                True if there are no cycles within the graph, False otherwise.
+        """
+        self._build()
+        in_degree = np.diff(self._parent_ptr)
+        queue = [i for i in self.nodes.values() if in_degree[i] == 0]
+        removed = 0
+        while queue:
+            current = queue.pop()
+            removed += 1
+            for c in self.get_child_ids(current).tolist():
+                in_degree[c] -= 1
+                if in_degree[c] == 0:
+                    queue.append(c)
+        return removed == len(self.nodes)
+
+    def copy(self, deep=True) -> CompactGraph:
+        """
+            Copies the current graph. Since the CSR arrays are never modified
+            in place, both copies can share them.
+
+            Returns
+            -------
+            CompactGraph
+                A copy of this graph.
+        """
+        self._build()
+        res = copy.copy(self)
+        res.nodes = dict(self.nodes)
+        res.names = list(self.names)
+        res._new_src = array("q")
+        res._new_dst = array("q")
+        return res
+
+    def to_undirected(self) -> CompactGraph:
+        """
+            Returns an undirected copy of this graph, where every edge is
+            present in both directions.
+
+            Returns
+            -------
+            CompactGraph
+                An undirected copy of this graph.
+        """
+        res = self.copy()
+        src, dst = self._edge_arrays()
+        res._set_edges(np.concatenate([src, dst]), np.concatenate([dst, src]), len(self.names))
+        res.is_directed = False
+        return res
+
+    @property
+    def nbytes(self) -> int:
+        """
+            The number of bytes used by the edge arrays of this graph
+            (excluding the node names).
+        """
+        return sum(a.nbytes for a in (self._child_ptr, self._child_idx,
+                                       self._parent_ptr, self._parent_idx)) + \
+               self._new_src.itemsize * (len(self._new_src) + len(self._new_dst))
@@ -8,6 +8,7 @@ node from before will be used as baseclass for other extensions.
 @author: jpoeppel
 """
 from __future__ import annotations
+import copy
 import numpy as np
 
 from typing import Optional, List, Dict, Iterable
@@ -96,6 +97,23 @@ class Node:
             c.remove_parent(self)
         self.parents = {}
         self.children = {}
+
+    def copy_unlinked(self) -> Node:
+        """
+            Creates a shallow copy of this node without any links to parents
+            or children. All other attributes are shared with this node, which
+            makes this much cheaper than a deep copy. Used by
+            `Graph.copy_structure`, which relinks the copied nodes.
+
+            Returns
+            -------
+            Node
+                A copy of this node without parents and children.
+        """
+        res = copy.copy(self)
+        res.parents = {}
+        res.children = {}
+        return res
         
     def __hash__(self) -> str:
         """
@@ -189,6 +207,54 @@ class DiscreteVariable(Node):
         if parent_node.name in self.parent_order:
             self.parent_order.remove(parent_node.name)
         super(DiscreteVariable,self).remove_parent(parent_node)
+
+    @property
+    def cpt(self):
+        # A CPT shared between a variable and its copies (see
+        # `copy_unlinked`) is copied on the first access, so that all of
+        # them can modify their CPT independently. Use `cpt_view` to only
+        # read it.
+        if self._cpt_shared:
+            self._cpt = np.array(self._cpt)
+            self._cpt_shared = False
+        return self._cpt
+
+    @cpt.setter
+    def cpt(self, value):
+        self._cpt = value
+        self._cpt_shared = False
+
+    @property
+    def cpt_view(self):
+        """
+            A read-only view of the CPT, which does not copy a CPT shared
+            with copies of this variable.
+        """
+        if not isinstance(self._cpt, np.ndarray):
+            return self._cpt
+        view = self._cpt.view()
+        view.setflags(write=False)
+        return view
+
+    def copy_unlinked(self) -> DiscreteVariable:
+        """
+            Creates a shallow copy of this variable without any links to
+            parents or children (see `Node.copy_unlinked`). The outcomes are
+            shared with this variable. The CPT is copied lazily, only when
+            it is accessed through `cpt` on either variable, so copying
+            structure (e.g. in `Graph.copy_structure`) stays cheap while
+            both still get their own, writable CPT.
+
+            Returns
+            -------
+            DiscreteVariable
+                A copy of this variable without parents and children.
+        """
+        res = super(DiscreteVariable, self).copy_unlinked()
+        res.parent_order = []
+        res._cpt_shared = isinstance(self._cpt, np.ndarray)
+        self._cpt_shared = res._cpt_shared
+        return res
         
     def set_probability_table(self, table: Iterable):
         """
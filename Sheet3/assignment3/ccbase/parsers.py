@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Importers for common Bayesian network file formats: BIF, XMLBIF and UAI
+(including UAI evidence files). All readers make a single pass over the
+file and write the probabilities directly into preallocated CPT arrays.
+
+In all three formats the tables list the probabilities of the child
+variable fastest, i.e. in the order of an array with the dimensions
+(parent_1, ..., parent_k, child). The CPTs are converted to this
+package's layout (child, parent_1, ..., parent_k) with a transposed view.
+"""
+from __future__ import annotations
+
+import itertools
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from typing import Dict, Iterator, List, Tuple
+
+from .networks import BayesianNetwork
+
+_BIF_TOKEN = re.compile(r"[{}()\[\];,|]|[^\s{}()\[\];,|]+")
+
+
+def _bif_tokens(path: str) -> Iterator[str]:
+    """
+        Private generator yielding the tokens of a BIF file line by line,
+        skipping // and /* */ comments.
+    """
+    in_comment = False
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if in_comment:
+                end = line.find("*/")
+                if end < 0:
+                    continue
+                line = line[end + 2:]
+                in_comment = False
+            if "/" in line:
+                line = re.sub(r"/\*.*?\*/", " ", line.split("//", 1)[0])
+                start = line.find("/*")
+                if start >= 0:
+                    line = line[:start]
+                    in_comment = True
+            yield from _BIF_TOKEN.findall(line)
+
+
+def _build_network(names: List[str], outcomes: Dict[str, List[str]],
+                    parents: Dict[str, List[str]],
+                    cpts: Dict[str, np.array]) -> BayesianNetwork:
+    """
+        Private helper creating the network from the parsed variables.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    src, dst, tables = [], [], []
+    for name in names:
+        if name not in cpts:
+            raise ValueError("No probability table given for variable {}".format(name))
+        for p in parents[name]:
+            src.append(index[p])
+            dst.append(index[name])
+        tables.append(cpts[name])
+    return BayesianNetwork.from_arrays(names, [outcomes[n] for n in names],
+                                       np.array(src, dtype=np.int64),
+                                       np.array(dst, dtype=np.int64), tables)
+
+
+def _child_last_table(shape: Tuple[int, ...]) -> Tuple[np.array, np.array]:
+    """
+        Private helper allocating a CPT of the given (child, parents...) shape.
+        Returns the CPT together with the (contiguous) array it is a view of,
+        whose child dimension is last. The latter matches the order of the
+        values in the files and can be filled directly.
+    """
+    file_order = np.zeros(shape[1:] + shape[:1])
+    return np.moveaxis(file_order, -1, 0), file_order
+
+
+def read_bif(path: str) -> BayesianNetwork:
+    """
+        Reads a Bayesian network in the BIF format.
+
+        Parameters
+        ----------
+        path: String
+            The path of the BIF file.
+
+        Returns
+        -------
+        BayesianNetwork
+            The network described in the file.
+
+        Raises
+        ------
+        ValueError
+            If the file is malformed or a table does not match its variables.
+    """
+    tokens = _bif_tokens(path)
+    names = []
+    outcomes = {}
+    parents = {}
+    cpts = {}
+
+    def _expect(expected: str):
+        token = next(tokens)
+        if token != expected:
+            raise ValueError("Expected '{}' but found '{}' in {}".format(expected, token, path))
+
+    def _skip_block():
+        # Skip a {...} block, including nested blocks
+        depth = 1
+        while depth:
+            token = next(tokens)
+            depth += (token == "{") - (token == "}")
+
+    def _values(count: int) -> np.array:
+        return np.fromiter(map(float, filter(",".__ne__, tokens)), dtype=float, count=count)
+
+    try:
+        for token in tokens:
+            if token == "network":
+                next(tokens)
+                _expect("{")
+                _skip_block()
+            elif token == "variable":
+                name = next(tokens)
+                states = None
+                _expect("{")
+                while True:
+                    token = next(tokens)
+                    if token == "}":
+                        break
+                    if token == "type":
+                        next(tokens) # discrete
+                        _expect("[")
+                        count = int(next(tokens))
+                        _expect("]")
+                        _expect("{")
+                        states = [t for t in itertools.takewhile(lambda t: t != "}", tokens) if t != ","]
+                        if len(states) != count:
+                            raise ValueError("Variable {} declares {} states but lists {}".format(name, count, len(states)))
+                    # Skip the rest of the statement (e.g. properties)
+                    while token != ";":
+                        token = next(tokens)
+                if states is None:
+                    raise ValueError("Variable {} has no discrete type".format(name))
+                names.append(name)
+                outcomes[name] = states
+            elif token == "probability":
+                _expect("(")
+                scope = [t for t in itertools.takewhile(lambda t: t != ")", tokens) if t not in (",", "|")]
+                child, given = scope[0], scope[1:]
+                for v in scope:
+                    if v not in outcomes:
+                        raise ValueError("The probability block of {} uses the undeclared variable {}".format(child, v))
+                parents[child] = given
+                cpt, file_order = _child_last_table(tuple(len(outcomes[v]) for v in [child] + given))
+                card = len(outcomes[child])
+                _expect("{")
+                while True:
+                    token = next(tokens)
+                    if token == "}":
+                        break
+                    if token == "table":
+                        file_order.reshape(-1)[:] = _values(cpt.size)
+                    elif token == "default":
+                        file_order[...] = _values(card)
+                    elif token == "(":
+                        states = [t for t in itertools.takewhile(lambda t: t != ")", tokens) if t != ","]
+                        index = tuple(outcomes[p].index(s) for p, s in zip(given, states))
+                        file_order[index] = _values(card)
+                    elif token != ";":
+                        raise ValueError("Unexpected '{}' in probability block of {}".format(token, child))
+                cpts[child] = cpt
+            else:
+                raise ValueError("Unexpected '{}' in {}".format(token, path))
+    except StopIteration:
+        raise ValueError("Unexpected end of file {}".format(path))
+
+    return _build_network(names, outcomes, parents, cpts)
+
+
+def read_xmlbif(path: str) -> BayesianNetwork:
+    """
+        Reads a Bayesian network in the XMLBIF (0.3) format. The file is
+        parsed incrementally, every element is discarded once processed.
+
+        Parameters
+        ----------
+        path: String
+            The path of the XMLBIF file.
+
+        Returns
+        -------
+        BayesianNetwork
+            The network described in the file.
+    """
+    names = []
+    outcomes = {}
+    parents = {}
+    cpts = {}
+    for _, element in ET.iterparse(path, events=("end",)):
+        tag = element.tag.upper()
+        if tag == "VARIABLE":
+            name = element.findtext("NAME").strip()
+            names.append(name)
+            outcomes[name] = [o.text.strip() for o in element.iter("OUTCOME")]
+            element.clear()
+        elif tag in ("DEFINITION", "PROBABILITY"):
+            child = element.findtext("FOR").strip()
+            given = [g.text.strip() for g in element.iter("GIVEN")]
+            parents[child] = given
+            cpt, file_order = _child_last_table(tuple(len(outcomes[v]) for v in [child] + given))
+            table = np.array(element.findtext("TABLE").split(), dtype=float)
+            if table.size != cpt.size:
+                raise ValueError("The table of {} has {} entries instead of {}".format(child, table.size, cpt.size))
+            file_order.reshape(-1)[:] = table
+            cpts[child] = cpt
+            element.clear()
+    return _build_network(names, outcomes, parents, cpts)
+
+
+def _uai_tokens(path: str) -> Iterator[str]:
+    """
+        Private generator yielding the whitespace separated tokens of a file.
+    """
+    with open(path) as f:
+        for line in f:
+            yield from line.split()
+
+
+def read_uai(path: str) -> BayesianNetwork:
+    """
+        Reads a Bayesian network in the UAI format. Since the format does not
+        name variables or outcomes, the variables are named by their index
+        ("0", "1", ...) and their outcomes are "0" to "k-1".
+
+        Parameters
+        ----------
+        path: String
+            The path of the UAI file.
+
+        Returns
+        -------
+        BayesianNetwork
+            The network described in the file.
+
+        Raises
+        ------
+        ValueError
+            If the file does not describe a Bayesian network (BAYES).
+    """
+    tokens = _uai_tokens(path)
+    kind = next(tokens)
+    if kind.upper() != "BAYES":
+        raise ValueError("Only BAYES networks can be read, {} is a {} network".format(path, kind))
+    n = int(next(tokens))
+    cards = [int(next(tokens)) for _ in range(n)]
+    names = [str(i) for i in range(n)]
+    outcomes = {name: [str(o) for o in range(card)] for name, card in zip(names, cards)}
+    functions = int(next(tokens))
+    # The child variable is the last one in each scope
+    scopes = []
+    for _ in range(functions):
+        size = int(next(tokens))
+        scopes.append([int(next(tokens)) for _ in range(size)])
+    parents = {}
+    cpts = {}
+    for scope in scopes:
+        child = names[scope[-1]]
+        parents[child] = [names[p] for p in scope[:-1]]
+        cpt, file_order = _child_last_table(tuple(cards[v] for v in [scope[-1]] + scope[:-1]))
+        size = int(next(tokens))
+        if size != cpt.size:
+            raise ValueError("The table for variable {} has {} entries, expected {}".format(child, size, cpt.size))
+        file_order.reshape(-1)[:] = np.fromiter(map(float, tokens), dtype=float, count=size)
+        cpts[child] = cpt
+    return _build_network(names, outcomes, parents, cpts)
+
+
+def read_uai_evidence(path: str, bn: BayesianNetwork, layout: str) -> List[Dict[str, str]]:
+    """
+        Reads a UAI evidence file for a network loaded with `read_uai`.
+        The layout has to be given explicitly, since the contents alone are
+        ambiguous: "2 1 0 0 0" is valid in both of them.
+
+        Parameters
+        ----------
+        path: String
+            The path of the evidence file.
+        bn: BayesianNetwork
+            The network the evidence refers to.
+        layout: String
+            "single" for the old format "n var val ..." containing one
+            evidence sample, "samples" for the newer format starting with
+            the number of evidence samples, each given as "n var val ...".
+
+        Returns
+        -------
+        list
+            A list containing a variable:outcome dictionary for every
+            evidence sample in the file.
+
+        Raises
+        ------
+        ValueError
+            If the layout is unknown or the file does not match it.
+    """
+    if layout not in ("single", "samples"):
+        raise ValueError("Unknown UAI evidence layout {}".format(layout))
+    values = [int(t) for t in _uai_tokens(path)]
+    if not values:
+        return []
+    if layout == "single":
+        samples, position = 1, 0
+    else:
+        samples, position = values[0], 1
+    res = []
+    for _ in range(samples):
+        if position >= len(values):
+            raise ValueError("The evidence file {} ends early".format(path))
+        count = values[position]
+        pairs = values[position + 1:position + 1 + 2 * count]
+        if len(pairs) != 2 * count:
+            raise ValueError("The evidence file {} ends early".format(path))
+        evidence = {}
+        for var, val in zip(pairs[::2], pairs[1::2]):
+            node = bn.nodes[str(var)]
+            evidence[node.name] = node.outcomes[val]
+        res.append(evidence)
+        position += 1 + 2 * count
+    if position != len(values):
+        raise ValueError("The evidence file {} does not match the {} layout".format(path, layout))
+    return res
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query driven pruning of Bayesian networks (see Darwiche, Modeling and
+Reasoning with Bayesian Networks, Chapter 6.9). Before running variable
+elimination for P(query|evidence), the network is reduced to the part
+that can influence the result:
+
+    barren nodes    Leaves outside query and evidence are removed,
+                    repeatedly, which leaves the ancestors of query and
+                    evidence.
+    evidence edges  Edges leaving an evidence node are removed after
+                    reducing the CPTs of its children to the observed
+                    outcome.
+    d-separation    Nodes that are d-separated from the query given the
+                    evidence only contribute a constant and are removed.
+                    After the previous steps these are exactly the nodes
+                    outside the connected components of the query nodes.
+
+The CPTs of the pruned network are views into the original CPTs.
+"""
+from __future__ import annotations
+
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Union
+
+from .networks import BayesianNetwork
+from .nodes import DiscreteVariable
+
+
+def _name(node: Union[str, DiscreteVariable]) -> str:
+    return getattr(node, "name", node)
+
+
+def prune_network(bn: BayesianNetwork, query: Iterable[Union[str, DiscreteVariable]],
+                    evidence: Optional[Dict[str, str]] = None) -> BayesianNetwork:
+    """
+        Creates the pruned network for computing P(query|evidence).
+
+        Parameters
+        ----------
+        bn: BayesianNetwork
+            The network to be pruned, it is not modified.
+        query: iterable of String or DiscreteVariable
+            The variables of interest.
+        evidence: Dict[str, str], optional
+            A dictionary containing the evidence variables as keys and their
+            observed outcomes as values.
+
+        Returns
+        -------
+        BayesianNetwork
+            A network over a subset of the variables yielding the same
+            P(query|evidence). Evidence variables keep their own CPTs, but
+            no longer have children.
+
+        Raises
+        ------
+        ValueError
+            If a query or evidence variable or an outcome is unknown.
+    """
+    if evidence is None:
+        evidence = {}
+    query = [_name(q) for q in query]
+    for name in list(query) + list(evidence):
+        if name not in bn.nodes:
+            raise ValueError("The network does not contain a variable called {}".format(name))
+    observed = {}
+    for name, outcome in evidence.items():
+        try:
+            observed[name] = bn.nodes[name].outcomes.index(outcome)
+        except ValueError:
+            raise ValueError("{} is not an outcome of {}".format(outcome, name))
+
+    # Barren nodes: keeping the ancestors of query and evidence is the same
+    # as repeatedly removing leaves outside of both.
+    relevant = set()
+    stack = [n for n in list(query) + list(observed) if n not in relevant]
+    relevant.update(stack)
+    while stack:
+        for p in bn.nodes[stack.pop()].parents:
+            if p not in relevant:
+                relevant.add(p)
+                stack.append(p)
+
+    # d-separation: label the components of the remaining graph without
+    # the edges leaving evidence nodes and keep those of the query.
+    def _neighbours(name: str) -> List[str]:
+        node = bn.nodes[name]
+        res = [p for p in node.parents if p not in observed]
+        if name not in observed:
+            res.extend(c for c in node.children if c in relevant)
+        return res
+
+    connected = set(query)
+    stack = list(connected)
+    while stack:
+        for n in _neighbours(stack.pop()):
+            if n not in connected:
+                connected.add(n)
+                stack.append(n)
+
+    names = [name for name in bn.nodes if name in connected]
+    index = {name: i for i, name in enumerate(names)}
+    src, dst, cpts = [], [], []
+    for i, name in enumerate(names):
+        node = bn.nodes[name]
+        # Evidence edges: fix the dimensions of observed parents
+        cut = tuple(observed.get(p, slice(None)) for p in node.parent_order)
+        # Nodes without a table yet keep their default cpt
+        cpts.append(node.cpt[(slice(None),) + cut] if isinstance(node.cpt, np.ndarray) else node.cpt)
+        for p in node.parent_order:
+            if p not in observed:
+                src.append(index[p])
+                dst.append(i)
+    res = BayesianNetwork.from_arrays(names, [bn.nodes[n].outcomes for n in names],
+                                      np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64))
+    for name, cpt in zip(names, cpts):
+        res.nodes[name].cpt = cpt
+    return res
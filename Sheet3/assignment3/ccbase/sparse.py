@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A sparse (coordinate list) representation of factors for deterministic or
+nearly deterministic CPTs and variables with many outcomes. Only the
+nonzero potentials are stored, together with one index array per variable.
+The entries are kept sorted by their position in the dense table, i.e.
+lexicographically by the indices in variable order.
+
+SparseFactor offers the same operations as Factor and can be combined with
+dense factors. The results of its operations switch back to a dense Factor
+once their density exceeds the threshold.
+"""
+from __future__ import annotations
+
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Union
+
+from .factor import Factor
+
+# Fraction of nonzero cells above which a factor is stored densely. A
+# sparse entry needs one index per variable in addition to its value.
+_DENSITY_THRESHOLD = 0.1
+
+
+def _auto(factor: Union[Factor, SparseFactor], threshold: float = _DENSITY_THRESHOLD) -> Union[Factor, SparseFactor]:
+    """
+        Private helper converting between the representations depending on
+        the density of the factor.
+    """
+    if isinstance(factor, SparseFactor):
+        return factor.to_dense() if factor.density > threshold else factor
+    return to_sparse_if_beneficial(factor, threshold)
+
+
+def to_sparse_if_beneficial(factor: Factor, threshold: float = _DENSITY_THRESHOLD) -> Union[Factor, SparseFactor]:
+    """
+        Converts a dense factor to a SparseFactor if at most the given
+        fraction of its potentials is nonzero.
+
+        Parameters
+        ----------
+        factor: Factor
+            The dense factor, it is not modified.
+        threshold: float, optional
+            The maximal density of factors that are converted.
+
+        Returns
+        -------
+        Factor or SparseFactor
+            The sparse factor, or the given factor if it is too dense or in
+            log space.
+    """
+    if factor.log or len(factor.variable_order) == 0:
+        return factor
+    if np.count_nonzero(factor.potentials) > threshold * factor.potentials.size:
+        return factor
+    return SparseFactor.from_dense(factor)
+
+
+class SparseFactor(object):
+
+    def __init__(self, variables: List[str], outcomes: Dict[str, List[str]],
+                    indices: np.array, values: np.array):
+        """
+            Creates a sparse factor from the nonzero potentials.
+
+            Parameters
+            ----------
+            variables: [String,]
+                The names of all variables this factor represents.
+            outcomes: dict
+                A dictionary containing the variable names as keys and a list
+                containing the possible outcomes of said variable as values.
+            indices: np.array
+                An integer array of shape (len(variables), n) containing the
+                outcome index of every variable for each of the n entries.
+                Every entry may only occur once.
+            values: np.array
+                The n potentials of the entries.
+
+            Raises
+            ------
+            ValueError
+                If the shapes of indices and values do not match.
+        """
+        self.variable_order = list(variables)
+        self.outcomes = {v: tuple(outcomes[v]) for v in self.variable_order}
+        indices = np.asarray(indices, dtype=np.int64).reshape(len(self.variable_order), -1)
+        values = np.asarray(values, dtype=float).reshape(-1)
+        if indices.shape[1] != len(values):
+            raise ValueError("Got {} indices for {} values".format(indices.shape[1], len(values)))
+        # np.lexsort uses the last key as primary key
+        order = np.lexsort(indices[::-1]) if len(self.variable_order) else np.arange(len(values))
+        self.indices = indices[:, order]
+        self.values = values[order]
+        self.log = False
+
+    @classmethod
+    def from_dense(cls, factor: Factor) -> SparseFactor:
+        """
+            Classmethod creating a sparse factor from the nonzero potentials
+            of a dense factor.
+
+            Parameters
+            ----------
+            factor: Factor
+                The dense factor, not in log space.
+
+            Returns
+            -------
+            SparseFactor
+                The sparse factor with the same potentials.
+
+            Raises
+            ------
+            ValueError
+                If the factor is in log space.
+        """
+        if factor.log:
+            raise ValueError("Factors in log space cannot be stored sparsely")
+        potentials = np.asarray(factor.potentials, dtype=float)
+        res = cls.__new__(cls)
+        res.variable_order = list(factor.variable_order)
+        res.outcomes = {v: factor.outcomes[v] for v in res.variable_order}
+        if potentials.ndim:
+            # np.nonzero already returns the entries in row-major order
+            nonzero = np.nonzero(potentials)
+            res.indices = np.array(nonzero, dtype=np.int64)
+            res.values = potentials[nonzero]
+        else:
+            res.values = potentials.reshape(-1)[potentials.reshape(-1) != 0]
+            res.indices = np.zeros((0, len(res.values)), dtype=np.int64)
+        res.log = False
+        return res
+
+    @classmethod
+    def from_node(cls, node) -> Union[Factor, SparseFactor]:
+        """
+            Classmethod creating a factor from the CPT of a DiscreteVariable,
+            sparse if the CPT is sparse enough.
+
+            Parameters
+            ----------
+            node: ccbase.nodes.DiscreteVariable
+                The DiscreteVariable that should be used to initialize this
+                factor.
+
+            Returns
+            -------
+            Factor or SparseFactor
+                The factor over the variable and its parents.
+        """
+        return to_sparse_if_beneficial(Factor.from_node(node))
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(len(self.outcomes[v]) for v in self.variable_order)
+
+    @property
+    def density(self) -> float:
+        """
+            The fraction of nonzero potentials.
+        """
+        size = int(np.prod(self.shape, dtype=np.int64))
+        return len(self.values) / size if size else 0.0
+
+    def _keys(self, variables: List[str]) -> np.array:
+        """
+            Private helper returning the position of every entry in the
+            dense table over the given variables.
+        """
+        if not variables:
+            return np.zeros(len(self.values), dtype=np.int64)
+        rows = [self.indices[self.variable_order.index(v)] for v in variables]
+        return np.ravel_multi_index(rows, [len(self.outcomes[v]) for v in variables])
+
+    def to_dense(self) -> Factor:
+        """
+            Creates a dense factor with the same potentials.
+
+            Returns
+            -------
+            Factor
+                The dense factor.
+        """
+        res = Factor()
+        if self.variable_order:
+            res.potentials = np.zeros(self.shape)
+            res.potentials[tuple(self.indices)] = self.values
+        else:
+            res.potentials = np.sum(self.values)
+        res.variable_order = list(self.variable_order)
+        res.outcomes = dict(self.outcomes)
+        return res
+
+    def copy(self) -> SparseFactor:
+        """
+            Creates a (deep) copy of this factor.
+
+            Returns
+            -------
+            SparseFactor
+                An exact copy of self.
+        """
+        res = SparseFactor.__new__(SparseFactor)
+        res.variable_order = list(self.variable_order)
+        res.outcomes = dict(self.outcomes)
+        res.indices = np.copy(self.indices)
+        res.values = np.copy(self.values)
+        res.log = False
+        return res
+
+    def __call__(self, instantiation: Dict[str, str]) -> Union[float, np.array]:
+        return self.potential(instantiation)
+
+    def potential(self, instantiation: Dict[str, str]) -> Union[float, np.array]:
+        """
+            Returns the current potential for the specified instantiation of
+            all contained variables, as `Factor.potential`.
+
+            Parameters
+            ----------
+            instantiation: dict
+                A dictionary containing the variable names as keys and their
+                desired instantiation as value.
+
+            Returns
+            -------
+            float or np.array
+                The potential for that specified instantiation. In case of
+                partial instantiations, a np.array over the other variables
+                is returned instead.
+        """
+        for v in self.variable_order:
+            if v in instantiation and instantiation[v] not in self.outcomes[v]:
+                raise ValueError("There is no potential for variable {} with outcome {} in this factor.".format(
+                    v, instantiation[v]))
+        if all(v in instantiation for v in self.variable_order):
+            # Binary search for the entry of a full instantiation
+            key = np.ravel_multi_index([self.outcomes[v].index(instantiation[v]) for v in self.variable_order],
+                                       self.shape) if self.variable_order else 0
+            keys = self._keys(self.variable_order)
+            pos = np.searchsorted(keys, key)
+            return float(self.values[pos]) if pos < len(keys) and keys[pos] == key else 0.0
+        return np.squeeze(self.reduce(instantiation, "drop").to_dense().potentials)
+
+    def marginalize(self, variables: List[str]) -> Union[Factor, SparseFactor]:
+        """
+            Creates a new factor where the specified variables are summed
+            out, by grouping the entries by the remaining variables.
+
+            Parameters
+            ----------
+            variables: [String,]
+                A list containing the names of all the variables that should
+                be summed out.
+
+            Returns
+            -------
+            Factor or SparseFactor
+                A factor where the specified variables have been summed out,
+                dense if its density exceeds the threshold.
+        """
+        if not isinstance(variables, (list, set)):
+            variables = [variables]
+        remaining = [v for v in self.variable_order if v not in variables]
+        keys = self._keys(remaining)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        unique, starts = np.unique(keys, return_index=True)
+        values = np.add.reduceat(self.values[order], starts) if len(keys) else self.values[:0]
+        shape = [len(self.outcomes[v]) for v in remaining]
+        if not remaining:
+            res = Factor()
+            res.potentials = np.sum(values)
+            return res
+        indices = np.array(np.unravel_index(unique, shape), dtype=np.int64).reshape(len(remaining), -1)
+        return _auto(self._create(remaining, indices, values))
+
+    def _create(self, variables: List[str], indices: np.array, values: np.array,
+                    outcomes: Optional[Dict[str, tuple]] = None) -> SparseFactor:
+        """
+            Private helper creating a factor from indices that are already
+            sorted, with the outcomes of this factor.
+        """
+        outcomes = outcomes or self.outcomes
+        res = SparseFactor.__new__(SparseFactor)
+        res.variable_order = list(variables)
+        res.outcomes = {v: outcomes[v] for v in variables}
+        res.indices = indices
+        res.values = values
+        res.log = False
+        return res
+
+    def _restrict(self, outcomes: Dict[str, tuple]) -> SparseFactor:
+        """
+            Private helper selecting the given outcomes of some variables,
+            see `Factor._restrict`.
+        """
+        res = self
+        for v, outcome_list in outcomes.items():
+            if v in res.outcomes and res.outcomes[v] != tuple(outcome_list):
+                row = res.variable_order.index(v)
+                # Maps the old outcome indices to the new ones or -1
+                mapping = np.array([outcome_list.index(o) if o in outcome_list else -1 for o in res.outcomes[v]],
+                                   dtype=np.int64)
+                new = mapping[res.indices[row]]
+                keep = new >= 0
+                indices = res.indices[:, keep]
+                indices[row] = new[keep]
+                res = SparseFactor(res.variable_order, dict(res.outcomes, **{v: outcome_list}),
+                                   indices, res.values[keep])
+        return res
+
+    def multiply(self, other_factor: Union[Factor, SparseFactor]) -> Union[Factor, SparseFactor]:
+        """
+            Creates a new factor, which is the product of this factor and the
+            given (dense or sparse) one. The entries of both factors are
+            sorted by the shared variables and matched with a merge join,
+            so only pairs of nonzero entries are ever combined.
+
+            Parameters
+            ----------
+            other_factor: Factor or SparseFactor
+                The factor to multiply this factor with.
+
+            Returns
+            -------
+            Factor or SparseFactor
+                The resulting factor over the variables of this factor
+                followed by the other variables of other_factor. It is dense
+                if its density exceeds the threshold.
+        """
+        if not isinstance(other_factor, SparseFactor):
+            if other_factor.log:
+                return self.to_dense().multiply(other_factor)
+            other_factor = SparseFactor.from_dense(other_factor)
+        if any(other_factor.outcomes.get(v, o) != o for v, o in self.outcomes.items()):
+            outcomes = Factor._common_outcomes([self, other_factor])
+            return self._restrict(outcomes).multiply(other_factor._restrict(outcomes))
+
+        shared = [v for v in self.variable_order if v in other_factor.outcomes]
+        extra = [v for v in other_factor.variable_order if v not in self.outcomes]
+        left = self._keys(shared)
+        right = other_factor._keys(shared)
+        right_order = np.argsort(right, kind="stable")
+        right = right[right_order]
+        # For every left entry, the range of right entries with the same key
+        start = np.searchsorted(right, left, "left")
+        counts = np.searchsorted(right, left, "right") - start
+        left_rows = np.repeat(np.arange(len(left)), counts)
+        offsets = np.arange(len(left_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        right_rows = right_order[np.repeat(start, counts) + offsets]
+
+        extra_rows = [other_factor.variable_order.index(v) for v in extra]
+        indices = np.vstack([self.indices[:, left_rows], other_factor.indices[extra_rows][:, right_rows]])
+        values = self.values[left_rows] * other_factor.values[right_rows]
+        outcomes = dict(other_factor.outcomes, **self.outcomes)
+        res = SparseFactor(self.variable_order + extra, outcomes, indices, values)
+        return _auto(res)
+
+    def __mul__(self, other: Union[Factor, SparseFactor]) -> Union[Factor, SparseFactor]:
+        return self.multiply(other)
+
+    def reduce(self, evidence: Dict[str, str], mode: str = "mask") -> SparseFactor:
+        """
+            Creates a new factor which has been reduced to conform to the
+            provided evidence, see `Factor.reduce` for the modes. Entries
+            contradicting the evidence are removed in every mode.
+
+            Parameters
+            ----------
+            evidence: dict
+                A dictionary containing variable:outcome pairs specifying the
+                evidence.
+            mode: str (optional)
+                "mask" (default), "keep" or "drop".
+
+            Returns
+            -------
+            SparseFactor
+                A factor that has been reduced to conform to the given
+                evidence.
+
+            Raises
+            ------
+            ValueError
+                If an outcome is not part of this factor or the mode is
+                unknown.
+        """
+        if mode not in ("mask", "keep", "drop"):
+            raise ValueError("Unknown reduce mode {}".format(mode))
+        keep = np.ones(len(self.values), dtype=bool)
+        observed = {}
+        for row, v in enumerate(self.variable_order):
+            if v in evidence:
+                try:
+                    observed[v] = self.outcomes[v].index(evidence[v])
+                except ValueError:
+                    raise ValueError("There is no potential for variable {} with outcome {} in this factor.".format(
+                        v, evidence[v]))
+                keep &= self.indices[row] == observed[v]
+        indices = self.indices[:, keep]
+        values = self.values[keep]
+        if mode == "mask":
+            return self._create(self.variable_order, indices, values)
+        if mode == "keep":
+            for v in observed:
+                indices[self.variable_order.index(v)] = 0
+            return self._create(self.variable_order, indices, values,
+                                dict(self.outcomes, **{v: (evidence[v],) for v in observed}))
+        rows = [row for row, v in enumerate(self.variable_order) if v not in observed]
+        # Removing constant rows keeps the entries sorted
+        return self._create([self.variable_order[row] for row in rows], indices[rows], values)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary single-file format for Bayesian networks. Files are opened with
+np.memmap, so that the CPTs of a loaded network are read-only views into
+the file which are only paged in when accessed. Several processes loading
+the same file share its pages through the operating system's page cache.
+
+Layout (version 1, little endian, all sections aligned to 8 bytes):
+
+    header          magic b"CCBN", format version and section offsets
+    string offsets  int64[n_strings + 1], byte offsets into string data
+    string data     utf-8 encoded node names followed by all outcomes
+    outcome ptr     int64[n_nodes + 1], outcome string ranges per node
+    parent ptr      int64[n_nodes + 1], CSR row pointers of the parents
+    parent idx      int64[n_edges], parent ids in each node's parent order
+    cpt offsets     int64[n_nodes + 1], element offsets into the arena
+    cpt arena       float64 values of all CPTs in C order
+"""
+from __future__ import annotations
+
+import struct
+
+import numpy as np
+from typing import List
+
+from .networks import BayesianNetwork
+
+MAGIC = b"CCBN"
+VERSION = 1
+# magic, version, n_nodes, n_edges, n_strings and the offsets of the
+# seven sections plus the total file size.
+_HEADER = struct.Struct("<4sIQQQ8Q")
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+def save_network(bn: BayesianNetwork, path: str):
+    """
+        Writes the given network to a single binary file.
+
+        Parameters
+        ----------
+        bn: BayesianNetwork
+            The network to be stored. All variables need a CPT matching their
+            dependency structure.
+        path: String
+            The path of the file to be written.
+
+        Raises
+        ------
+        ValueError
+            If a variable's CPT does not match its dependency structure.
+    """
+    variables = list(bn.nodes.values())
+    index = {var.name: i for i, var in enumerate(variables)}
+    n = len(variables)
+
+    strings = [var.name for var in variables]
+    outcome_ptr = np.zeros(n + 1, dtype="<i8")
+    parent_ptr = np.zeros(n + 1, dtype="<i8")
+    cpt_offsets = np.zeros(n + 1, dtype="<i8")
+    parent_idx = []
+    for i, var in enumerate(variables):
+        strings.extend(var.outcomes)
+        outcome_ptr[i+1] = outcome_ptr[i] + len(var.outcomes)
+        parent_idx.extend(index[p] for p in var.parent_order)
+        parent_ptr[i+1] = len(parent_idx)
+        shape = (len(var.outcomes),) + tuple(len(var.parents[p].outcomes) for p in var.parent_order)
+        if np.shape(var.cpt_view) != shape:
+            raise ValueError("The cpt of {} does not match its dependency structure".format(var.name))
+        cpt_offsets[i+1] = cpt_offsets[i] + int(np.prod(shape))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(e) for e in encoded], out=string_offsets[1:])
+    sections = [string_offsets.tobytes(), b"".join(encoded), outcome_ptr.tobytes(),
+                parent_ptr.tobytes(), np.asarray(parent_idx, dtype="<i8").tobytes(),
+                cpt_offsets.tobytes(), None]
+
+    offsets = []
+    position = _align(_HEADER.size)
+    for data in sections[:-1]:
+        offsets.append(position)
+        position = _align(position + len(data))
+    offsets.append(position)
+    size = position + 8 * int(cpt_offsets[-1])
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, n, len(parent_idx), len(strings), *offsets, size))
+        for offset, data in zip(offsets, sections[:-1]):
+            f.seek(offset)
+            f.write(data)
+        f.seek(offsets[-1])
+        # The CPTs are written one by one to avoid building the arena in memory
+        for var in variables:
+            f.write(np.ascontiguousarray(var.cpt_view, dtype="<f8").tobytes())
+        f.truncate(size)
+
+
+def load_network(path: str) -> BayesianNetwork:
+    """
+        Opens a network stored with `save_network`. The file is memory
+        mapped read-only and the CPTs of all variables are views into the
+        mapped file, they are not copied.
+
+        Parameters
+        ----------
+        path: String
+            The path of the file to be opened.
+
+        Returns
+        -------
+        BayesianNetwork
+            The stored network.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a network file of a supported version.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if len(data) < _HEADER.size:
+        raise ValueError("{} is not a network file".format(path))
+    header = _HEADER.unpack(data[:_HEADER.size].tobytes())
+    magic, version, n, n_edges, n_strings = header[:5]
+    offsets = header[5:12]
+    if magic != MAGIC:
+        raise ValueError("{} is not a network file".format(path))
+    if version != VERSION:
+        raise ValueError("Unsupported network file version {}".format(version))
+    if header[12] != len(data):
+        raise ValueError("{} is truncated".format(path))
+
+    def _section(i: int, dtype: str, count: int) -> np.ndarray:
+        return np.ndarray((count,), dtype=dtype, buffer=data, offset=offsets[i])
+
+    string_offsets = _section(0, "<i8", n_strings + 1)
+    string_data = data[offsets[1]:offsets[1] + int(string_offsets[-1])].tobytes()
+    strings = [string_data[a:b].decode("utf-8")
+                for a, b in zip(string_offsets[:-1].tolist(), string_offsets[1:].tolist())]
+    outcome_ptr = _section(2, "<i8", n + 1).tolist()
+    parent_ptr = _section(3, "<i8", n + 1)
+    parent_idx = _section(4, "<i8", n_edges)
+    cpt_offsets = _section(5, "<i8", n + 1).tolist()
+    arena = _section(6, "<f8", cpt_offsets[-1])
+
+    names = strings[:n]
+    outcomes = [strings[n + outcome_ptr[i]:n + outcome_ptr[i+1]] for i in range(n)]
+    cards = [len(o) for o in outcomes]
+    # Edges grouped by child, in each child's parent order
+    children = np.repeat(np.arange(n), np.diff(parent_ptr))
+    cpts: List[np.ndarray] = []
+    for i in range(n):
+        shape = [cards[i]] + [cards[p] for p in parent_idx[parent_ptr[i]:parent_ptr[i+1]].tolist()]
+        cpts.append(arena[cpt_offsets[i]:cpt_offsets[i+1]].reshape(shape))
+    return BayesianNetwork.from_arrays(names, outcomes, parent_idx, children, cpts)
@@ -10,10 +10,22 @@ author: Hendric Voß
 last modified. 13.11.2022
 """
 
+import os
+import tempfile
 import unittest
 import numpy as np
 import assignment3 as solution
 
+from ccbase.storage import save_network, load_network
+from ccbase.parsers import read_bif, read_xmlbif, read_uai, read_uai_evidence
+from ccbase.independence import get_d_connection_matrix
+from ccbase.elimination import get_interaction_graph, find_elimination_ordering, get_elimination_cost, HEURISTICS
+from ccbase.elimination import search_elimination_ordering
+from ccbase.pruning import prune_network
+from ccbase.junction_tree import JunctionTree
+from ccbase.contraction import contract_query
+from ccbase.sparse import SparseFactor, to_sparse_if_beneficial
+
 class TestAssignment3(unittest.TestCase):
 
     def test_is_collider(self):
@@ -36,11 +48,49 @@ class TestAssignment3(unittest.TestCase):
         self.assertTrue(solution.check_independence(graph, ["B"], ["E"], ["R"]), "B and E are conditionally indepedent given E")
         self.assertFalse(solution.check_independence(graph, ["B"], ["E"], ["A"]), "B and E are conditionally dependent given A")
 
+    def test_check_independence_lecture_graph(self):
+        graph = self._create_lecture_graph()
+        self.assertTrue(solution.check_independence(graph, ["A"], ["B"], []))
+        self.assertFalse(solution.check_independence(graph, ["A"], ["B"], ["L"]), "L is a descendant of the collider H")
+        self.assertTrue(solution.check_independence(graph, ["A"], ["B"], ["L", "E"]))
+        self.assertTrue(solution.check_independence(graph, ["G"], ["L"], ["E"]))
+        self.assertFalse(solution.check_independence(graph, ["G", "A"], ["M", "L"], ["C"]))
+
+    def test_d_connection_matrix(self):
+        graph = self._create_lecture_graph()
+        nodes_z = ["C", "E"]
+        matrix, names = get_d_connection_matrix(graph, nodes_z)
+        self.assertEqual(matrix.shape, (len(names), len(names)))
+        for i, x in enumerate(names):
+            for j, y in enumerate(names):
+                expected = x not in nodes_z and y not in nodes_z and \
+                    not solution.check_independence(graph, [x], [y], nodes_z)
+                self.assertEqual(matrix[i, j], expected, "{} and {} given {}".format(x, y, nodes_z))
+        packed, _ = get_d_connection_matrix(graph, nodes_z, processes=2, packed=True)
+        np.testing.assert_array_equal(np.unpackbits(packed, axis=1, count=len(names)), matrix)
+
+    def test_independence_oracle(self):
+        graph = self._create_lecture_graph()
+        oracle = solution.IndependenceOracle(graph, maxsize=2)
+        self.assertFalse(oracle.is_independent(["A"], ["B"], ["L"]))
+        self.assertFalse(oracle.is_independent(["B"], ["A"], ["L", "L"]), "Swapped query should be a cache hit")
+        self.assertEqual(oracle.cache_info().hits, 1)
+        self.assertTrue(oracle(["A"], ["B"], []))
+        self.assertTrue(oracle(["G"], ["L"], ["E"]))
+        info = oracle.cache_info()
+        self.assertEqual((info.misses, info.evictions, info.currsize), (3, 1, 2))
+        graph.remove_edge("C", "E")
+        self.assertTrue(oracle(["A"], ["B"], ["L"]), "Mutating the graph should invalidate the cache")
+        self.assertEqual(oracle.cache_info().currsize, 1)
+
     def test_ancestral_graph(self):
         graph = self._create_lecture_graph()
         query_nodes = ["A","I","F","L"]
         ancestral_graph =solution.make_ancestral_graph(graph, query_nodes)
         self.assertFalse("G" in ancestral_graph.nodes, "G is not part of the ancestral graph")
+        self.assertIsInstance(ancestral_graph, solution.Graph)
+        ancestral_graph.remove_edge("H", "L")
+        self.assertEqual({n.name for n in graph.get_parents("L")}, {"H"})
 
     def test_moral_graph(self):
         graph = self._create_lecture_graph()
@@ -59,6 +109,18 @@ class TestAssignment3(unittest.TestCase):
         graph = self._create_lecture_graph()
         self.assertFalse(solution.check_independence_general(graph, ["A"], ["I"], ["L","F"]), "A and I are conditionnaly dependent given L and F")
         
+    def test_check_independence_general_agrees(self):
+        graph = self._create_lecture_graph()
+        queries = [(["A"], ["B"], []), (["A"], ["B"], ["L"]), (["A"], ["B"], ["L", "E"]),
+                   (["G"], ["L"], ["E"]), (["G", "A"], ["M", "L"], ["C"]), (["D"], ["I"], ["F"])]
+        for nodes_x, nodes_y, nodes_z in queries:
+            self.assertEqual(solution.check_independence_general(graph, nodes_x, nodes_y, nodes_z),
+                             solution.check_independence(graph, nodes_x, nodes_y, nodes_z),
+                             "{} and {} given {}".format(nodes_x, nodes_y, nodes_z))
+        undirected = graph.to_undirected()
+        self.assertTrue(solution.check_independence_general(undirected, ["A"], ["G"], ["E"]))
+        self.assertFalse(solution.check_independence_general(undirected, ["A"], ["B"], ["G"]))
+
     def test_elimination_order_minFill(self):
         net = self._create_lecture_graph()
         # order = solution.get_elimination_order_minfill(net)
@@ -67,6 +129,110 @@ class TestAssignment3(unittest.TestCase):
         self.assertEqual(order, true_order, "MinFillHeuristic produces this order")    
         
     
+    def test_min_fill_ordering_is_greedy(self):
+        net = self._create_lecture_graph()
+        order = solution.get_elimination_ordering(net)
+        self.assertEqual(sorted(order), sorted(net.nodes))
+        names, adj = get_interaction_graph(net)
+        adj = {names[i]: {names[j] for j in neighbours} for i, neighbours in enumerate(adj)}
+        self.assertTrue("M" in adj["E"], "Parents of H are married")
+        def fill(node):
+            neighbours = list(adj[node])
+            return sum(b not in adj[a] for i, a in enumerate(neighbours) for b in neighbours[i+1:])
+        for node in order:
+            self.assertEqual(fill(node), min(fill(n) for n in adj), "{} does not have minimal fill-in".format(node))
+            neighbours = adj.pop(node)
+            for a in neighbours:
+                adj[a] |= neighbours - {a}
+                adj[a].discard(node)
+
+    def test_elimination_heuristics(self):
+        net = solution.BayesianNetwork.from_arrays(["A", "B", "C"], [["a1", "a2", "a3"], ["b1", "b2", "b3", "b4"],
+                                                   ["c1", "c2", "c3", "c4", "c5"]], np.array([0, 1]), np.array([1, 2]))
+        cost = get_elimination_cost(net, ["A", "B", "C"])
+        self.assertEqual(cost.induced_width, 1)
+        self.assertEqual((cost.max_factor_cells, cost.max_factor_bytes), (20, 160))
+        self.assertEqual(cost.multiply_adds, 12 + 20 + 5)
+        graph = self._create_lecture_graph()
+        for heuristic in HEURISTICS:
+            order, cost = find_elimination_ordering(graph, heuristic)
+            self.assertEqual(sorted(order), sorted(graph.nodes))
+            self.assertEqual(cost, get_elimination_cost(graph, order), heuristic)
+        self.assertRaises(ValueError, find_elimination_ordering, graph, "min_foo")
+
+    def test_search_elimination_ordering(self):
+        graph = self._create_lecture_graph()
+        _, greedy_cost = find_elimination_ordering(graph)
+        order, cost = search_elimination_ordering(graph, time_budget=None, seed=3, max_runs=12)
+        self.assertEqual(sorted(order), sorted(graph.nodes))
+        self.assertLessEqual(cost.multiply_adds, greedy_cost.multiply_adds)
+        self.assertEqual(cost, get_elimination_cost(graph, order))
+        self.assertEqual(search_elimination_ordering(graph, time_budget=None, seed=3, max_runs=12, processes=2),
+                         (order, cost), "Runs should be reproducible given the seed")
+        order, cost = search_elimination_ordering(graph, time_budget=0.05)
+        self.assertEqual(sorted(order), sorted(graph.nodes))
+
+    def test_compact_graph(self):
+        graph = self._create_lecture_graph()
+        compact = solution.CompactGraph.from_graph(graph)
+        for node in graph.nodes:
+            self.assertEqual(set(compact.get_parents(node)), {n.name for n in graph.get_parents(node)})
+            self.assertEqual(set(compact.get_children(node)), {n.name for n in graph.get_children(node)})
+            self.assertEqual(compact.get_ancestors(node), {n.name for n in graph.get_ancestors(node)})
+        self.assertTrue(compact.is_acyclic())
+        compact.add_edge("L", "A")
+        self.assertFalse(compact.is_acyclic())
+        compact.remove_node("H")
+        self.assertTrue(compact.is_acyclic())
+        self.assertFalse("H" in compact.get_children("E"))
+
+    def test_deep_chain_traversals(self):
+        graph = solution.Graph()
+        length = 5000
+        for i in range(length):
+            graph.add_node(str(i))
+        for i in range(1, length):
+            graph.add_edge(str(i-1), str(i))
+        self.assertEqual(len(graph.get_ancestors(str(length-1))), length-1)
+        self.assertEqual(len(graph.get_descendants("0")), length-1)
+        self.assertTrue(graph.is_acyclic())
+        graph.add_edge(str(length-1), "0")
+        self.assertFalse(graph.is_acyclic())
+
+    def test_closure_invalidation(self):
+        graph = self._create_lecture_graph()
+        self.assertTrue(graph.is_ancestor("A", "L"))
+        self.assertTrue(graph.is_descendant("M", "B"))
+        graph.remove_edge("H", "L")
+        self.assertFalse(graph.is_ancestor("A", "L"))
+        graph.add_edge("L", "A")
+        self.assertTrue(graph.is_ancestor("L", "G"))
+        graph.remove_node("A")
+        self.assertFalse(graph.is_ancestor("L", "G"))
+
+    def test_graph_views(self):
+        graph = self._create_lecture_graph()
+        undirected = solution.UndirectedView(graph)
+        self.assertFalse(undirected.is_directed)
+        self.assertEqual(set(undirected.get_children("E")), {"C", "G", "H"})
+        self.assertEqual(list(graph.get_parents("E")), ["C"])
+        sub = solution.InducedSubgraphView(graph, ["E", "H", "L", "M"])
+        self.assertEqual(set(sub.get_parents("H")), {"E", "M"})
+        self.assertEqual(sub.get_ancestors("L"), {"E", "H", "M"})
+        moral = solution.make_moral_graph(sub)
+        self.assertTrue("M" in moral.nodes["E"].children)
+        self.assertFalse("A" in moral.nodes)
+
+    def test_check_independence_compact(self):
+        graph = solution.CompactGraph.from_graph(self._create_example_graph())
+        self.assertTrue(solution.check_independence(graph, ["B"], ["E"], ["R"]))
+        self.assertFalse(solution.check_independence(graph, ["B"], ["E"], ["A"]))
+        graph = self._create_lecture_graph()
+        compact = solution.CompactGraph.from_graph(graph)
+        for x, y, z in [(["A"], ["M"], ["E"]), (["A"], ["B"], ["L"]), (["C"], ["I"], []), (["G"], ["M"], ["H"])]:
+            self.assertEqual(solution.check_independence_general(compact, x, y, z),
+                             solution.check_independence_general(graph, x, y, z))
+
     def get_trivial_net(self):
         net = solution.BayesianNetwork()
         a = solution.DiscreteVariable("A", ["True", "False"])
@@ -79,6 +245,100 @@ class TestAssignment3(unittest.TestCase):
         return net
 
 
+    def test_copy_structure(self):
+        net = self.get_trivial_net()
+        res = net.copy_structure()
+        self.assertIsNot(res.nodes["A"], net.nodes["A"])
+        # The CPT is only copied on its first access
+        self.assertIs(res.nodes["A"]._cpt, net.nodes["A"]._cpt)
+        res.nodes["A"].cpt[0, 0] = 0.5
+        self.assertEqual(net.nodes["A"].cpt[0, 0], 0.2)
+        undirected = net.to_undirected()
+        undirected.nodes["B"].cpt[0] = 1
+        self.assertEqual(net.nodes["B"].cpt[0], 0.4)
+        # Writing to the original does not change the copies either
+        res = net.copy_structure()
+        solution.Factor.from_node(res.nodes["B"])
+        self.assertIs(res.nodes["B"]._cpt, net.nodes["B"]._cpt)
+        net.nodes["B"].cpt[0] = 0.9
+        self.assertEqual(res.nodes["B"].cpt[0], 0.4)
+        self.assertEqual(res.nodes["B"].cpt_view[0], 0.4)
+        self.assertRaises(ValueError, res.nodes["B"].cpt_view.__setitem__, 0, 1)
+        self.assertEqual(res.nodes["A"].parent_order, ["B"])
+        res.remove_edge("B", "A")
+        self.assertEqual(list(net.get_parents("A")), ["B"])
+        self.assertEqual(net.nodes["A"].parent_order, ["B"])
+        self.assertEqual(list(res.get_parents("A")), [])
+
+    def test_from_arrays(self):
+        net = solution.BayesianNetwork.from_arrays(["A", "B"], [["True", "False"], ["True", "False"]],
+                                                   np.array([1]), np.array([0]),
+                                                   [np.array([[0.2,0.3],[0.8,0.7]]), np.array([0.4,0.6])])
+        trivial = self.get_trivial_net()
+        for name in ["A", "B"]:
+            self.assertEqual(net.nodes[name].parent_order, trivial.nodes[name].parent_order)
+            np.testing.assert_array_equal(net.nodes[name].cpt, trivial.nodes[name].cpt)
+        self.assertRaises(ValueError, solution.BayesianNetwork.from_arrays, ["A", "B"], 
+                          [["True", "False"]] * 2, np.array([0, 1]), np.array([1, 0]))
+        graph = solution.Graph.from_edges(["A", "B", "C"], np.array([0, 1, 0]), np.array([1, 2, 1]))
+        self.assertTrue(graph.is_ancestor("A", "C"))
+        self.assertEqual(len(graph.get_children("A")), 1)
+
+    def test_save_load_network(self):
+        net = self.get_trivial_net()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "trivial.ccbn")
+            save_network(net, path)
+            loaded = load_network(path)
+            for name, node in net.nodes.items():
+                self.assertEqual(loaded.nodes[name].outcomes, node.outcomes)
+                self.assertEqual(loaded.nodes[name].parent_order, node.parent_order)
+                np.testing.assert_array_equal(loaded.nodes[name].cpt, node.cpt)
+                self.assertFalse(loaded.nodes[name].cpt.flags.writeable)
+            del loaded
+
+    def test_read_network_files(self):
+        files = {
+            "trivial.bif": "network unknown {\n}\n"
+                "variable A {\n  type discrete [ 2 ] { True, False };\n}\n"
+                "variable B {\n  type discrete [ 2 ] { True, False };\n}\n"
+                "probability ( A | B ) {\n  (True) 0.2, 0.8;\n  (False) 0.3, 0.7;\n}\n"
+                "probability ( B ) {\n  table 0.4, 0.6;\n}\n",
+            "trivial.xml": "<BIF VERSION=\"0.3\"><NETWORK><NAME>trivial</NAME>"
+                "<VARIABLE><NAME>A</NAME><OUTCOME>True</OUTCOME><OUTCOME>False</OUTCOME></VARIABLE>"
+                "<VARIABLE><NAME>B</NAME><OUTCOME>True</OUTCOME><OUTCOME>False</OUTCOME></VARIABLE>"
+                "<DEFINITION><FOR>A</FOR><GIVEN>B</GIVEN><TABLE>0.2 0.8 0.3 0.7</TABLE></DEFINITION>"
+                "<DEFINITION><FOR>B</FOR><TABLE>0.4 0.6</TABLE></DEFINITION></NETWORK></BIF>",
+            "trivial.uai": "BAYES\n2\n2 2\n2\n2 1 0\n1 1\n4\n 0.2 0.8\n 0.3 0.7\n2\n 0.4 0.6\n",
+            "trivial.uai.evid": "2 1 0 0 0\n",
+            "untyped.bif": "variable A {\n  property p;\n}\n",
+            "undeclared.bif": "variable A {\n  type discrete [ 2 ] { True, False };\n}\n"
+                "probability ( A | B ) {\n  table 0.2, 0.8, 0.3, 0.7;\n}\n",
+        }
+        trivial = self.get_trivial_net()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, content in files.items():
+                with open(os.path.join(tmp_dir, name), "w") as f:
+                    f.write(content)
+            nets = [read_bif(os.path.join(tmp_dir, "trivial.bif")),
+                    read_xmlbif(os.path.join(tmp_dir, "trivial.xml"))]
+            uai = read_uai(os.path.join(tmp_dir, "trivial.uai"))
+            evidence = read_uai_evidence(os.path.join(tmp_dir, "trivial.uai.evid"), uai, "single")
+            samples = read_uai_evidence(os.path.join(tmp_dir, "trivial.uai.evid"), uai, "samples")
+            for name in ["untyped.bif", "undeclared.bif"]:
+                with self.assertRaises(ValueError):
+                    read_bif(os.path.join(tmp_dir, name))
+            with self.assertRaises(ValueError):
+                read_uai_evidence(os.path.join(tmp_dir, "trivial.uai.evid"), uai, "guess")
+        for net in nets:
+            self.assertEqual(net.nodes["A"].parent_order, ["B"])
+            np.testing.assert_array_equal(net.nodes["A"].cpt, trivial.nodes["A"].cpt)
+            np.testing.assert_array_equal(net.nodes["B"].cpt, trivial.nodes["B"].cpt)
+        self.assertEqual(uai.nodes["0"].parent_order, ["1"])
+        np.testing.assert_array_equal(uai.nodes["0"].cpt, trivial.nodes["A"].cpt)
+        self.assertEqual(evidence, [{"1": "0", "0": "0"}])
+        self.assertEqual(samples, [{"0": "0"}, {}])
+
     def test_initialize_factors(self):
         net = self.get_trivial_net()
         factors = solution.initialize_factors(net, None)
@@ -92,6 +352,235 @@ class TestAssignment3(unittest.TestCase):
         # Using almost equal to avoid rounding/precision errors
         np.testing.assert_almost_equal(res[0].potentials, np.array([0.26, 0.74]))
 
+    def test_calculate_probabilities(self):
+        net = self.get_trivial_net()
+        res = solution.calculate_probabilities(net, ["A"])
+        np.testing.assert_almost_equal(res.potentials, np.array([0.26, 0.74]))
+        res = solution.calculate_probabilities(net, ["B"], {"A": "True"})
+        np.testing.assert_almost_equal(res.potentials, np.array([0.08, 0.18]) / 0.26)
+        res = solution.calculate_probabilities(net, ["B", "A"])
+        self.assertEqual(res.variable_order, ["B", "A"])
+        np.testing.assert_almost_equal(res.potentials, np.array([[0.08, 0.32], [0.18, 0.42]]))
+
+    def test_junction_tree(self):
+        net = self.get_trivial_net()
+        tree = JunctionTree(net)
+        np.testing.assert_almost_equal(tree.get_marginal("A").potentials, np.array([0.26, 0.74]))
+        joint = tree.get_joint(["B", "A"])
+        np.testing.assert_almost_equal(joint.potentials, np.array([[0.08, 0.32], [0.18, 0.42]]))
+        tree.set_evidence({"A": "True"})
+        np.testing.assert_almost_equal(tree.get_marginal("B").potentials, np.array([0.08, 0.18]) / 0.26)
+        self.assertAlmostEqual(tree.get_evidence_probability(), 0.26)
+        for variable in net.nodes:
+            np.testing.assert_almost_equal(tree.get_marginal(variable).potentials,
+                                           solution.calculate_probabilities(net, [variable], {"A": "True"}).potentials)
+        net = self._create_lecture_network()
+        tree = JunctionTree(net)
+        evidence = {"L": "t", "C": "f"}
+        tree.set_evidence(evidence)
+        for variable in ["A", "B", "E", "F", "G", "H", "I", "M"]:
+            np.testing.assert_almost_equal(tree.get_marginal(variable).potentials,
+                                           solution.calculate_probabilities(net, [variable], evidence).potentials)
+
+    def test_junction_tree_incremental_evidence(self):
+        net = self._create_lecture_network()
+        tree = JunctionTree(net)
+        tree.calibrate()
+        evidence = {}
+        for step, (variable, outcome) in enumerate([("L", "t"), ("C", "f"), ("L", "f"), ("G", "t"), ("C", None)]):
+            if outcome is None:
+                tree.retract_evidence(variable)
+                del evidence[variable]
+            else:
+                tree.add_evidence(variable, outcome)
+                evidence[variable] = outcome
+            for query in ["A", "H", "M"]:
+                np.testing.assert_almost_equal(tree.get_marginal(query).potentials,
+                                               solution.calculate_probabilities(net, [query], evidence).potentials,
+                                               err_msg="step {}".format(step))
+        self.assertRaises(ValueError, tree.add_evidence, "A", "maybe")
+
+    def test_prune_network(self):
+        net = self._create_lecture_network()
+        # G, L and M are barren, the edge C->E is cut and A is separated from E
+        pruned = prune_network(net, ["E"], {"C": "t", "I": "f"})
+        self.assertEqual(set(pruned.nodes), {"E"})
+        pruned = prune_network(net, ["H"], {"C": "t"})
+        self.assertEqual(set(pruned.nodes), {"B", "D", "E", "F", "H", "I", "M"})
+        self.assertEqual(pruned.nodes["E"].parent_order, [])
+        self.assertEqual(pruned.nodes["E"].cpt.shape, (2,))
+        self.assertEqual(pruned.nodes["H"].cpt.shape, (2, 2, 2, 2))
+        # Networks whose tables are not filled in yet keep the default cpt
+        empty = solution.BayesianNetwork()
+        empty.add_node(solution.DiscreteVariable("X", ["0", "1"]))
+        self.assertEqual(prune_network(empty, ["X"], {}).nodes["X"].cpt, 0)
+
+    def test_factor_sum_product(self):
+        rng = np.random.RandomState(1)
+        f1 = solution.Factor(["A","B","C"], {"A": ["a1","a2"], "B": ["b1","b2","b3"], "C": ["c1","c2"]}, rng.rand(2,3,2))
+        f2 = solution.Factor(["C","D"], {"C": ["c1","c2"], "D": ["d1","d2","d3","d4"]}, rng.rand(2,4))
+        f3 = solution.Factor(["B"], {"B": ["b1","b2","b3"]}, rng.rand(3))
+        res = solution.Factor.sum_product([f1, f2, f3], ["B", "C"])
+        self.assertEqual(res.variable_order, ["A", "D"])
+        expected = f1.multiply(f2).multiply(f3).marginalize(["B", "C"])
+        np.testing.assert_almost_equal(res.potentials,
+                                       np.transpose(expected.potentials, [expected.variable_order.index(v) for v in res.variable_order]))
+        np.testing.assert_almost_equal(solution.Factor.sum_product([f1], ["A", "B", "C"]).potentials, np.sum(f1.potentials))
+        self.assertRaises(ValueError, solution.Factor.sum_product, [f1], ["D"])
+
+    def test_factor_log_space(self):
+        rng = np.random.RandomState(2)
+        f1 = solution.Factor(["A","B"], {"A": ["a1","a2"], "B": ["b1","b2","b3"]}, rng.rand(2,3))
+        f2 = solution.Factor(["B","C"], {"B": ["b1","b2","b3"], "C": ["c1","c2"]}, rng.rand(3,2))
+        l1, l2 = f1.to_log(), f2.to_log()
+        self.assertTrue(l1.log)
+        np.testing.assert_almost_equal(l1.to_linear().potentials, f1.potentials)
+        res = l1.multiply(l2)
+        self.assertTrue(res.log)
+        np.testing.assert_almost_equal(np.exp(res.potentials), f1.multiply(f2).potentials)
+        # Mixing domains converts to log space
+        np.testing.assert_almost_equal(f1.multiply(l2).potentials, res.potentials)
+        np.testing.assert_almost_equal(np.exp(res.marginalize(["B"]).potentials), f1.multiply(f2).marginalize(["B"]).potentials)
+        np.testing.assert_almost_equal(np.exp(solution.Factor.sum_product([l1, f2], ["B"]).potentials),
+                                       solution.Factor.sum_product([f1, f2], ["B"]).potentials)
+        np.testing.assert_almost_equal(np.exp(l1.reduce({"A": "a2"}).potentials), f1.reduce({"A": "a2"}).potentials)
+        # Potentials far below the smallest float
+        tiny = solution.Factor(["A"], {"A": ["a1","a2"]}, np.array([-2000., -2001.]), log=True)
+        self.assertAlmostEqual(float(tiny.marginalize(["A"]).potentials), -2000 + np.log(1 + np.exp(-1)))
+
+    def test_factor_reduce_modes(self):
+        rng = np.random.RandomState(3)
+        f1 = solution.Factor(["A","B","C"], {"A": ["a1","a2"], "B": ["b1","b2","b3"], "C": ["c1","c2"]}, rng.rand(2,3,2))
+        f2 = solution.Factor(["B","D"], {"B": ["b1","b2","b3"], "D": ["d1","d2"]}, rng.rand(3,2))
+        evidence = {"B": "b2", "C": "c1"}
+        masked = f1.reduce(evidence)
+        self.assertEqual(masked.potentials.shape, (2, 3, 2))
+        dropped = f1.reduce(evidence, "drop")
+        self.assertEqual(dropped.variable_order, ["A"])
+        np.testing.assert_almost_equal(dropped.potentials, f1.potentials[:, 1, 0])
+        # The reduced factor does not keep the full table alive
+        self.assertIsNone(dropped.potentials.base)
+        self.assertEqual(dropped.potentials.nbytes, 2 * f1.potentials.itemsize)
+        kept = f1.reduce(evidence, "keep")
+        self.assertEqual(kept.potentials.shape, (2, 1, 1))
+        self.assertEqual(kept.outcomes["B"], ("b2",))
+        np.testing.assert_almost_equal(kept.potential({"A": "a2", "B": "b2", "C": "c1"}), f1.potentials[1, 1, 0])
+        # Factors reduced with "keep" can be combined with unreduced ones
+        expected = masked.multiply(f2).marginalize(["B", "C"])
+        np.testing.assert_almost_equal(kept.multiply(f2).marginalize(["B", "C"]).potentials, expected.potentials)
+        np.testing.assert_almost_equal(f2.multiply(kept).marginalize(["B", "C"]).potentials,
+                                       np.transpose(expected.potentials))
+        np.testing.assert_almost_equal(solution.Factor.sum_product([kept, f2], ["B", "C"]).potentials, expected.potentials)
+        self.assertRaises(ValueError, f1.reduce, evidence, "shrink")
+        net = self.get_trivial_net()
+        res = solution.calculate_probabilities(net, ["A", "B"], {"A": "True"})
+        np.testing.assert_almost_equal(res.potentials, np.array([[0.08, 0.18], [0, 0]]) / 0.26)
+
+    def test_sparse_factor(self):
+        outcomes = {"A": ["a1","a2","a3"], "B": ["b1","b2","b3","b4"], "C": ["c1","c2"]}
+        potentials = np.zeros((3, 4, 2))
+        potentials[0, 1, 1] = 0.5
+        potentials[2, 3, 0] = 0.25
+        f1 = solution.Factor(["A","B","C"], outcomes, potentials)
+        f2 = solution.Factor(["C","A"], outcomes, np.arange(1, 7).reshape(2, 3) / 10)
+        sparse = to_sparse_if_beneficial(f1)
+        self.assertIsInstance(sparse, SparseFactor)
+        self.assertIs(to_sparse_if_beneficial(f2), f2)
+        self.assertEqual(len(sparse.values), 2)
+        self.assertEqual(sparse.potential({"A": "a1", "B": "b2", "C": "c2"}), 0.5)
+        self.assertEqual(sparse.potential({"A": "a1", "B": "b2", "C": "c1"}), 0)
+        np.testing.assert_almost_equal(sparse.to_dense().potentials, potentials)
+        product = sparse.multiply(f2)
+        self.assertIsInstance(product, SparseFactor)
+        self.assertEqual(product.variable_order, ["A", "B", "C"])
+        np.testing.assert_almost_equal(product.to_dense().potentials, f1.multiply(f2).potentials)
+        np.testing.assert_almost_equal(f2.multiply(sparse).to_dense().potentials, f2.multiply(f1).potentials)
+        # The marginal over A is dense enough to switch back
+        marginal = sparse.marginalize(["B", "C"])
+        self.assertIsInstance(marginal, solution.Factor)
+        np.testing.assert_almost_equal(marginal.potentials, [0.5, 0, 0.25])
+        for mode in ["mask", "keep", "drop"]:
+            np.testing.assert_almost_equal(sparse.reduce({"A": "a3"}, mode).to_dense().potentials,
+                                           f1.reduce({"A": "a3"}, mode).potentials)
+        np.testing.assert_almost_equal(solution.Factor.sum_product([sparse, f2], ["A"]).potentials,
+                                       solution.Factor.sum_product([f1, f2], ["A"]).potentials)
+        # Each X is summed out right after its factor, the full product
+        # over all 40 of them would never fit into memory
+        chain = [solution.Factor(["C", "X{}".format(i)], {"C": ["c1", "c2"], "X{}".format(i): ["x1", "x2"]},
+                                 np.full((2, 2), 0.5)) for i in range(40)]
+        res = solution.Factor.sum_product([sparse] + chain, ["X{}".format(i) for i in range(40)])
+        np.testing.assert_almost_equal(res.to_dense().potentials if isinstance(res, SparseFactor) else res.potentials,
+                                       potentials)
+        net = self._create_lecture_network()
+        for node in net.nodes.values():
+            # Deterministic CPTs
+            node.cpt = (node.cpt == node.cpt.max(axis=0)).astype(float)
+        evidence = {"L": "t"}
+        np.testing.assert_almost_equal(solution.calculate_probabilities(net, ["H", "B"], evidence, sparse=True).potentials,
+                                       solution.calculate_probabilities(net, ["H", "B"], evidence).potentials)
+        # The arguments are checked before the network is looked at
+        with self.assertRaisesRegex(ValueError, "log space"):
+            solution.calculate_probabilities(net, ["Z"], log_space=True, sparse=True)
+
+    def test_calculate_probabilities_log_space(self):
+        # A root with many observed children, the probability of the evidence underflows
+        names = ["R"] + ["C{}".format(i) for i in range(1200)]
+        net = solution.BayesianNetwork.from_arrays(names, [["t", "f"]] * len(names),
+                                                   np.zeros(1200, dtype=np.int64), np.arange(1, 1201))
+        net.nodes["R"].cpt = np.array([0.3, 0.7])
+        for name in names[1:]:
+            net.nodes[name].cpt = np.array([[0.4, 0.6], [0.6, 0.4]])
+        evidence = {name: "t" if i % 2 else "f" for i, name in enumerate(names[1:])}
+        evidence["C0"] = "t"
+        res = solution.calculate_probabilities(net, ["R"], evidence, log_space=True)
+        self.assertFalse(res.log)
+        expected = 0.3 * 4 / 9
+        np.testing.assert_almost_equal(res.potentials, np.array([expected, 0.7]) / (expected + 0.7))
+        net = self.get_trivial_net()
+        np.testing.assert_almost_equal(solution.calculate_probabilities(net, ["B"], {"A": "True"}, log_space=True).potentials,
+                                       np.array([0.08, 0.18]) / 0.26)
+        # Every factor has a maximum of 1, still the 24 observations of
+        # 1e-30 underflow in linear space
+        names = ["R"] + ["C{}".format(i) for i in range(24)]
+        net = solution.BayesianNetwork.from_arrays(names, [["t", "f"]] * len(names),
+                                                   np.zeros(24, dtype=int), np.arange(1, 25))
+        net.nodes["R"].cpt = np.array([0.5, 0.5])
+        for i, name in enumerate(names[1:]):
+            cpt = np.array([[1e-30, 1], [1 - 1e-30, 0]])
+            net.nodes[name].cpt = cpt if i % 2 else cpt[:, ::-1]
+        res = solution.calculate_probabilities(net, ["R"], {name: "t" for name in names[1:]}, log_space=True)
+        np.testing.assert_almost_equal(res.potentials, [0.5, 0.5])
+
+    def test_contract_query(self):
+        net = self._create_lecture_network()
+        for variables, evidence in [(["A"], None), (["H", "B"], {"L": "t", "C": "f"}), (["M", "G", "I"], {"E": "t"}),
+                                    (["C", "H"], {"C": "f", "L": "t"})]:
+            res, plan = contract_query(net, variables, evidence, restarts=4)
+            self.assertEqual(res.variable_order, variables)
+            np.testing.assert_almost_equal(res.potentials,
+                                           solution.calculate_probabilities(net, variables, evidence).potentials)
+            self.assertGreater(plan.peak_bytes, 0)
+        self.assertGreater(plan.flops, 0)
+        res = solution.calculate_probabilities(net, ["H"], {"L": "t"}, method="contraction")
+        np.testing.assert_almost_equal(res.potentials, solution.calculate_probabilities(net, ["H"], {"L": "t"}).potentials)
+        # The query may overlap the evidence
+        net = self.get_trivial_net()
+        np.testing.assert_almost_equal(
+            solution.calculate_probabilities(net, ["A", "B"], {"A": "True"}, method="contraction").potentials,
+            solution.calculate_probabilities(net, ["A", "B"], {"A": "True"}).potentials)
+
+    def _create_lecture_network(self):
+        graph = self._create_lecture_graph()
+        names = list(graph.nodes)
+        src = [names.index(p) for n in names for p in graph.get_parents(n)]
+        dst = [names.index(n) for n in names for p in graph.get_parents(n)]
+        net = solution.BayesianNetwork.from_arrays(names, [["t", "f"]] * len(names), np.array(src), np.array(dst))
+        rng = np.random.RandomState(0)
+        for node in net.nodes.values():
+            table = rng.rand(*(2,) * (len(node.parent_order) + 1))
+            node.cpt = table / table.sum(axis=0)
+        return net
+
     def _create_example_graph(self):
         dg = solution.Graph()
         dg.add_node("A")
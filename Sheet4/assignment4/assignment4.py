@@ -29,7 +29,8 @@ def maximize_out(factor: Factor, variable: str) -> Factor:
         --------
         Factor
             A new factor that results from maximizing out the 
-            variable from the initial factor.
+            variable from the initial factor. Since the logarithm is
+            monotonic, this works for factors in log space as well.
     """
     newFactor = factor.copy()
 
@@ -122,7 +123,7 @@ def calculate_MAP(bn: BayesianNetwork,
     raise NotImplementedError("TODO Exercise 1.4")
 
 
-def sample(distribution: Dict[str, float]) -> str:
+def sample(distribution: Dict[str, float], log: bool = False) -> str:
     """
         Sample an outcome from a given probability distribution using the
         univariate sampling (also called roulette wheel selection) mentioned
@@ -133,12 +134,21 @@ def sample(distribution: Dict[str, float]) -> str:
         distribution: dict
             A dictionary containing the possible outcomes as keys and their
             respective probabilities as values.
+        log: bool, optional
+            If True, the values are log probabilities, e.g. the potentials of
+            a Factor in log space. They do not need to be normalized and are
+            accumulated with logaddexp instead of being exponentiated.
 
         Returns
         -------
             String
             The sampled outcome
     """
+    if log:
+        cum = np.logaddexp.accumulate(list(distribution.values()))
+        rand = np.log(random.random()) + cum[-1]
+        index = np.searchsorted(cum, rand)
+        return list(distribution.keys())[index]
     cum = np.cumsum(list(distribution.values()))
     rand = random.random()
     index = np.searchsorted(cum, rand)
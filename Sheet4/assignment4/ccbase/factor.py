@@ -12,11 +12,38 @@ import numpy as np
 from typing import Union, Optional, List, Dict, Iterable
 from .nodes import DiscreteVariable
 
+
+def logsumexp(a: np.array, axis: Optional[int] = None) -> np.array:
+    """
+        Computes log(sum(exp(a))) along the given axis without underflow by
+        factoring out the maximum. Slices that are -inf everywhere (only
+        zero potentials) result in -inf.
+        
+        Parameters
+        ----------
+        a: np.array
+            The array of logarithms.
+        axis: int (optional)
+            The axis to be summed over, all axes if not given.
+            
+        Returns
+        -------
+        np.array
+            The logarithm of the sum, the given axis is removed.
+    """
+    a = np.asarray(a)
+    shift = np.max(a, axis=axis, keepdims=True)
+    shift = np.where(np.isfinite(shift), shift, 0)
+    with np.errstate(divide="ignore"):
+        res = np.log(np.sum(np.exp(a - shift), axis=axis, keepdims=True)) + shift
+    return np.squeeze(res, axis=axis) if axis is not None else res.reshape(())
+
 class Factor(object):
     
     def __init__(self, variables: Optional[List[str]] = None, 
                     outcomes: Optional[Dict[str,List[str]]] = None, 
-                    potentials: Optional[np.array] = None):
+                    potentials: Optional[np.array] = None,
+                    log: bool = False):
         """
             Constructor for a new factor. Without any parameters a trivial, 
             empty (unit) factor should be created which does not modify 
@@ -37,6 +64,12 @@ class Factor(object):
                 The array must be ordered according to the variable and outcome lists.
                 These could be conditional or marginal probabilities of a random variable
                 (see `Factor.from_probabilities` function).
+            log: bool (optional)
+                Whether the potentials are given as natural logarithms. Factors
+                in log space cannot underflow: multiplication adds potentials,
+                marginalization uses logsumexp and maximization stays a max.
+                Combining a log space factor with a normal one converts the 
+                latter to log space.
                 
             Raises
             -------
@@ -54,9 +87,11 @@ class Factor(object):
         if outcomes is None:
             outcomes = {}
         if potentials is None:
-            potentials = 1
+            potentials = 0 if log else 1
         #Store the actual potentials as numpy array
         self.potentials = np.copy(potentials)
+        #Whether the potentials are stored as logarithms
+        self.log = log
         #Store all contained variables in a list. The index of each variable
         #corresponds to the dimension of that variable in the array.
         self.variable_order = list(variables)
@@ -105,7 +140,7 @@ class Factor(object):
         return cls(variables, outcomes, probabilities)
     
     @classmethod
-    def from_node(cls, node: DiscreteVariable):
+    def from_node(cls, node: DiscreteVariable, log: bool = False):
         """
             Classmethod to directly create a new factor from a DiscreteVariable
             
@@ -114,6 +149,8 @@ class Factor(object):
             node: ccbase.nodes.DiscreteVariable
                 The DiscreteVariable that should be used to initialize this
                 factor.
+            log: bool (optional)
+                Whether the factor should be created in log space.
                 
             Returns
             -------
@@ -125,6 +162,9 @@ class Factor(object):
         outcomes = {node.name: node.outcomes}
         for p in node.parent_order:
             outcomes[p] = node.parents[p].outcomes
+        if log:
+            with np.errstate(divide="ignore"):
+                return cls(variables, outcomes, np.log(node.cpt), log=True)
         return cls(variables, outcomes, node.cpt)
     
     def __call__(self, instantiation: Dict[str, str]) -> Union[float, np.array]:
@@ -160,8 +200,9 @@ class Factor(object):
             Returns
             -------
             float or np.array
-                The potential for that specified instantiation. In case of
-                partial instantiations, a np.array is returned instead.
+                The potential for that specified instantiation (its logarithm
+                for factors in log space). In case of partial instantiations, 
+                a np.array is returned instead.
         """
         
         #Construct the index for the desired potential
@@ -202,9 +243,11 @@ class Factor(object):
             variables = [variables]
             
         res = self.copy()
+        # In log space, summing the exponentials avoids underflow
+        sum_ = logsumexp if self.log else np.sum
         for v in variables:
             #Simply sum out the corresponding dimension for each variable
-            res.potentials = np.sum(res.potentials, axis=res.variable_order.index(v))
+            res.potentials = sum_(res.potentials, axis=res.variable_order.index(v))
             #Make sure to upadte the outcome dictionary and variable_order list
             # as to not mess up the next iteration.
             del res.outcomes[v]
@@ -228,18 +271,23 @@ class Factor(object):
             Factor
                 The resulting factor.
         """
+        # Factors in log space are multiplied by adding their potentials
+        if self.log != other_factor.log:
+            return self.to_log().multiply(other_factor.to_log())
+        product = np.add if self.log else np.multiply
+        
         # Shortcuts for trivial factors
         if len(self.variable_order) == 0:
             res = other_factor.copy()
-            res.potentials = self.potentials * res.potentials
+            res.potentials = product(self.potentials, res.potentials)
             return res
             
         if len(other_factor.variable_order) == 0:
             res = self.copy()
-            res.potentials = res.potentials * other_factor.potentials
+            res.potentials = product(res.potentials, other_factor.potentials)
             return res
         
-        res = Factor()
+        res = Factor(log=self.log)
         res.variable_order = list(self.variable_order)
         res.outcomes = dict(self.outcomes)
         
@@ -284,7 +332,7 @@ class Factor(object):
         # Pointwise multiplication which results in a factor where all instantiations
         # are compatible to the instantiations of res and factor2
         # See Definition 6.3 in "Modeling and Reasoning with Bayesian Networks" - Adnan Darwiche Chapter 6    
-        res.potentials = res.potentials * f2.potentials
+        res.potentials = product(res.potentials, f2.potentials)
         
         return res
 
@@ -350,9 +398,43 @@ class Factor(object):
         #allows partial instantiations, as is the case with the evidence here.
         #We use the access mask provided by np.ix_ to prevent the cells conforming
         #to the evidence from being multiplied by 0.
-        tmp = np.zeros(res.potentials.shape)
-        tmp[np.ix_(*index)] = 1
-        res.potentials *= tmp
+        tmp = np.zeros(res.potentials.shape, dtype=bool)
+        tmp[np.ix_(*index)] = True
+        res.potentials = np.where(tmp, res.potentials, -np.inf if res.log else 0)
+        return res
+
+    def to_log(self) -> Factor:
+        """
+            Creates a copy of this factor in log space. Zero potentials 
+            become -inf.
+            
+            Returns
+            -------
+            Factor
+                The factor in log space, or a copy if it already was.
+        """
+        res = self.copy()
+        if not self.log:
+            with np.errstate(divide="ignore"):
+                res.potentials = np.log(res.potentials)
+            res.log = True
+        return res
+
+    def to_linear(self) -> Factor:
+        """
+            Creates a copy of this factor with normal (not log space) 
+            potentials.
+            
+            Returns
+            -------
+            Factor
+                The factor with the exponentiated potentials, or a copy if 
+                it was not in log space.
+        """
+        res = self.copy()
+        if self.log:
+            res.potentials = np.exp(res.potentials)
+            res.log = False
         return res
         
     def copy(self) -> Factor:
@@ -364,7 +446,7 @@ class Factor(object):
             Factor
                 An exact copy of self.
         """
-        res = Factor()
+        res = Factor(log=self.log)
         res.potentials = np.copy(self.potentials)
         #Creating a shallow copy with dict() is enough here as factors
         #should convert the value lists to tuples upon creation, which makes
@@ -180,14 +180,15 @@ class Graph:
         """
         if not node in self.nodes:
             raise ValueError("The graph does not contain a node called {}".format(node))
-        def _add_parents(tmpNode):
-            for p in tmpNode.parents.values():
-                if p in res:
-                    continue
-                res.add(p)
-                _add_parents(p)
+        # Explicit stack instead of recursion, so that long chains do not
+        # exceed Python's recursion limit.
         res = set()
-        _add_parents(self.nodes[node])
+        stack = [self.nodes[node]]
+        while stack:
+            for p in stack.pop().parents.values():
+                if p not in res:
+                    res.add(p)
+                    stack.append(p)
         return res
 
     def is_ancestor(self, node_a: Union[str, Node], node_b: Union[str, Node]) -> bool:
@@ -237,33 +238,32 @@ class Graph:
                 bool
                 True if there are no cycles within the provided graph, False otherwise.
         """
-        def _cyclic(node):
-            """
-                Private helper function to check if a node is cyclic.
-                
-                This basically implements a marking/painting algorithm going over all
-                nodes and marking them according to 0=not yet visited, 1=currently
-                active and 2=done, but with the short circuit of breaking as soon
-                as we find a loop (i.e. we meet another node, that is currently
-                active).
-            """
-            if statusMap[node] == 2:
-                return False
-            if statusMap[node] == 1:
-                return True
-            statusMap[node] = 1
-            for n in node.children.values():
-                if _cyclic(n):
-                    return True
-            statusMap[node] = 2
-            return False
-        
+        # This implements a marking/painting algorithm going over all
+        # nodes and marking them according to 0=not yet visited, 1=currently
+        # active and 2=done, but with the short circuit of breaking as soon
+        # as we find a loop (i.e. we meet another node, that is currently
+        # active). The depth first search uses an explicit stack of
+        # (node, child iterator) pairs instead of recursion.
         statusMap = {}
         for n in self.nodes.values():
             statusMap[n] = 0
-        for n in self.nodes.values():
-            if _cyclic(n):
-                return False
+        for start in self.nodes.values():
+            if statusMap[start] != 0:
+                continue
+            statusMap[start] = 1
+            stack = [(start, iter(start.children.values()))]
+            while stack:
+                node, children = stack[-1]
+                for c in children:
+                    if statusMap[c] == 1:
+                        return False
+                    if statusMap[c] == 0:
+                        statusMap[c] = 1
+                        stack.append((c, iter(c.children.values())))
+                        break
+                else:
+                    statusMap[node] = 2
+                    stack.pop()
 
         return True
             
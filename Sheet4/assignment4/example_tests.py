@@ -52,6 +52,9 @@ class TestAssignment5(unittest.TestCase):
         f = solution.Factor(["A","B"], {"A":["True","False"], "B": ["True","False"]}, np.array([[0.2,0.3],[0.8,0.7]]))
         res = solution.maximize_out(f, "B")
         np.testing.assert_almost_equal(res.potentials, np.array([0.3, 0.8]))
+        res = solution.maximize_out(f.to_log(), "B")
+        self.assertTrue(res.log)
+        np.testing.assert_almost_equal(res.potentials, np.log([0.3, 0.8]))
 
     def test_max_product_elim_var(self):
         f1 = solution.Factor(["A","B"], {"A":["True","False"], "B": ["True","False"]}, np.array([[0.2,0.3],[0.8,0.7]]))
@@ -81,6 +84,14 @@ class TestAssignment5(unittest.TestCase):
 	
         self.assertTrue(solution.sample(exampleNode.get_distribution()) in ["red","green","blue"], "Sample frequency not matching actual distribution")
 
+    def test_sample_log_space(self):
+        random.seed(0)
+        # Far below the smallest float, the probabilities would underflow
+        distribution = {"red": np.log(0.15) - 1000, "green": np.log(0.55) - 1000, "blue": np.log(0.3) - 1000}
+        samples = [solution.sample(distribution, log=True) for _ in range(5000)]
+        self.assertAlmostEqual(samples.count("green") / 5000, 0.55, 1)
+        self.assertAlmostEqual(samples.count("red") / 5000, 0.15, 1)
+
     def test_get_ancestral_ordering(self):
         self.assertTrue(solution.get_ancestral_ordering(solution.get_wetgrass_network()) == ['winter', 'sprinkler', 'rain', 'wet_grass', 'dry_fields'])
 